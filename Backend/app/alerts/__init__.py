@@ -0,0 +1 @@
+from .sink import AlertSink, get_alert_sink
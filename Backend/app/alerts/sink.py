@@ -0,0 +1,289 @@
+"""
+Single owner of alert persistence.
+
+Evaluation only produces candidate alerts; the sink decides what is stored.
+Consecutive alerts of one category from one sensor are merged into an
+episode (start, last seen, peak, count, end). Only an episode opening and a
+severity escalation produce a row in `alerts`, and those rows are
+rate-limited per sensor and category. The episode itself is written to
+`alert_episodes` when it opens, escalates and closes; in between, its
+peak, count and last-seen time are checkpointed once every
+ALERT_EPISODE_CHECKPOINT_SAMPLES merged alerts, so a long episode costs a
+few upserts rather than one per reading.
+
+Hysteresis: an episode closes only once its condition has been clear for
+ALERT_CLEAR_SECONDS of reading time, so a value hovering around a limit
+stays one episode instead of opening a new one per crossing. A reading only
+counts as clear when its value is at least ALERT_CLEAR_MARGIN below the
+value where the category starts alerting (the CO limit, or the lowest
+alerting band); readings inside that margin hold the episode open. Two-sided
+bands (pressure) have no single onset and use time alone. Episodes are
+closed by the sensor's own later readings; a sensor that goes silent keeps
+its episodes open until close_all() at shutdown.
+
+Every persisted snapshot carries a higher revision than the last, so the
+episode table keeps the newest one whatever order the writer stores them in.
+
+All times are reading timestamps, so replays behave like live ingest.
+"""
+
+import threading
+from collections import deque
+
+from app.config.config import (
+    ALERT_CLEAR_MARGIN,
+    ALERT_CLEAR_SECONDS,
+    ALERT_EPISODE_CHECKPOINT_SAMPLES,
+    ALERT_RATE_LIMIT_COUNT,
+    ALERT_RATE_LIMIT_WINDOW_SECONDS,
+    DEFAULT_SENSOR_ID,
+)
+from app.db.writer import get_writer
+from app.metrics.bands import CO2_BANDS, PM10_BANDS, PM25_BANDS, TEMP_BANDS, WBGT_BANDS
+from app.utils.time_utils import to_epoch
+
+SEVERITY_RANK = {"none": 0, "warning": 1, "high": 2, "critical": 3}
+
+# Alert category -> (metric carrying its value, band classifier or None when
+# the metric's own limit is the onset)
+_CATEGORY_METRICS = {
+    "CO_STEL": ("CO_STEL", None),
+    "CO_TWA": ("CO_TWA", None),
+    "CO_CEILING": ("CO_CEILING", None),
+    "PM2.5": ("PM2_5_LEVEL", PM25_BANDS),
+    "PM10": ("PM10_LEVEL", PM10_BANDS),
+    "TEMP": ("TEMP_LEVEL", TEMP_BANDS),
+    "CO2": ("CO2_LEVEL", CO2_BANDS),
+    "WBGT": ("WBGT", WBGT_BANDS),
+}
+_BAND_ONSETS = {
+    category: bands.onset()
+    for category, (_, bands) in _CATEGORY_METRICS.items()
+    if bands is not None
+}
+
+
+def _onsets(metrics):
+    """(category -> (value, onset)) for one reading's metrics."""
+
+    by_type = {m["type"]: m for m in metrics}
+    result = {}
+    for category, (metric_type, bands) in _CATEGORY_METRICS.items():
+        metric = by_type.get(metric_type)
+        if metric is None or metric["value"] is None:
+            continue
+        onset = metric["limit"] if bands is None else _BAND_ONSETS[category]
+        if onset is not None:
+            result[category] = (metric["value"], onset)
+    return result
+
+
+class _Episode:
+    __slots__ = (
+        "sensor_id", "category", "start_ts", "start_epoch", "last_ts",
+        "last_epoch", "severity", "peak_value", "limit", "count", "message",
+        "checkpoint_count", "hold_epoch", "revision",
+    )
+
+    def __init__(self, sensor_id, alert, epoch):
+        self.sensor_id = sensor_id
+        self.category = alert["category"]
+        self.start_ts = alert["timestamp"]
+        self.start_epoch = epoch
+        self.last_ts = alert["timestamp"]
+        self.last_epoch = epoch
+        self.severity = alert["severity"]
+        self.peak_value = alert["value"]
+        self.limit = alert["limit"]
+        self.count = 1
+        self.message = alert["message"]
+        self.checkpoint_count = 1
+        self.hold_epoch = epoch     # last reading inside the clear margin
+        self.revision = 0
+
+    def observe(self, alert, epoch):
+        """Merge one more alert; returns True if the severity escalated."""
+
+        self.count += 1
+        if epoch >= self.last_epoch:
+            self.last_ts, self.last_epoch = alert["timestamp"], epoch
+
+        rank = SEVERITY_RANK.get(alert["severity"], 0)
+        peak_rank = SEVERITY_RANK.get(self.severity, 0)
+        escalated = rank > peak_rank
+        if escalated or (rank == peak_rank and alert["value"] > self.peak_value):
+            self.severity = alert["severity"]
+            self.peak_value = alert["value"]
+            self.limit = alert["limit"]
+            self.message = alert["message"]
+        return escalated
+
+    def persist(self, closed=False):
+        """Snapshot to write, with the next revision."""
+
+        self.revision += 1
+        snapshot = self.snapshot(closed)
+        snapshot["revision"] = self.revision
+        return snapshot
+
+    def snapshot(self, closed=False):
+        return {
+            "sensor_id": self.sensor_id,
+            "category": self.category,
+            "start_ts": self.start_ts,
+            "start_epoch": int(self.start_epoch),
+            "last_ts": self.last_ts,
+            "end_ts": self.last_ts if closed else None,
+            "severity": self.severity,
+            "peak_value": self.peak_value,
+            "limit": self.limit,
+            "count": self.count,
+            "message": self.message,
+        }
+
+
+class AlertSink:
+    def __init__(
+        self,
+        writer=None,
+        clear_seconds=ALERT_CLEAR_SECONDS,
+        rate_limit_count=ALERT_RATE_LIMIT_COUNT,
+        rate_limit_window=ALERT_RATE_LIMIT_WINDOW_SECONDS,
+        checkpoint_samples=ALERT_EPISODE_CHECKPOINT_SAMPLES,
+        clear_margin=ALERT_CLEAR_MARGIN,
+    ):
+        self._writer = writer
+        self.clear_seconds = clear_seconds
+        self.rate_limit_count = rate_limit_count
+        self.rate_limit_window = rate_limit_window
+        self.checkpoint_samples = checkpoint_samples
+        self.clear_margin = clear_margin
+        self._open = {}       # (sensor_id, category) -> _Episode
+        self._emitted = {}    # (sensor_id, category) -> deque of row epochs
+        self._lock = threading.Lock()
+        self._stats = {
+            "received": 0,
+            "stored": 0,
+            "merged": 0,
+            "rate_limited": 0,
+            "opened": 0,
+            "closed": 0,
+        }
+
+    def _get_writer(self):
+        return self._writer if self._writer is not None else get_writer()
+
+    def _allow(self, key, epoch):
+        sent = self._emitted.get(key)
+        if sent is None:
+            sent = self._emitted[key] = deque()
+        while sent and epoch - sent[0] >= self.rate_limit_window:
+            sent.popleft()
+        if len(sent) >= self.rate_limit_count:
+            return False
+        sent.append(epoch)
+        return True
+
+    def process(self, reading, alerts, metrics=()):
+        """Merge one reading's candidate alerts into episodes.
+
+        `metrics` are the reading's metric records; their values decide
+        whether a quiet category is clear or still within the margin.
+        Returns the alerts that should be stored as rows (to go into the
+        reading's bundle); episode snapshots are queued on the writer.
+        """
+
+        sensor_id = reading.get("sensor_id", DEFAULT_SENSOR_ID)
+        epoch = to_epoch(reading["timestamp"])
+        stored, snapshots = [], []
+
+        with self._lock:
+            self._stats["received"] += len(alerts)
+            active = set()
+            for alert in alerts:
+                key = (sensor_id, alert["category"])
+                active.add(key)
+                episode = self._open.get(key)
+
+                if episode is None:
+                    episode = self._open[key] = _Episode(sensor_id, alert, epoch)
+                    self._stats["opened"] += 1
+                    notify = True
+                else:
+                    notify = episode.observe(alert, epoch)
+                    if not notify:
+                        self._stats["merged"] += 1
+
+                if notify or episode.count - episode.checkpoint_count >= self.checkpoint_samples:
+                    episode.checkpoint_count = episode.count
+                    snapshots.append(episode.persist())
+
+                if notify:
+                    if self._allow(key, epoch):
+                        stored.append(alert)
+                    else:
+                        self._stats["rate_limited"] += 1
+
+            onsets = None
+            for key, episode in list(self._open.items()):
+                if key[0] != sensor_id or key in active:
+                    continue
+                if onsets is None:
+                    onsets = _onsets(metrics)
+                value, onset = onsets.get(key[1], (None, None))
+                if value is not None and value > onset - self.clear_margin * abs(onset):
+                    episode.hold_epoch = max(episode.hold_epoch, epoch)
+                    continue
+                if epoch - max(episode.last_epoch, episode.hold_epoch) >= self.clear_seconds:
+                    del self._open[key]
+                    self._stats["closed"] += 1
+                    snapshots.append(episode.persist(closed=True))
+
+            self._stats["stored"] += len(stored)
+
+        if snapshots:
+            writer = self._get_writer()
+            for snapshot in snapshots:
+                writer.submit_episode(snapshot)
+        return stored
+
+    def open_episodes(self, sensor_id=None):
+        with self._lock:
+            return [
+                episode.snapshot() for episode in self._open.values()
+                if sensor_id is None or episode.sensor_id == sensor_id
+            ]
+
+    def close_all(self):
+        """Close every open episode at its last reading (used at shutdown)."""
+
+        with self._lock:
+            episodes = list(self._open.values())
+            self._open.clear()
+            self._stats["closed"] += len(episodes)
+        if episodes:
+            writer = self._get_writer()
+            for episode in episodes:
+                writer.submit_episode(episode.persist(closed=True))
+        return len(episodes)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["open"] = len(self._open)
+        return snapshot
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_alert_sink():
+    """The process-wide sink used by the live ingest path."""
+
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = AlertSink()
+    return _sink
@@ -1,3 +1,5 @@
+import os
+
 # MQTT
 MQTT_SERVER = "broker.hivemq.com"
 MQTT_PORT = 1883
@@ -5,10 +7,166 @@ MQTT_TOPIC = ""
 MQTT_VENTILATION_TOPIC = ""
 MQTT_UNITY_TOPIC = "" 
 MQTT_UNITY_ALERT_TOPIC = ""
+MQTT_HEATMAP_TOPIC = ""
+
+# DB paths (IAS_DB_DIR relocates every database, e.g. to a temp dir for benchmarks)
+DB_DIR = os.environ.get("IAS_DB_DIR", "db")
+SENSOR_DB_PATH = os.path.join(DB_DIR, "sensor_data.db")
+METRICS_DB_PATH = os.path.join(DB_DIR, "metrics.db")
+ALERTS_DB_PATH = os.path.join(DB_DIR, "alerts.db")
+VENTILATION_DB_PATH = os.path.join(DB_DIR, "ventilation.db")
+
+# Storage layout:
+#   "split"   -> the four files above (compatibility mode)
+#   "unified" -> all tables in UNIFIED_DB_PATH, one transaction per reading
+DB_STORAGE_MODE = "split"
+UNIFIED_DB_PATH = os.path.join(DB_DIR, "factory.db")
+
+# SQLite connection tuning (applied to every pooled connection)
+SQLITE_JOURNAL_MODE = "WAL"        # WAL lets readers run alongside the ingest writer
+SQLITE_SYNCHRONOUS = "NORMAL"      # NORMAL is crash-safe under WAL; use FULL for power-loss durability
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_CACHE_SIZE_KB = 16384
+SQLITE_AUTO_VACUUM = "INCREMENTAL"   # new files only; lets retention hand freed pages back
+
+# Background DB writer (group commit)
+DB_WRITER_BATCH_SIZE = 500         # flush once this many rows are queued...
+DB_WRITER_FLUSH_INTERVAL = 0.25    # ...or after this many seconds, whichever comes first
+DB_WRITER_MAX_QUEUE = 50000        # producers block when the queue is this deep
+
+# Spill journal (app.db.spill): rows the writer cannot store now wait on disk
+SPILL_ENABLED = True
+SPILL_DIR = os.path.join(DB_DIR, "spill")
+SPILL_MAX_BYTES = 256 * 1024 * 1024      # journal cap; records past it are dropped (and counted)
+SPILL_SEGMENT_BYTES = 8 * 1024 * 1024    # roll to a new segment file past this size
+SPILL_SUBMIT_TIMEOUT_SECONDS = 0.05      # producers wait this long on a full queue, then spill
+SPILL_DRAIN_INTERVAL_SECONDS = 5.0       # how often a non-empty journal is retried
+SPILL_FSYNC = False                      # fsync every append (survives power loss, not just crashes)
+
+# MQTT processing workers
+MQTT_WORKER_COUNT = 4                  # 0 = process inline in the paho network thread
+MQTT_QUEUE_MAXSIZE = 10000             # total queued messages across all workers
+MQTT_BACKPRESSURE_POLICY = "drop_oldest"  # "block" | "drop_oldest" | "drop_newest"
+MQTT_LAG_WARN_SECONDS = 2.0            # queue wait above this counts as lagging
+
+# CO exposure (STEL/TWA) engine
+DEFAULT_SENSOR_ID = "default"
+CO_STEL_WINDOW_SECONDS = 15 * 60
+CO_TWA_WINDOW_SECONDS = 8 * 60 * 60
+CO_STEL_BUCKET_SECONDS = 15
+CO_TWA_BUCKET_SECONDS = 60
+CO_SAMPLE_SECONDS = 60              # nominal spacing of device readings
+CO_EXPOSURE_MAX_GAP_SECONDS = 180   # longer gaps count as unobserved (zero exposure)
+
+# Metric rollups (1 min, 15 min, 1 h buckets)
+ROLLUP_RESOLUTIONS = (60, 15 * 60, 60 * 60)
+ROLLUP_MAX_GAP_SECONDS = 180       # longer silences are not credited to any band
+
+# Sensor payloads: plausible range per field, applied to JSON and binary
+# payloads alike (NaN/inf are always rejected)
+SENSOR_FIELD_RANGES = {
+    "temp": (-40.0, 125.0),        # BMP280 operating range, °C
+    "pressure": (0.0, 2000.0),     # hPa, the whole PRESSURE_LIMITS table (BMP280 reads 300–1100)
+    "co_mean": (0.0, 10000.0),
+    "co_max": (0.0, 10000.0),
+    "pm2_5": (0.0, 10000.0),
+    "pm10": (0.0, 10000.0),
+    "co2": (0.0, 50000.0),
+    "humidity": (0.0, 100.0),      # optional, % RH (used for WBGT)
+}
+
+# Outgoing MQTT (ventilation commands, Unity status and alerts)
+MQTT_PUBLISH_ON_CHANGE = True          # skip payloads identical to the last one sent on a topic
+MQTT_PUBLISH_KEEPALIVE_SECONDS = 60.0  # ...but re-send unchanged payloads this often
+MQTT_PUBLISH_RETAIN = True             # retained, so late subscribers (Unity) get the current state
+MQTT_PUBLISH_QOS = 0
+
+# Alert episodes: a sustained exceedance is one episode, not one row per reading
+ALERT_CLEAR_SECONDS = 120              # hysteresis: clear this long before an episode closes
+ALERT_CLEAR_MARGIN = 0.05              # ...where "clear" means at least 5% below the alert onset
+ALERT_RATE_LIMIT_COUNT = 6             # alert rows per sensor/category...
+ALERT_RATE_LIMIT_WINDOW_SECONDS = 3600 # ...per this window (episode opens and escalations)
+ALERT_EPISODE_CHECKPOINT_SAMPLES = 30  # persist an open episode's peak/count every N merged alerts
+
+# Logging and telemetry
+LOG_LEVEL = "INFO"                     # DEBUG prints every message's pipeline output
+TELEMETRY_HTTP_HOST = "127.0.0.1"
+TELEMETRY_HTTP_PORT = 9108             # Prometheus text at /metrics; 0 disables the server
+TELEMETRY_SUMMARY_INTERVAL_SECONDS = 60.0  # periodic summary log line; 0 disables
+
+# Latest-state cache, served as JSON at /state on the telemetry HTTP server
+STATE_CACHE_ENABLED = True
+STATE_LONG_POLL_MAX_SECONDS = 30.0     # cap on ?wait= for long-poll requests
+
+# Raw MQTT capture log (for offline replay with app.mqtt.replay)
+CAPTURE_ENABLED = False
+CAPTURE_DIR = "capture"
+CAPTURE_SEGMENT_BYTES = 64 * 1024 * 1024   # roll to a new segment file past this size
+CAPTURE_FLUSH_SECONDS = 1.0                # buffered records reach the OS at least this often
+
+# Historical reprocessing (python -m app.metrics.reprocess)
+REPROCESS_CHUNK_SECONDS = 24 * 60 * 60     # readings per work unit, by time range
+REPROCESS_WORKERS = 0                      # worker processes; 0 = one per CPU
+REPROCESS_MAX_PENDING = 2                  # chunks in flight per worker (bounds parent memory)
+REPROCESS_PROGRESS_SECONDS = 5.0
+REPROCESS_FORECAST_WARMUP_SECONDS = 30 * 60  # readings replayed into the forecaster before each chunk
+
+# Online forecasts (Holt level + trend per sensor and metric)
+FORECAST_ENABLED = True
+FORECAST_HORIZON_SECONDS = 300             # predict this far ahead
+FORECAST_LEVEL_TAU_SECONDS = 60            # smoothing time constant of the level...
+FORECAST_TREND_TAU_SECONDS = 600           # ...and of the slope (longer = steadier trend)
+FORECAST_MIN_SAMPLES = 5                   # readings per sensor/metric before forecasting
+FORECAST_PREVENTILATE_SEVERITIES = ("high", "critical")  # predicted crossings that pre-ventilate
+
+# Spatial heatmaps for the digital twin (app.metrics.heatmap)
+HEATMAP_ENABLED = True
+SENSOR_POSITIONS = {}                      # sensor_id -> (x, y) floor position in metres; unset = no heatmap
+HEATMAP_BOUNDS = (0.0, 0.0, 40.0, 40.0)    # floor area covered: x0, y0, x1, y1 (metres)
+HEATMAP_CELL_SIZE = 1.0                    # grid cell edge (metres)
+HEATMAP_TILE = 8                           # cells per tile edge; only changed tiles are sent
+HEATMAP_POWER = 2.0                        # inverse-distance weighting exponent
+HEATMAP_MAX_AGE_SECONDS = 120              # a sensor's last value counts for this long
+HEATMAP_KEYFRAME_SECONDS = 30.0            # send every tile at least this often
+HEATMAP_SCALES = {                         # gas -> value range mapped onto 0..255
+    "co": (0.0, 200.0),
+    "co2": (400.0, 5000.0),
+    "pm2_5": (0.0, 250.0),
+    "pm10": (0.0, 430.0),
+}
+
+# Cold tier: old readings move to columnar chunk files (python -m app.db.tiering)
+COLD_ARCHIVE_DIR = os.path.join(DB_DIR, "cold")
+COLD_AFTER_SECONDS = 30 * 24 * 60 * 60     # readings older than this leave SQLite
+COLD_PARTITION_SECONDS = 24 * 60 * 60      # one chunk per partition (whole partitions only)
+COLD_CODEC = "npy"                         # "npy": memory-mapped columns; "npz": zlib-compressed
 
-# DB paths
-SENSOR_DB_PATH = "db/sensor_data.db"
-METRICS_DB_PATH = "db/metrics.db"
-ALERTS_DB_PATH = "db/alerts.db"
-VENTILATION_DB_PATH = "db/ventilation.db"
+# Retention (app.db.retention): seconds each table is kept, None = forever
+RETENTION_ENABLED = True
+RETENTION_POLICIES = {
+    "sensor_readings": 365 * 24 * 60 * 60,     # hot rows and cold-tier chunks
+    "metrics": 90 * 24 * 60 * 60,
+    "ventilation_history": 90 * 24 * 60 * 60,
+    "alerts": None,
+    "alert_episodes": None,
+}
+RETENTION_INTERVAL_SECONDS = 60 * 60       # time between passes in the listener
+RETENTION_BATCH_MS = 20                    # target time one delete batch holds a database
+RETENTION_PAUSE_SECONDS = 0.02             # gap between batches so ingest flushes get in
+RETENTION_VACUUM_PAGES = 256               # pages handed back per incremental_vacuum step
 
+# Sharded multi-zone ingestion (app.mqtt.sharding): zones hashed onto worker processes
+SHARDING_ENABLED = False
+MQTT_ZONE_TOPIC = "factory/{zone}/{node}/sensors"             # subscribed with + for each field
+MQTT_ZONE_VENTILATION_TOPIC = "factory/{zone}/ventilation"    # one HVAC command stream per zone
+MQTT_ZONE_UNITY_TOPIC = "factory/{zone}/{node}/unity"
+MQTT_ZONE_UNITY_ALERT_TOPIC = "factory/{zone}/{node}/alerts"
+SHARD_WORKERS = os.cpu_count() or 1        # worker processes, each with its own SQLite shard
+SHARD_VIRTUAL_NODES = 64                   # points per worker on the hash ring
+SHARD_QUEUE_MAXSIZE = 10000                # queued messages per worker
+SHARD_BACKPRESSURE_POLICY = "block"        # "block" | "drop_newest"
+SHARD_PUT_TIMEOUT_SECONDS = 1.0            # "block" re-checks the worker is alive this often
+SHARD_MAX_RESTARTS = 3                     # a worker dying more often than this stops ingest
+SHARD_FORWARD_INTERVAL_SECONDS = 0.5       # workers send telemetry and /state updates to the parent
+SHARD_DB_DIR = os.path.join(DB_DIR, "shards")  # shard N keeps its databases in SHARD_DB_DIR/shard-N
+ZONE_NODE_MAX_AGE_SECONDS = 120            # a node's last reading counts toward its zone for this long
@@ -72,4 +72,46 @@ WBGT_THRESHOLDS = {
     "red": (31, 33),
     "dark_red": (33, 35),
     "purple": (35, 100),
-}
\ No newline at end of file
+}
+
+# Band severities: generic environment bands (CO, CO2, temperature, pressure)
+ENV_SEVERITY = {
+    "green": "none",
+    "yellow": "warning",
+    "yellow-low": "warning",
+    "yellow-high": "warning",
+    "orange-low": "warning",
+    "orange-high": "warning",
+    "orange": "warning",
+    "red-low": "high",
+    "red-high": "high",
+    "red": "high",
+    "dark-red-low": "critical",
+    "dark-red-high": "critical",
+    "dark-red": "critical",
+    "dark_red": "critical",
+    "purple-low": "critical",
+    "purple-high": "critical",
+    "purple": "critical",
+}
+
+# Dust is only actionable from orange upwards
+PM_SEVERITY = {
+    "green": "none",
+    "yellow": "none",
+    "orange": "warning",
+    "red": "high",
+    "dark-red": "critical",
+    "purple": "critical",
+}
+
+# Heat stress: orange warns, anything hotter is critical
+WBGT_SEVERITY = {
+    "green": "none",
+    "yellow": "none",
+    "orange": "warning",
+    "red": "critical",
+    "dark-red": "critical",
+    "dark_red": "critical",
+    "purple": "critical",
+}
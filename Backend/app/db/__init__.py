@@ -1,4 +1,10 @@
-from .sensor_db import init_sensor_db, insert_sensor_reading
-from .metrics_db import init_metrics_db, insert_metric_record
-from .alerts_db import init_alerts_db, insert_alert_record
-from .ventilation_db import init_ventilation_db, insert_ventilation_record
+from .sensor_db import init_sensor_db, insert_sensor_reading, insert_sensor_readings
+from .metrics_db import init_metrics_db, insert_metric_record, insert_metric_records
+from .alerts_db import init_alerts_db, insert_alert_record, insert_alert_records
+from .episodes_db import init_episodes_db, upsert_episodes
+from .ventilation_db import init_ventilation_db, insert_ventilation_record, insert_ventilation_records
+from .connection import get_connection, read_connection, transaction, close_all, table_db_path, versioned_table
+from .storage import init_storage, insert_reading_bundles
+from .writer import BatchWriter, get_writer, shutdown_writer
+from .history import iter_readings, iter_metrics, iter_alerts, iter_ventilation, iter_episodes, fetch_columns, epoch_range
+from .tiering import init_cold_index, tier_readings
@@ -1,43 +1,70 @@
-import sqlite3
-from app.config.config import ALERTS_DB_PATH
-
-
-def init_alerts_db():
-    conn = sqlite3.connect(ALERTS_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS alerts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            category TEXT NOT NULL,
-            value REAL NOT NULL,
-            limit_value REAL NOT NULL,
-            severity TEXT NOT NULL,
-            message TEXT NOT NULL
+from app.config.config import DEFAULT_SENSOR_ID
+from app.db.connection import ensure_columns, relax_not_null, table_db_path, transaction
+from app.utils.time_utils import to_epoch
+
+INSERT_ALERT_SQL = """
+    INSERT INTO alerts
+        (timestamp, category, value, limit_value, severity, message, reading_id,
+         ts_epoch, sensor_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_alerts_db(path=None):
+    with transaction(path or table_db_path("alerts")) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                category TEXT NOT NULL,
+                value REAL,
+                limit_value REAL,
+                severity TEXT NOT NULL,
+                message TEXT NOT NULL,
+                reading_id INTEGER,
+                ts_epoch INTEGER,
+                sensor_id TEXT
+            )
+        """)
+        relax_not_null(conn, "alerts", ("value", "limit_value"))
+        ensure_columns(
+            conn, "alerts",
+            {"reading_id": "INTEGER", "ts_epoch": "INTEGER", "sensor_id": "TEXT"},
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alerts_reading ON alerts (reading_id)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alerts_category_epoch "
+            "ON alerts (category, ts_epoch)"
         )
-    """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alerts_severity_epoch "
+            "ON alerts (severity, ts_epoch)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_epoch ON alerts (ts_epoch)")
+
 
-    conn.commit()
-    conn.close()
+def alert_row(alert, reading_id=None, sensor_id=None):
+    return (
+        alert["timestamp"], alert["category"], alert["value"],
+        alert["limit"], alert["severity"], alert["message"],
+        reading_id,
+        int(to_epoch(alert["timestamp"])),
+        sensor_id or alert.get("sensor_id", DEFAULT_SENSOR_ID),
+    )
 
 
 def insert_alert_record(alert):
-    conn = sqlite3.connect(ALERTS_DB_PATH)
-    cur = conn.cursor()
+    insert_alert_records([alert])
 
-    cur.execute("""
-        INSERT INTO alerts (timestamp, category, value, limit_value, severity, message)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        alert["timestamp"], alert["category"], alert["value"],
-        alert["limit"], alert["severity"], alert["message"]
-    ))
 
-    conn.commit()
-    conn.close()
+def insert_alert_records(alerts):
+    """Insert many alerts with one executemany inside a single transaction."""
+    with transaction(table_db_path("alerts")) as conn:
+        conn.executemany(INSERT_ALERT_SQL, [alert_row(a) for a in alerts])
 
 # Backward-compatible alias used by some call sites/documentation
 def insert_alert(alert):
     """Insert an alert record (alias for insert_alert_record)."""
-    insert_alert_record(alert)
\ No newline at end of file
+    insert_alert_record(alert)
@@ -0,0 +1,225 @@
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from app.config.config import (
+    ALERTS_DB_PATH,
+    DB_STORAGE_MODE,
+    METRICS_DB_PATH,
+    SENSOR_DB_PATH,
+    SQLITE_AUTO_VACUUM,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    UNIFIED_DB_PATH,
+    VENTILATION_DB_PATH,
+)
+
+_SPLIT_PATHS = {
+    "sensor_readings": SENSOR_DB_PATH,
+    "cold_chunks": SENSOR_DB_PATH,
+    "metrics": METRICS_DB_PATH,
+    "metric_rollups": METRICS_DB_PATH,
+    "alerts": ALERTS_DB_PATH,
+    "alert_episodes": ALERTS_DB_PATH,
+    "ventilation_history": VENTILATION_DB_PATH,
+    "reprocess_runs": METRICS_DB_PATH,
+    "reprocess_chunks": METRICS_DB_PATH,
+}
+
+# One long-lived connection per database file, shared by every thread.
+# sqlite3 connections are not safe for concurrent use, so each one is
+# paired with a lock that is held for the duration of a transaction.
+_connections = {}
+_registry_lock = threading.Lock()
+
+# Query threads get their own read-only connections so history reads never
+# wait on the writer's lock; WAL lets them see a consistent snapshot. Every
+# one is also registered as (owner's map, key, connection) for close_all.
+_readers = threading.local()
+_reader_registry = []
+
+
+def _open(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    # Only takes effect before the first table exists
+    conn.execute(f"PRAGMA auto_vacuum = {SQLITE_AUTO_VACUUM}")
+    conn.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{int(SQLITE_CACHE_SIZE_KB)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+# Runtime override of the directory holding the database files
+_db_root = None
+
+
+def set_db_root(root):
+    """Keep every database file under `root` from now on (None restores config).
+
+    Used by tools that must not touch the live databases, e.g. replay into
+    a scratch directory. Call before the first query.
+    """
+
+    global _db_root
+    _db_root = root
+
+
+def get_db_root():
+    return _db_root
+
+
+def versioned_table(table, version):
+    """Name of version `version` of `table`, e.g. metrics_v3 (reprocessed output)."""
+
+    return f"{table}_v{int(version)}"
+
+
+def base_table(table):
+    """The live table a versioned table derives from (identity for live tables)."""
+
+    name, sep, suffix = table.rpartition("_v")
+    return name if sep and suffix.isdigit() else table
+
+
+def table_db_path(table):
+    """Database file holding `table` under the configured storage mode.
+
+    Versioned tables live next to the table they derive from.
+    """
+
+    path = (
+        UNIFIED_DB_PATH if DB_STORAGE_MODE == "unified"
+        else _SPLIT_PATHS[base_table(table)]
+    )
+    if _db_root is not None:
+        path = os.path.join(_db_root, os.path.basename(path))
+    return path
+
+
+def ensure_columns(conn, table, columns):
+    """Add any of `columns` ({name: declaration}) missing from an existing table."""
+
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def relax_not_null(conn, table, columns):
+    """Drop NOT NULL from `columns` of an existing table; returns True if rebuilt.
+
+    SQLite cannot alter a column's constraints, so the table is recreated
+    from its own DDL and its rows (ids included) copied over. Indexes go
+    with the old table; callers recreate them afterwards.
+    """
+
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not any(row[1] in columns and row[3] for row in info):
+        return False
+
+    (ddl,) = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    for name in columns:
+        ddl = re.sub(rf"(\b{name}\s+\w+)\s+NOT NULL", r"\1", ddl)
+    ddl = re.sub(rf"\b{table}\b", f"{table}__rebuild", ddl, count=1)
+
+    names = ", ".join(row[1] for row in info)
+    conn.execute(ddl)
+    conn.execute(f"INSERT INTO {table}__rebuild ({names}) SELECT {names} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}__rebuild RENAME TO {table}")
+    return True
+
+
+def get_connection(path):
+    """Return the shared (connection, lock) pair for a database file."""
+
+    key = os.path.abspath(path)
+    entry = _connections.get(key)
+    if entry is None:
+        with _registry_lock:
+            entry = _connections.get(key)
+            if entry is None:
+                entry = (_open(path), threading.RLock())
+                _connections[key] = entry
+    return entry
+
+
+def read_connection(path):
+    """Return this thread's read-only connection to a database file."""
+
+    key = os.path.abspath(path)
+    conns = getattr(_readers, "conns", None)
+    if conns is None:
+        conns = _readers.conns = {}
+    conn = conns.get(key)
+    if conn is None:
+        # Make sure the file (and its schema) exist before opening read-only
+        get_connection(path)
+        # Only its own thread uses it, but close_all may close it from another
+        conn = sqlite3.connect(f"file:{key}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}")
+        conn.execute(f"PRAGMA cache_size = -{int(SQLITE_CACHE_SIZE_KB)}")
+        conns[key] = conn
+        with _registry_lock:
+            _reader_registry.append((conns, key, conn))
+    return conn
+
+
+@contextmanager
+def transaction(path):
+    """Run a block inside a single BEGIN/COMMIT on the pooled connection.
+
+    Rolls back and re-raises on error. Nested use on the same thread simply
+    joins the outer transaction.
+    """
+
+    conn, lock = get_connection(path)
+    with lock:
+        if conn.in_transaction:
+            yield conn
+            return
+
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def close_all():
+    """Close every connection, checkpointing each file's WAL (used at shutdown).
+
+    Read-only connections go first, so the checkpoint can fold the whole WAL
+    back into the database and truncate it; a thread that reads again
+    afterwards opens a fresh connection.
+    """
+
+    with _registry_lock:
+        for conns, key, conn in _reader_registry:
+            if conns.get(key) is conn:
+                del conns[key]
+            conn.close()
+        _reader_registry.clear()
+
+        for conn, lock in _connections.values():
+            with lock:
+                try:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    conn.execute("PRAGMA optimize")
+                finally:
+                    conn.close()
+        _connections.clear()
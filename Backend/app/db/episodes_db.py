@@ -0,0 +1,71 @@
+from app.db.connection import ensure_columns, table_db_path, transaction
+
+# One row per (sensor, category, start); re-submitting an episode updates it
+# only with a later revision, so a snapshot drained late from the spill
+# journal can never overwrite a newer one or reopen a closed episode
+UPSERT_EPISODE_SQL = """
+    INSERT INTO alert_episodes (
+        sensor_id, category, start_ts, ts_epoch, last_ts, end_ts,
+        severity, peak_value, limit_value, count, message, revision
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (sensor_id, category, ts_epoch) DO UPDATE SET
+        last_ts = excluded.last_ts,
+        end_ts = excluded.end_ts,
+        severity = excluded.severity,
+        peak_value = excluded.peak_value,
+        limit_value = excluded.limit_value,
+        count = excluded.count,
+        message = excluded.message,
+        revision = excluded.revision
+    WHERE excluded.revision > alert_episodes.revision
+"""
+
+
+def init_episodes_db(path=None):
+    with transaction(path or table_db_path("alert_episodes")) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_episodes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sensor_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                start_ts TEXT NOT NULL,
+                ts_epoch INTEGER NOT NULL,
+                last_ts TEXT NOT NULL,
+                end_ts TEXT,
+                severity TEXT NOT NULL,
+                peak_value REAL NOT NULL,
+                limit_value REAL,
+                count INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                revision INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (sensor_id, category, ts_epoch)
+            )
+        """)
+        ensure_columns(conn, "alert_episodes", {"revision": "INTEGER NOT NULL DEFAULT 0"})
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alert_episodes_category_epoch "
+            "ON alert_episodes (category, ts_epoch)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alert_episodes_severity_epoch "
+            "ON alert_episodes (severity, ts_epoch)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alert_episodes_epoch "
+            "ON alert_episodes (ts_epoch)"
+        )
+
+
+def episode_row(e):
+    return (
+        e["sensor_id"], e["category"], e["start_ts"], e["start_epoch"],
+        e["last_ts"], e["end_ts"], e["severity"], e["peak_value"],
+        e["limit"], e["count"], e["message"], e.get("revision", 0),
+    )
+
+
+def upsert_episodes(episodes):
+    """Insert or update many episode snapshots in a single transaction."""
+    with transaction(table_db_path("alert_episodes")) as conn:
+        conn.executemany(UPSERT_EPISODE_SQL, [episode_row(e) for e in episodes])
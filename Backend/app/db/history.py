@@ -0,0 +1,279 @@
+"""
+Read-side history queries over readings, metrics, alerts, alert episodes
+and ventilation.
+
+Every query is a half-open time range [start, end) on the indexed integer
+`ts_epoch` column; `start`/`end` may be epoch seconds or ISO timestamps and
+either may be omitted. Filters take a single value or a list of values.
+
+    for m in iter_metrics(start, end, metric_type="CO_STEL"):
+        ...
+    cols = fetch_columns("metrics", start, end, ["ts_epoch", "value"],
+                         metric_type="CO_STEL")
+
+Iterators stream rows in chunks from a per-thread read-only connection, so
+a long scan never holds the ingest writer's lock. Versioned tables written
+by app.metrics.reprocess (metrics_v2, ...) are queried like their live table.
+
+Readings moved to the cold tier (app.db.tiering) are merged back in
+transparently, in the same (ts_epoch, id) order.
+"""
+
+import heapq
+import itertools
+
+import numpy as np
+
+from app.db.connection import base_table, read_connection, table_db_path
+from app.db.tiering import cold_chunks, cold_epoch_range, iter_cold_blocks, read_cold_columns
+from app.utils.time_utils import to_epoch
+
+_COLUMNS = {
+    "sensor_readings": (
+        "id", "timestamp", "ts_epoch", "temp", "pressure", "co_mean", "co_max",
+        "co_valid", "pm2_5", "pm10", "co2", "humidity", "sensor_id",
+    ),
+    "metrics": (
+        "id", "timestamp", "ts_epoch", "metric_type", "value", "window",
+        "limit_value", "status", "reading_id", "sensor_id",
+    ),
+    "alerts": (
+        "id", "timestamp", "ts_epoch", "category", "value", "limit_value",
+        "severity", "message", "reading_id", "sensor_id",
+    ),
+    "ventilation_history": (
+        "id", "timestamp", "ts_epoch", "mode", "fan_supply", "fan_exhaust",
+        "ac_power", "reasons", "reading_id",
+    ),
+    # ts_epoch is the episode start
+    "alert_episodes": (
+        "id", "sensor_id", "category", "start_ts", "ts_epoch", "last_ts", "end_ts",
+        "severity", "peak_value", "limit_value", "count", "message",
+    ),
+}
+
+# Columns each table may be filtered on (all backed by a (column, ts_epoch) index)
+_FILTERS = {
+    "sensor_readings": (),
+    "metrics": ("metric_type",),
+    "alerts": ("category", "severity"),
+    "ventilation_history": ("mode",),
+    "alert_episodes": ("category", "severity"),
+}
+
+# numpy dtype per numeric column; anything else comes back as an object array
+_NUMERIC = {
+    "id": np.int64, "ts_epoch": np.int64, "reading_id": np.float64,
+    "temp": np.float64, "pressure": np.float64, "co_mean": np.float64,
+    "co_max": np.float64, "co_valid": np.int8, "pm2_5": np.float64,
+    "pm10": np.float64, "co2": np.float64, "humidity": np.float64,
+    "value": np.float64,
+    "limit_value": np.float64, "fan_supply": np.float64,
+    "fan_exhaust": np.float64, "ac_power": np.float64,
+    "peak_value": np.float64, "count": np.int64,
+}
+
+
+def _epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return int(to_epoch(value))
+
+
+def _build_query(table, columns, start, end, filters, descending, limit):
+    base = base_table(table)
+    if base not in _COLUMNS:
+        raise ValueError(f"Unknown history table: {table}")
+    columns = tuple(columns or _COLUMNS[base])
+    unknown = set(columns) - set(_COLUMNS[base])
+    if unknown:
+        raise ValueError(f"Unknown columns for {table}: {sorted(unknown)}")
+
+    where, params = [], []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name not in _FILTERS[base]:
+            raise ValueError(f"{table} cannot be filtered on {name}")
+        if isinstance(value, (list, tuple, set, frozenset)):
+            values = list(value)
+            where.append(f"{name} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        else:
+            where.append(f"{name} = ?")
+            params.append(value)
+
+    start, end = _epoch(start), _epoch(end)
+    if start is not None:
+        where.append("ts_epoch >= ?")
+        params.append(start)
+    if end is not None:
+        where.append("ts_epoch < ?")
+        params.append(end)
+
+    order = "DESC" if descending else "ASC"
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY ts_epoch {order}, id {order}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return columns, sql, params
+
+
+def _iter_hot(table, start, end, columns, descending, limit, chunk_size, filters):
+    columns, sql, params = _build_query(
+        table, columns, start, end, filters, descending, limit
+    )
+    cur = read_connection(table_db_path(table)).execute(sql, params)
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        cur.close()
+
+
+def _iter_cold(start, end, columns, descending):
+    floats = [_NUMERIC.get(name) is np.float64 for name in columns]
+    for block in iter_cold_blocks(start, end, columns, descending):
+        lists = []
+        for name, is_float in zip(columns, floats):
+            values = block[name].tolist()
+            if is_float:
+                values = [None if v != v else v for v in values]
+            lists.append(values)
+        for row in zip(*lists):
+            yield dict(zip(columns, row))
+
+
+def _iter_tiered(start, end, columns, descending, limit, chunk_size):
+    """Readings from the cold and hot tiers, merged in (ts_epoch, id) order."""
+
+    columns = tuple(columns or _COLUMNS["sensor_readings"])
+    keyed = columns + tuple(k for k in ("ts_epoch", "id") if k not in columns)
+    start, end = _epoch(start), _epoch(end)
+    rows = heapq.merge(
+        _iter_cold(start, end, keyed, descending),
+        _iter_hot("sensor_readings", start, end, keyed, descending, limit, chunk_size, {}),
+        key=lambda row: (row["ts_epoch"], row["id"]),
+        reverse=descending,
+    )
+    if limit is not None:
+        rows = itertools.islice(rows, int(limit))
+    for row in rows:
+        if keyed != columns:
+            row = {name: row[name] for name in columns}
+        yield row
+
+
+def _tiered(table, start, end):
+    return table == "sensor_readings" and bool(cold_chunks(_epoch(start), _epoch(end)))
+
+
+def iter_rows(table, start=None, end=None, columns=None, descending=False,
+              limit=None, chunk_size=1000, **filters):
+    """Yield rows of `table` as dicts, oldest first unless `descending`."""
+
+    if _tiered(table, start, end):
+        return _iter_tiered(start, end, columns, descending, limit, chunk_size)
+    return _iter_hot(table, start, end, columns, descending, limit, chunk_size, filters)
+
+
+def iter_readings(start=None, end=None, **kwargs):
+    return iter_rows("sensor_readings", start, end, **kwargs)
+
+
+def iter_metrics(start=None, end=None, metric_type=None, **kwargs):
+    return iter_rows("metrics", start, end, metric_type=metric_type, **kwargs)
+
+
+def iter_alerts(start=None, end=None, category=None, severity=None, **kwargs):
+    return iter_rows(
+        "alerts", start, end, category=category, severity=severity, **kwargs
+    )
+
+
+def iter_ventilation(start=None, end=None, mode=None, **kwargs):
+    return iter_rows("ventilation_history", start, end, mode=mode, **kwargs)
+
+
+def iter_episodes(start=None, end=None, category=None, severity=None, **kwargs):
+    """Alert episodes that started in [start, end)."""
+
+    return iter_rows(
+        "alert_episodes", start, end, category=category, severity=severity, **kwargs
+    )
+
+
+def fetch_columns(table, start=None, end=None, columns=None, descending=False,
+                  limit=None, **filters):
+    """Return {column: numpy array} for the matching rows.
+
+    Numeric columns are float64/int64 arrays (NULL -> NaN for floats);
+    text columns are object arrays.
+    """
+
+    if _tiered(table, start, end):
+        return _fetch_tiered(start, end, columns, descending, limit)
+    return _fetch_hot(table, start, end, columns, descending, limit, filters)
+
+
+def _fetch_hot(table, start, end, columns, descending, limit, filters):
+    columns, sql, params = _build_query(
+        table, columns, start, end, filters, descending, limit
+    )
+    rows = read_connection(table_db_path(table)).execute(sql, params).fetchall()
+
+    result = {}
+    for i, name in enumerate(columns):
+        values = [row[i] for row in rows]
+        dtype = _NUMERIC.get(name)
+        if dtype is np.float64:
+            result[name] = np.array(
+                [np.nan if v is None else v for v in values], dtype=np.float64
+            )
+        elif dtype is not None:
+            result[name] = np.array(values, dtype=dtype)
+        else:
+            result[name] = np.array(values, dtype=object)
+    return result
+
+
+def _fetch_tiered(start, end, columns, descending, limit):
+    columns = tuple(columns or _COLUMNS["sensor_readings"])
+    keyed = columns + tuple(k for k in ("ts_epoch", "id") if k not in columns)
+    start, end = _epoch(start), _epoch(end)
+    cold = read_cold_columns(start, end, keyed)
+    hot = _fetch_hot("sensor_readings", start, end, keyed, False, None, {})
+    merged = {
+        name: np.concatenate([cold[name].astype(hot[name].dtype), hot[name]])
+        for name in keyed
+    }
+    # Hot rows only predate cold ones when readings arrived late
+    if len(cold["ts_epoch"]) and len(hot["ts_epoch"]) and hot["ts_epoch"][0] < cold["ts_epoch"][-1]:
+        order = np.lexsort((merged["id"], merged["ts_epoch"]))
+        merged = {name: values[order] for name, values in merged.items()}
+    if descending:
+        merged = {name: values[::-1] for name, values in merged.items()}
+    if limit is not None:
+        merged = {name: values[:int(limit)] for name, values in merged.items()}
+    return {name: merged[name] for name in columns}
+
+
+def epoch_range(table):
+    """(oldest, newest) ts_epoch in `table`, including archived readings."""
+
+    conn = read_connection(table_db_path(table))
+    low, high = conn.execute(f"SELECT MIN(ts_epoch), MAX(ts_epoch) FROM {table}").fetchone()
+    if base_table(table) == "sensor_readings":
+        cold_low, cold_high = cold_epoch_range()
+        lows = [v for v in (low, cold_low) if v is not None]
+        highs = [v for v in (high, cold_high) if v is not None]
+        low = min(lows) if lows else None
+        high = max(highs) if highs else None
+    return low, high
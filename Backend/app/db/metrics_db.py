@@ -1,38 +1,68 @@
-import sqlite3
-from app.config.config import METRICS_DB_PATH
-
-
-def init_metrics_db():
-    conn = sqlite3.connect(METRICS_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS metrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            metric_type TEXT NOT NULL,
-            value REAL NOT NULL,
-            window TEXT NOT NULL,
-            limit_value REAL NOT NULL,
-            status TEXT NOT NULL
+from app.config.config import DEFAULT_SENSOR_ID
+from app.db.connection import ensure_columns, relax_not_null, table_db_path, transaction
+from app.db.rollup_db import commit_band_clock, update_rollups
+from app.utils.time_utils import to_epoch
+
+INSERT_METRIC_SQL = """
+    INSERT INTO metrics
+        (timestamp, metric_type, value, window, limit_value, status, reading_id,
+         ts_epoch, sensor_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_metrics_db(path=None):
+    with transaction(path or table_db_path("metrics")) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                metric_type TEXT NOT NULL,
+                value REAL,
+                window TEXT NOT NULL,
+                limit_value REAL,
+                status TEXT NOT NULL,
+                reading_id INTEGER,
+                ts_epoch INTEGER,
+                sensor_id TEXT
+            )
+        """)
+        # Readings in a threshold gap have no limit; older files required one
+        relax_not_null(conn, "metrics", ("value", "limit_value"))
+        ensure_columns(
+            conn, "metrics",
+            {"reading_id": "INTEGER", "ts_epoch": "INTEGER", "sensor_id": "TEXT"},
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_metrics_reading ON metrics (reading_id)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_metrics_type_epoch "
+            "ON metrics (metric_type, ts_epoch)"
         )
-    """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_epoch ON metrics (ts_epoch)")
 
-    conn.commit()
-    conn.close()
+
+def metric_row(m, reading_id=None, sensor_id=None):
+    return (
+        m["timestamp"], m["type"], m["value"],
+        m["window"], m["limit"], m["status"],
+        reading_id,
+        int(to_epoch(m["timestamp"])),
+        sensor_id or m.get("sensor_id", DEFAULT_SENSOR_ID),
+    )
 
 
 def insert_metric_record(m):
-    conn = sqlite3.connect(METRICS_DB_PATH)
-    cur = conn.cursor()
+    insert_metric_records([m])
 
-    cur.execute("""
-        INSERT INTO metrics (timestamp, metric_type, value, window, limit_value, status)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        m["timestamp"], m["type"], m["value"],
-        m["window"], m["limit"], m["status"]
-    ))
 
-    conn.commit()
-    conn.close()
+def insert_metric_records(records):
+    """Insert many metric rows with one executemany inside a single transaction.
+
+    Rollups are updated in the same transaction.
+    """
+    with transaction(table_db_path("metrics")) as conn:
+        conn.executemany(INSERT_METRIC_SQL, [metric_row(m) for m in records])
+        clock = update_rollups(conn, records)
+    commit_band_clock(clock)
@@ -0,0 +1,199 @@
+"""
+Schema migrations.
+
+    python -m app.db.migrate [--target db/factory.db]   # merge into unified
+    python -m app.db.migrate --upgrade                 # epoch columns + indexes
+
+Merge: every storage table (readings, metrics, alerts, ventilation, rollups,
+alert episodes, the cold-chunk index, reprocessing runs and their versioned
+outputs) is copied with its ids and every column the legacy file has.
+Metric, alert and ventilation rows that predate `reading_id` are linked to
+the reading with the same timestamp; rollups from before they were keyed by
+sensor are rebuilt from the merged metrics. The merge refuses to run into a
+target that already holds any of these rows.
+Set DB_STORAGE_MODE = "unified" in config.py once the merge is done.
+
+Upgrade: adds the `ts_epoch` column and the history indexes to existing
+databases and fills `ts_epoch` for rows written before it existed.
+"""
+
+import argparse
+import os
+
+from app.config.config import (
+    ALERTS_DB_PATH,
+    METRICS_DB_PATH,
+    SENSOR_DB_PATH,
+    UNIFIED_DB_PATH,
+    VENTILATION_DB_PATH,
+)
+from app.db.alerts_db import init_alerts_db
+from app.db.connection import base_table, get_connection, table_db_path, transaction
+from app.db.episodes_db import init_episodes_db
+from app.db.metrics_db import init_metrics_db
+from app.db.rollup_db import init_rollup_db, rebuild_rollups
+from app.db.sensor_db import init_sensor_db
+from app.db.tiering import init_cold_index
+from app.db.ventilation_db import init_ventilation_db
+
+# Legacy split files, in the order they are merged
+_SOURCES = (SENSOR_DB_PATH, METRICS_DB_PATH, ALERTS_DB_PATH, VENTILATION_DB_PATH)
+
+# Every table the storage layer keeps; versioned copies (metrics_v2, ...)
+# written by app.metrics.reprocess are merged with their base table
+_MERGED_TABLES = (
+    "sensor_readings", "cold_chunks", "metrics", "metric_rollups", "alerts",
+    "alert_episodes", "ventilation_history", "reprocess_runs", "reprocess_chunks",
+)
+
+_INITS = {
+    "sensor_readings": init_sensor_db,
+    "metrics": init_metrics_db,
+    "alerts": init_alerts_db,
+    "ventilation_history": init_ventilation_db,
+}
+
+# Created up front so the target has their current layout
+_DERIVED_INITS = {
+    "metric_rollups": init_rollup_db,
+    "alert_episodes": init_episodes_db,
+    "cold_chunks": init_cold_index,
+}
+
+
+def backfill_epochs(conn, table):
+    """Fill `ts_epoch` from the ISO timestamp where it is still NULL."""
+
+    # Uses the ts_epoch index, so this is cheap once a table is backfilled
+    return conn.execute(
+        f"UPDATE {table} SET ts_epoch = CAST(strftime('%s', timestamp) AS INTEGER) "
+        "WHERE ts_epoch IS NULL"
+    ).rowcount
+
+
+def upgrade_schema():
+    """Bring every configured table up to the current schema.
+
+    Returns the number of rows whose `ts_epoch` was backfilled, per table.
+    """
+
+    filled = {}
+    for table, init in _INITS.items():
+        path = table_db_path(table)
+        init(path)
+        with transaction(path) as conn:
+            filled[table] = backfill_epochs(conn, table)
+    return filled
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def merge_into_unified(target=UNIFIED_DB_PATH):
+    """Copy every legacy table into `target`; returns rows copied per table."""
+
+    for init in list(_INITS.values()) + list(_DERIVED_INITS.values()):
+        init(target)
+    conn, _ = get_connection(target)
+
+    # ATTACH/DETACH are not allowed inside a transaction
+    attached = []
+    for i, path in enumerate(_SOURCES):
+        if os.path.exists(path):
+            conn.execute(f"ATTACH DATABASE ? AS legacy{i}", (path,))
+            attached.append(f"legacy{i}")
+
+    copied = {}
+    rebuild = False
+    try:
+        with transaction(target):
+            plan = []
+            for schema in attached:
+                for table, ddl in conn.execute(
+                    f"SELECT name, sql FROM {schema}.sqlite_master "
+                    "WHERE type = 'table' ORDER BY name"
+                ).fetchall():
+                    if base_table(table) in _MERGED_TABLES:
+                        plan.append((schema, table, ddl))
+
+            for schema, table, ddl in plan:
+                if not _columns(conn, "main", table):
+                    # reprocess bookkeeping and versioned outputs
+                    conn.execute(ddl)
+                    for (index_ddl,) in conn.execute(
+                        f"SELECT sql FROM {schema}.sqlite_master "
+                        "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                        (table,),
+                    ).fetchall():
+                        conn.execute(index_ddl)
+                elif conn.execute(f"SELECT 1 FROM main.{table} LIMIT 1").fetchone():
+                    raise RuntimeError(
+                        f"{target} already contains {table}; refusing to merge twice"
+                    )
+
+            for schema, table, _ in plan:
+                legacy_cols = set(_columns(conn, schema, table))
+                if table == "metric_rollups" and "sensor_id" not in legacy_cols:
+                    # Pre-sensor layout: recomputed from the merged metrics below
+                    rebuild = True
+                    continue
+                cols = [c for c in _columns(conn, "main", table) if c in legacy_cols]
+                col_list = ", ".join(cols)
+                order = " ORDER BY id" if "id" in cols else ""
+                cur = conn.execute(
+                    f"INSERT INTO main.{table} ({col_list}) "
+                    f"SELECT {col_list} FROM {schema}.{table}{order}"
+                )
+                copied[table] = cur.rowcount
+
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS main.idx_sensor_readings_timestamp "
+                "ON sensor_readings (timestamp)"
+            )
+            for table in ("metrics", "alerts", "ventilation_history"):
+                conn.execute(
+                    f"""
+                    UPDATE main.{table} SET reading_id = (
+                        SELECT s.id FROM main.sensor_readings s
+                        WHERE s.timestamp = {table}.timestamp
+                        ORDER BY s.id LIMIT 1
+                    )
+                    WHERE reading_id IS NULL
+                    """
+                )
+            for table in _INITS:
+                backfill_epochs(conn, table)
+    finally:
+        for schema in attached:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+    if rebuild:
+        copied["metric_rollups"] = rebuild_rollups(metrics_path=target, rollup_path=target)
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", default=UNIFIED_DB_PATH)
+    parser.add_argument(
+        "--upgrade", action="store_true",
+        help="add epoch columns and indexes to the configured databases",
+    )
+    args = parser.parse_args()
+
+    if args.upgrade:
+        filled = upgrade_schema()
+        for table, count in filled.items():
+            print(f"📦 {table}: backfilled ts_epoch on {count} rows")
+        print("✅ Schema is up to date")
+        return
+
+    copied = merge_into_unified(args.target)
+    for table, count in copied.items():
+        print(f"📦 {table}: {count} rows")
+    print(f"✅ Merged legacy databases into {args.target}")
+
+
+if __name__ == "__main__":
+    main()
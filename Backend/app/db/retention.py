@@ -0,0 +1,278 @@
+"""
+Retention and compaction for the SQLite stores.
+
+    python -m app.db.retention                 # one pass with RETENTION_POLICIES
+    python -m app.db.retention --dry-run       # count what a pass would delete
+    python -m app.db.retention --enable-incremental-vacuum   # one-off, offline
+
+RETENTION_POLICIES keeps each table for a number of seconds (None keeps it
+forever). A pass deletes expired rows in small batches, each in its own
+transaction on the shared connection, so the ingest writer's flushes slot in
+between them. The batch size adapts so a batch holds a database for about
+RETENTION_BATCH_MS, and RETENTION_PAUSE_SECONDS separates batches. For
+`sensor_readings` the policy also expires whole cold-tier chunks.
+
+Freed pages go back to the filesystem with `PRAGMA incremental_vacuum`, a
+few pages at a time. That needs auto_vacuum=INCREMENTAL: new databases get it
+from SQLITE_AUTO_VACUUM, and existing ones need the one-off
+--enable-incremental-vacuum (a full VACUUM, so run it with ingest stopped).
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+from app.config.config import (
+    RETENTION_BATCH_MS,
+    RETENTION_INTERVAL_SECONDS,
+    RETENTION_PAUSE_SECONDS,
+    RETENTION_POLICIES,
+    RETENTION_VACUUM_PAGES,
+)
+from app.db.connection import get_connection, table_db_path, transaction
+from app.db.tiering import expire_cold_chunks
+
+logger = logging.getLogger(__name__)
+
+_MIN_BATCH = 100
+_MAX_BATCH = 50000
+
+
+def _pragma(path, name):
+    conn, lock = get_connection(path)
+    with lock:
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+class RetentionManager:
+    def __init__(
+        self,
+        policies=RETENTION_POLICIES,
+        batch_ms=RETENTION_BATCH_MS,
+        pause=RETENTION_PAUSE_SECONDS,
+        vacuum_pages=RETENTION_VACUUM_PAGES,
+    ):
+        self.policies = dict(policies)
+        self.batch_seconds = batch_ms / 1000.0
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self._batch = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "passes": 0,
+            "rows_removed": 0,
+            "cold_chunks_removed": 0,
+            "bytes_reclaimed": 0,
+            "last_pass_seconds": 0.0,
+            "max_batch_ms": 0.0,
+        }
+
+    # ------------------------------------------------
+    # Deletes
+    # ------------------------------------------------
+    def _delete_batch(self, table, cutoff):
+        path = table_db_path(table)
+        size = self._batch.get(table, 1000)
+        started = time.perf_counter()
+        with transaction(path) as conn:
+            removed = conn.execute(
+                f"DELETE FROM {table} WHERE id IN "
+                f"(SELECT id FROM {table} WHERE ts_epoch < ? LIMIT ?)",
+                (cutoff, size),
+            ).rowcount
+        elapsed = time.perf_counter() - started
+
+        # Aim the next batch at the time budget
+        if elapsed > 0:
+            scaled = int(size * self.batch_seconds / elapsed)
+            self._batch[table] = max(_MIN_BATCH, min(_MAX_BATCH, scaled, size * 2))
+        with self._lock:
+            self._stats["max_batch_ms"] = max(self._stats["max_batch_ms"], elapsed * 1000.0)
+        return removed, removed == size
+
+    def expire_table(self, table, cutoff, stop=None):
+        """Delete rows of `table` older than `cutoff`; returns rows removed."""
+
+        total = 0
+        while stop is None or not stop.is_set():
+            removed, more = self._delete_batch(table, cutoff)
+            total += removed
+            if not more:
+                break
+            time.sleep(self.pause)
+        return total
+
+    def count_expired(self, table, cutoff):
+        conn, lock = get_connection(table_db_path(table))
+        with lock:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE ts_epoch < ?", (cutoff,)
+            ).fetchone()[0]
+
+    # ------------------------------------------------
+    # Compaction
+    # ------------------------------------------------
+    def reclaim(self, path, stop=None):
+        """Return free pages of one database file to the OS; returns bytes freed."""
+
+        if _pragma(path, "auto_vacuum") != 2:
+            if _pragma(path, "freelist_count"):
+                logger.warning(
+                    "%s is not in incremental auto_vacuum mode; run "
+                    "python -m app.db.retention --enable-incremental-vacuum", path
+                )
+            return 0
+
+        page_size = _pragma(path, "page_size")
+        conn, lock = get_connection(path)
+        freed = 0
+        while stop is None or not stop.is_set():
+            with lock:
+                before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if not before:
+                    break
+                # The pragma only runs as its rows are fetched
+                conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+                after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            freed += (before - after) * page_size
+            if after == before:
+                break
+            time.sleep(self.pause)
+        if freed:
+            with lock:
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        return freed
+
+    # ------------------------------------------------
+    # Passes
+    # ------------------------------------------------
+    def run_once(self, now=None, stop=None):
+        """Apply every policy once.
+
+        Returns {"rows": {table: removed}, "cold_chunks": n, "bytes": {file: freed},
+        "seconds": elapsed}.
+        """
+
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        report = {"rows": {}, "cold_chunks": 0, "bytes": {}}
+        paths = []
+        for table, keep in self.policies.items():
+            if keep is None:
+                continue
+            cutoff = int(now - keep)
+            report["rows"][table] = self.expire_table(table, cutoff, stop)
+            if table == "sensor_readings":
+                chunks, rows = expire_cold_chunks(cutoff)
+                report["cold_chunks"] = chunks
+                report["rows"][table] += rows
+            path = table_db_path(table)
+            if path not in paths:
+                paths.append(path)
+
+        for path in paths:
+            report["bytes"][path] = self.reclaim(path, stop)
+        report["seconds"] = time.perf_counter() - started
+
+        with self._lock:
+            self._stats["passes"] += 1
+            self._stats["rows_removed"] += sum(report["rows"].values())
+            self._stats["cold_chunks_removed"] += report["cold_chunks"]
+            self._stats["bytes_reclaimed"] += sum(report["bytes"].values())
+            self._stats["last_pass_seconds"] = report["seconds"]
+        return report
+
+    def start(self, interval=RETENTION_INTERVAL_SECONDS):
+        """Run a pass every `interval` seconds on a daemon thread; returns a stop Event."""
+
+        stop = threading.Event()
+
+        def run():
+            while not stop.is_set():
+                try:
+                    report = self.run_once(stop=stop)
+                    removed = sum(report["rows"].values())
+                    if removed or report["cold_chunks"]:
+                        logger.info(
+                            "🧹 Retention removed %d rows, %d cold chunks, reclaimed %d bytes in %.1fs",
+                            removed, report["cold_chunks"], sum(report["bytes"].values()),
+                            report["seconds"],
+                        )
+                except Exception:
+                    logger.exception("❌ Retention pass failed")
+                stop.wait(interval)
+
+        threading.Thread(target=run, name="db-retention", daemon=True).start()
+        return stop
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+def enable_incremental_vacuum():
+    """Switch every policy table's database to auto_vacuum=INCREMENTAL (full VACUUM)."""
+
+    switched = []
+    for table in RETENTION_POLICIES:
+        path = table_db_path(table)
+        if path in switched or _pragma(path, "auto_vacuum") == 2:
+            continue
+        conn, lock = get_connection(path)
+        with lock:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        switched.append(path)
+    return switched
+
+
+_manager = None
+
+
+def get_retention_manager():
+    global _manager
+    if _manager is None:
+        _manager = RetentionManager()
+    return _manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply retention policies to the SQLite stores")
+    parser.add_argument("--dry-run", action="store_true", help="only count expired rows")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="one-off full VACUUM into incremental auto_vacuum mode")
+    args = parser.parse_args()
+
+    from app.db.storage import init_storage
+
+    init_storage()
+    manager = get_retention_manager()
+
+    if args.enable_incremental_vacuum:
+        for path in enable_incremental_vacuum():
+            print(f"🔧 {path}: auto_vacuum = INCREMENTAL")
+        print("✅ Incremental vacuum enabled")
+        return
+
+    if args.dry_run:
+        now = time.time()
+        for table, keep in manager.policies.items():
+            if keep is None:
+                print(f"♾️  {table}: kept forever")
+                continue
+            print(f"🗑️  {table}: {manager.count_expired(table, int(now - keep))} rows past {keep / 86400:g} days")
+        return
+
+    report = manager.run_once()
+    for table, removed in report["rows"].items():
+        print(f"🗑️  {table}: {removed} rows removed")
+    if report["cold_chunks"]:
+        print(f"🧊 {report['cold_chunks']} cold chunks removed")
+    for path, freed in report["bytes"].items():
+        print(f"💾 {path}: {freed / 1024:.0f} KiB reclaimed")
+    print(f"✅ Retention pass done in {report['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Incrementally maintained time-series rollups of the `metrics` table.
+
+For every sensor, metric type and each resolution in ROLLUP_RESOLUTIONS
+(1 min, 15 min, 1 h) a row keeps min/max/sum/count/last plus seconds spent
+in each severity. Rows are merged with an UPSERT in the same transaction that
+stores the metric rows, so dashboards read a few thousand rollup rows
+instead of scanning raw history.
+
+Time-in-band: the interval since the same sensor's previous sample of the
+same metric is credited to the previous sample's severity (capped at
+ROLLUP_MAX_GAP_SECONDS), in the bucket of the current sample. The clock
+only moves on once the rows are committed (commit_band_clock), so a batch
+that rolls back and is stored again later is not counted twice.
+
+    python -m app.db.rollup_db --rebuild     # recompute from stored metrics
+"""
+
+import argparse
+import sqlite3
+import threading
+
+from app.config.config import DEFAULT_SENSOR_ID, ROLLUP_MAX_GAP_SECONDS, ROLLUP_RESOLUTIONS
+from app.config.thresholds import ENV_SEVERITY, PM_SEVERITY, WBGT_SEVERITY
+from app.db.connection import get_connection, table_db_path, transaction
+from app.utils.time_utils import from_epoch, to_epoch
+
+SEVERITIES = ("none", "warning", "high", "critical")
+
+# Severity of a "danger" status for the CO exposure metrics
+_CO_DANGER = {"CO_CEILING": "critical", "CO_STEL": "high", "CO_TWA": "warning"}
+_SEVERITY_MAPS = {
+    "PM2_5_LEVEL": PM_SEVERITY,
+    "PM10_LEVEL": PM_SEVERITY,
+    "WBGT": WBGT_SEVERITY,
+}
+
+UPSERT_ROLLUP_SQL = """
+    INSERT INTO metric_rollups (
+        resolution, bucket_start, metric_type, sensor_id,
+        min_value, max_value, sum_value, count, last_value, last_epoch,
+        sec_none, sec_warning, sec_high, sec_critical
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (resolution, metric_type, sensor_id, bucket_start) DO UPDATE SET
+        min_value = MIN(min_value, excluded.min_value),
+        max_value = MAX(max_value, excluded.max_value),
+        sum_value = sum_value + excluded.sum_value,
+        count = count + excluded.count,
+        last_value = CASE WHEN excluded.last_epoch >= last_epoch
+                          THEN excluded.last_value ELSE last_value END,
+        last_epoch = MAX(last_epoch, excluded.last_epoch),
+        sec_none = sec_none + excluded.sec_none,
+        sec_warning = sec_warning + excluded.sec_warning,
+        sec_high = sec_high + excluded.sec_high,
+        sec_critical = sec_critical + excluded.sec_critical
+"""
+
+
+def init_rollup_db(path=None):
+    """Create the rollup table; returns True if it replaced a pre-sensor layout.
+
+    Rollups are derived data, so an old table keyed without sensor_id is
+    dropped rather than migrated; rebuild_rollups() refills it.
+    """
+
+    replaced = False
+    with transaction(path or table_db_path("metric_rollups")) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(metric_rollups)")}
+        if columns and "sensor_id" not in columns:
+            conn.execute("DROP TABLE metric_rollups")
+            replaced = True
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS metric_rollups (
+                resolution INTEGER NOT NULL,
+                bucket_start INTEGER NOT NULL,
+                metric_type TEXT NOT NULL,
+                sensor_id TEXT NOT NULL,
+                min_value REAL NOT NULL,
+                max_value REAL NOT NULL,
+                sum_value REAL NOT NULL,
+                count INTEGER NOT NULL,
+                last_value REAL NOT NULL,
+                last_epoch INTEGER NOT NULL,
+                sec_none REAL NOT NULL DEFAULT 0,
+                sec_warning REAL NOT NULL DEFAULT 0,
+                sec_high REAL NOT NULL DEFAULT 0,
+                sec_critical REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (resolution, metric_type, sensor_id, bucket_start)
+            ) WITHOUT ROWID
+        """)
+    return replaced
+
+
+def metric_severity(metric_type, status):
+    if metric_type in _CO_DANGER:
+        return _CO_DANGER[metric_type] if status == "danger" else "none"
+    return _SEVERITY_MAPS.get(metric_type, ENV_SEVERITY).get(status, "none")
+
+
+class _BandClock:
+    """Remembers the previous (epoch, severity) per (sensor, metric) for time-in-band."""
+
+    def __init__(self):
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._last.get(key)
+
+    def advance(self, pending):
+        """Record the latest samples of a committed batch."""
+
+        with self._lock:
+            for key, sample in pending.items():
+                prev = self._last.get(key)
+                if prev is None or sample[0] >= prev[0]:
+                    self._last[key] = sample
+
+    def reset(self):
+        with self._lock:
+            self._last.clear()
+
+
+_clock = _BandClock()
+
+
+def commit_band_clock(pending):
+    """Advance the time-in-band clock once update_rollups' rows are committed."""
+
+    _clock.advance(pending)
+
+
+def update_rollups(conn, metrics, sensor_ids=None):
+    """Merge a batch of metric records into the rollup tables on `conn`.
+
+    `sensor_ids` runs parallel to `metrics` (default: each record's
+    "sensor_id", else DEFAULT_SENSOR_ID). Returns the clock samples to pass
+    to commit_band_clock after the transaction commits.
+    """
+
+    partial = {}
+    pending = {}    # (sensor_id, metric_type) -> (epoch, severity), this batch only
+    for i, m in enumerate(metrics):
+        value = m["value"]
+        if value is None:
+            continue
+        sensor_id = (
+            sensor_ids[i] if sensor_ids is not None else m.get("sensor_id")
+        ) or DEFAULT_SENSOR_ID
+        epoch = int(to_epoch(m["timestamp"]))
+        metric_type = m["type"]
+        severity = metric_severity(metric_type, m["status"])
+
+        clock_key = (sensor_id, metric_type)
+        prev = pending.get(clock_key) or _clock.get(clock_key)
+        if prev is None or epoch >= prev[0]:
+            pending[clock_key] = (epoch, severity)
+        if prev is None or epoch <= prev[0]:
+            prev_severity, dt = None, 0.0
+        else:
+            prev_severity, dt = prev[1], min(epoch - prev[0], ROLLUP_MAX_GAP_SECONDS)
+
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (resolution, epoch - epoch % resolution, metric_type, sensor_id)
+            acc = partial.get(key)
+            if acc is None:
+                acc = partial[key] = [value, value, 0.0, 0, value, epoch, 0.0, 0.0, 0.0, 0.0]
+            else:
+                if value < acc[0]:
+                    acc[0] = value
+                if value > acc[1]:
+                    acc[1] = value
+                if epoch >= acc[5]:
+                    acc[4], acc[5] = value, epoch
+            acc[2] += value
+            acc[3] += 1
+            if prev_severity is not None:
+                acc[6 + SEVERITIES.index(prev_severity)] += dt
+
+    if partial:
+        conn.executemany(
+            UPSERT_ROLLUP_SQL, [key + tuple(acc) for key, acc in partial.items()]
+        )
+    return pending
+
+
+def pick_resolution(start_epoch, end_epoch, max_points=2000):
+    """Finest resolution that returns at most `max_points` buckets per metric."""
+
+    span = max(0, end_epoch - start_epoch)
+    for resolution in sorted(ROLLUP_RESOLUTIONS):
+        if span / resolution <= max_points:
+            return resolution
+    return max(ROLLUP_RESOLUTIONS)
+
+
+def query_rollups(metric_type, start_epoch, end_epoch, resolution=None, sensor_id=None):
+    """Rollup buckets for one metric in [start_epoch, end_epoch), oldest first.
+
+    Without `sensor_id` the buckets of all sensors are combined: min/max/
+    sum/count over every sample, `last` from the latest sample, and
+    time-in-band summed (sensor-seconds).
+    """
+
+    if resolution is None:
+        resolution = pick_resolution(start_epoch, end_epoch)
+
+    sql = """
+        SELECT bucket_start, min(min_value), max(max_value), sum(sum_value), sum(count),
+               last_value, max(last_epoch),
+               sum(sec_none), sum(sec_warning), sum(sec_high), sum(sec_critical)
+        FROM metric_rollups
+        WHERE resolution = ? AND metric_type = ?
+          AND bucket_start >= ? AND bucket_start < ?
+    """
+    params = [resolution, metric_type, start_epoch - start_epoch % resolution, end_epoch]
+    if sensor_id is not None:
+        sql += " AND sensor_id = ?"
+        params.append(sensor_id)
+    # SQLite takes last_value from the row that supplied max(last_epoch)
+    sql += " GROUP BY bucket_start ORDER BY bucket_start"
+
+    conn, lock = get_connection(table_db_path("metric_rollups"))
+    with lock:
+        rows = conn.execute(sql, params).fetchall()
+
+    return [
+        {
+            "bucket_start": from_epoch(bucket),
+            "resolution": resolution,
+            "min": lo,
+            "max": hi,
+            "mean": total / count if count else None,
+            "count": count,
+            "last": last,
+            "time_in_band": dict(zip(SEVERITIES, (s_none, s_warn, s_high, s_crit))),
+        }
+        for bucket, lo, hi, total, count, last, _, s_none, s_warn, s_high, s_crit in rows
+    ]
+
+
+def rebuild_rollups(chunk_size=50000, metrics_path=None, rollup_path=None):
+    """Recompute every rollup from the stored metrics; returns rows processed."""
+
+    metrics_path = metrics_path or table_db_path("metrics")
+    rollup_path = rollup_path or table_db_path("metric_rollups")
+    init_rollup_db(rollup_path)
+
+    with transaction(rollup_path) as conn:
+        conn.execute("DELETE FROM metric_rollups")
+    _clock.reset()
+
+    # A separate read connection so the cursor can stream while we write
+    reader = sqlite3.connect(metrics_path)
+    processed = 0
+    try:
+        cur = reader.execute(
+            "SELECT timestamp, metric_type, value, status, sensor_id FROM metrics "
+            "ORDER BY timestamp, id"
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            batch = [
+                {
+                    "timestamp": ts, "type": metric_type, "value": value,
+                    "status": status, "sensor_id": sensor_id,
+                }
+                for ts, metric_type, value, status, sensor_id in rows
+            ]
+            with transaction(rollup_path) as conn:
+                clock = update_rollups(conn, batch)
+            commit_band_clock(clock)
+            processed += len(batch)
+    finally:
+        reader.close()
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain metric rollup tables")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from raw metrics")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        count = rebuild_rollups()
+        print(f"✅ Rebuilt rollups from {count} metric rows")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
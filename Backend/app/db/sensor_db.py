@@ -1,44 +1,61 @@
-import sqlite3
-from app.config.config import SENSOR_DB_PATH
-
-
-def init_sensor_db():
-    conn = sqlite3.connect(SENSOR_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS sensor_readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            temp REAL,
-            pressure REAL,
-            co_mean REAL,
-            co_max REAL,
-            co_valid INTEGER,
-            pm2_5 REAL,
-            pm10 REAL,
-            co2 REAL
+from app.config.config import DEFAULT_SENSOR_ID
+from app.db.connection import ensure_columns, table_db_path, transaction
+from app.utils.time_utils import to_epoch
+
+INSERT_SENSOR_SQL = """
+    INSERT INTO sensor_readings
+    (timestamp, temp, pressure, co_mean, co_max, co_valid, pm2_5, pm10, co2, ts_epoch,
+     humidity, sensor_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_sensor_db(path=None):
+    with transaction(path or table_db_path("sensor_readings")) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sensor_readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                temp REAL,
+                pressure REAL,
+                co_mean REAL,
+                co_max REAL,
+                co_valid INTEGER,
+                pm2_5 REAL,
+                pm10 REAL,
+                co2 REAL,
+                ts_epoch INTEGER,
+                humidity REAL,
+                sensor_id TEXT
+            )
+        """)
+        ensure_columns(
+            conn, "sensor_readings",
+            {"ts_epoch": "INTEGER", "humidity": "REAL", "sensor_id": "TEXT"},
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sensor_readings_epoch "
+            "ON sensor_readings (ts_epoch)"
         )
-    """)
-
-    conn.commit()
-    conn.close()
 
 
-def insert_sensor_reading(r):
-    conn = sqlite3.connect(SENSOR_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO sensor_readings
-        (timestamp, temp, pressure, co_mean, co_max, co_valid, pm2_5, pm10, co2)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+def sensor_row(r):
+    return (
         r["timestamp"], r["temp"], r["pressure"],
         r["co_mean"], r["co_max"],
         1 if r["co_valid"] else 0,
-        r["pm2_5"], r["pm10"], r["co2"]
-    ))
+        r["pm2_5"], r["pm10"], r["co2"],
+        int(to_epoch(r["timestamp"])),
+        r.get("humidity"),
+        r.get("sensor_id", DEFAULT_SENSOR_ID),
+    )
+
+
+def insert_sensor_reading(r):
+    insert_sensor_readings([r])
+
 
-    conn.commit()
-    conn.close()
+def insert_sensor_readings(readings):
+    """Insert many readings with one executemany inside a single transaction."""
+    with transaction(table_db_path("sensor_readings")) as conn:
+        conn.executemany(INSERT_SENSOR_SQL, [sensor_row(r) for r in readings])
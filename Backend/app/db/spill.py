@@ -0,0 +1,329 @@
+"""
+Store-and-forward journal for rows the database cannot take right now.
+
+When a flush fails for a storage reason (locked by a backup or a long
+report, busy, I/O error) or the writer's queue stays full for longer than
+SPILL_SUBMIT_TIMEOUT_SECONDS, app.db.writer appends the rows here instead
+of dropping them or stalling ingest. A drain thread replays the journal,
+oldest first, through the writer's normal insert path once the database
+accepts writes again.
+
+Segments are files named spill-<created, ms>-<seq>.seg in SPILL_DIR (under
+the database root when one is set). Each starts with the 8-byte magic
+SEGMENT_MAGIC followed by records:
+
+    uint32  body length
+    uint32  CRC-32 of the body
+    bytes   body: JSON [kind, record]
+
+all little-endian. A torn or corrupt record ends its segment. The drain
+position (segment, offset) is kept in the `cursor` file and rewritten after
+every batch that commits, so a crash can at worst store one batch twice.
+The journal is capped at SPILL_MAX_BYTES; records past the cap are refused
+and counted as overflow.
+
+Rows the database rejects for their content (poison) are not journaled, as
+replaying them would fail again. dead_letter() appends them to
+DEAD_LETTER_FILE in the same directory, one JSON object per line with the
+error, for inspection or a manual re-import.
+"""
+
+import glob
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from app.config.config import (
+    DB_WRITER_BATCH_SIZE,
+    SPILL_DIR,
+    SPILL_DRAIN_INTERVAL_SECONDS,
+    SPILL_FSYNC,
+    SPILL_MAX_BYTES,
+    SPILL_SEGMENT_BYTES,
+)
+from app.db.connection import get_db_root
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b"IASSPL1\n"
+_RECORD = struct.Struct("<II")
+CURSOR_FILE = "cursor"
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+
+
+def spill_dir():
+    root = get_db_root()
+    if root is not None:
+        return os.path.join(root, os.path.basename(SPILL_DIR))
+    return SPILL_DIR
+
+
+def dead_letter(kind, record, error, directory=None):
+    """Append a row the database refused to the dead-letter file."""
+
+    directory = directory or spill_dir()
+    os.makedirs(directory, exist_ok=True)
+    line = json.dumps(
+        {"at": time.time(), "kind": kind, "error": str(error), "record": record},
+        separators=(",", ":"), default=str,
+    )
+    with open(os.path.join(directory, DEAD_LETTER_FILE), "a") as f:
+        f.write(line + "\n")
+
+
+def read_segment(path, offset=len(SEGMENT_MAGIC)):
+    """Yield (next offset, kind, record) from `offset` to the end of a segment."""
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+        raise ValueError(f"{path} is not a spill segment")
+    end = len(data)
+    while offset + _RECORD.size <= end:
+        length, crc = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        body = data[start:start + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            logger.warning("Torn spill record at %s:%d ignored", path, offset)
+            return
+        kind, record = json.loads(body)
+        offset = start + length
+        yield offset, kind, record
+
+
+class SpillJournal:
+    def __init__(
+        self,
+        directory=None,
+        max_bytes=SPILL_MAX_BYTES,
+        segment_bytes=SPILL_SEGMENT_BYTES,
+        fsync=SPILL_FSYNC,
+    ):
+        self.directory = directory or spill_dir()
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._file = None      # segment being appended to
+        self._active = None    # ...and its path
+        self._size = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+        # Only one drain at a time: the cursor belongs to it
+        self._drain_lock = threading.Lock()
+        self._stats = {"spilled": 0, "drained": 0, "overflow": 0, "drain_failures": 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._cursor = self._load_cursor()
+        segments = self.segments()
+        self._bytes = sum(os.path.getsize(path) for path in segments)
+        self._depth = sum(
+            1 for path in segments for _ in read_segment(path, self._start_offset(path))
+        )
+        if self._depth:
+            logger.info("📼 Spill journal holds %d records from a previous run", self._depth)
+
+    # ------------------------------------------------
+    # Segments and cursor
+    # ------------------------------------------------
+    def segments(self):
+        """Segment files, oldest first."""
+
+        return sorted(glob.glob(os.path.join(self.directory, "spill-*.seg")))
+
+    def _open_segment(self):
+        while True:
+            name = f"spill-{int(time.time() * 1000):015d}-{self._seq:04d}.seg"
+            self._seq += 1
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                break
+        self._file = open(path, "ab")
+        self._file.write(SEGMENT_MAGIC)
+        self._active = path
+        self._size = len(SEGMENT_MAGIC)
+        self._bytes += self._size
+
+    def _seal(self):
+        """Close the active segment; the next append starts a new one."""
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._active = None
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                name, offset = f.read().split()
+            return name, int(offset)
+        except (OSError, ValueError):
+            return None
+
+    def _save_cursor(self, path, offset):
+        self._cursor = (os.path.basename(path), offset)
+        tmp = os.path.join(self.directory, CURSOR_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(f"{self._cursor[0]} {offset}\n")
+        os.replace(tmp, os.path.join(self.directory, CURSOR_FILE))
+
+    def _start_offset(self, path):
+        if self._cursor is not None and self._cursor[0] == os.path.basename(path):
+            return self._cursor[1]
+        return len(SEGMENT_MAGIC)
+
+    # ------------------------------------------------
+    # Producer (writer thread, or a producer facing a full queue)
+    # ------------------------------------------------
+    def append(self, items, requeue=False):
+        """Journal (kind, record) pairs; returns how many fit under the cap.
+
+        `requeue` puts back records the drain took but could not store. They
+        already count toward the cap (their old segment is still on disk), so
+        they are never refused.
+        """
+
+        bodies = [json.dumps(item, separators=(",", ":")).encode() for item in items]
+        with self._lock:
+            accepted = 0
+            for body in bodies:
+                size = _RECORD.size + len(body)
+                roll = self._file is None or self._size >= self.segment_bytes
+                needed = size + (len(SEGMENT_MAGIC) if roll else 0)
+                if not requeue and self._bytes + needed > self.max_bytes:
+                    break
+                if roll:
+                    self._seal()
+                    self._open_segment()
+                self._file.write(_RECORD.pack(len(body), zlib.crc32(body)))
+                self._file.write(body)
+                self._size += size
+                self._bytes += size
+                accepted += 1
+            if self._file is not None:
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            self._depth += accepted
+            if not requeue:
+                self._stats["spilled"] += accepted
+            self._stats["overflow"] += len(bodies) - accepted
+        if accepted < len(bodies):
+            logger.error(
+                "❌ Spill journal full (%d bytes): dropped %d records",
+                self.max_bytes, len(bodies) - accepted,
+            )
+        return accepted
+
+    # ------------------------------------------------
+    # Drain
+    # ------------------------------------------------
+    def drain(self, store, batch_size=DB_WRITER_BATCH_SIZE):
+        """Replay the journal through `store`, oldest first; returns records stored.
+
+        `store(items)` writes (kind, record) pairs and returns the ones it
+        could not write for storage reasons. A batch with leftovers ends the
+        pass: the leftovers go back on the journal and the rest waits for the
+        next pass.
+        """
+
+        drained = 0
+        with self._drain_lock:
+            while True:
+                with self._lock:
+                    segments = self.segments()
+                    if not segments:
+                        return drained
+                    path = segments[0]
+                    if path == self._active:
+                        self._seal()
+
+                batch, offset = [], None
+                for offset, kind, record in read_segment(path, self._start_offset(path)):
+                    batch.append((kind, record))
+                    if len(batch) >= batch_size:
+                        stored = self._store_batch(store, batch, path, offset)
+                        drained += stored
+                        if stored < len(batch):
+                            return drained
+                        batch = []
+                if batch:
+                    stored = self._store_batch(store, batch, path, offset)
+                    drained += stored
+                    if stored < len(batch):
+                        return drained
+
+                size = os.path.getsize(path)
+                os.remove(path)
+                with self._lock:
+                    self._bytes -= size
+                self._cursor = None
+                try:
+                    os.remove(os.path.join(self.directory, CURSOR_FILE))
+                except FileNotFoundError:
+                    pass
+
+    def _store_batch(self, store, batch, path, offset):
+        try:
+            leftover = store(batch)
+        except Exception as e:
+            leftover = batch
+            logger.error("❌ Spill drain failed: %s", e)
+        if len(leftover) == len(batch):
+            with self._lock:
+                self._stats["drain_failures"] += 1
+            return 0
+
+        # Part of the batch committed: never replay it, re-journal the rest
+        self._save_cursor(path, offset)
+        with self._lock:
+            self._depth -= len(batch)
+        if leftover:
+            self.append(leftover, requeue=True)
+        stored = len(batch) - len(leftover)
+        with self._lock:
+            self._stats["drained"] += stored
+            if leftover:
+                self._stats["drain_failures"] += 1
+        return stored
+
+    def start(self, store, interval=SPILL_DRAIN_INTERVAL_SECONDS):
+        """Drain every `interval` seconds on a daemon thread; returns a stop Event."""
+
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                if not self.depth():
+                    continue
+                try:
+                    drained = self.drain(store)
+                    if drained:
+                        logger.info(
+                            "📼 Drained %d spilled records (%d still journaled)",
+                            drained, self.depth(),
+                        )
+                except Exception:
+                    logger.exception("❌ Spill drain pass failed")
+
+        threading.Thread(target=run, name="db-spill-drain", daemon=True).start()
+        return stop
+
+    def depth(self):
+        with self._lock:
+            return self._depth
+
+    def close(self):
+        with self._lock:
+            self._seal()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["depth"] = self._depth
+            snapshot["bytes"] = self._bytes
+        snapshot["segments"] = len(self.segments())
+        return snapshot
@@ -0,0 +1,97 @@
+"""
+Per-reading storage.
+
+A "bundle" is everything produced for one sensor reading: the reading itself,
+its metric rows, alerts and the HVAC decision. Child rows are linked to the
+reading through `reading_id`.
+
+In "unified" mode every table lives in one file, so a whole batch of bundles
+is written in a single transaction: a crash never leaves a reading without
+its metrics or ventilation decision. In "split" mode each file gets its own
+transaction (same rows, no cross-file atomicity).
+"""
+
+import logging
+from contextlib import ExitStack
+
+from app.config.config import DEFAULT_SENSOR_ID
+from app.db.alerts_db import INSERT_ALERT_SQL, alert_row
+from app.db.connection import table_db_path, transaction
+from app.db.episodes_db import init_episodes_db
+from app.db.metrics_db import INSERT_METRIC_SQL, metric_row
+from app.db.migrate import upgrade_schema
+from app.db.rollup_db import commit_band_clock, init_rollup_db, rebuild_rollups, update_rollups
+from app.db.sensor_db import INSERT_SENSOR_SQL, sensor_row
+from app.db.tiering import init_cold_index
+from app.db.ventilation_db import INSERT_VENTILATION_SQL, ventilation_row
+
+logger = logging.getLogger(__name__)
+
+TABLES = ("sensor_readings", "metrics", "alerts", "ventilation_history")
+
+
+def init_storage():
+    """Create every table for the configured storage mode.
+
+    Also upgrades older databases in place (epoch columns and indexes).
+    """
+
+    upgrade_schema()
+    if init_rollup_db():
+        count = rebuild_rollups()
+        logger.info("📊 Rollups re-keyed by sensor: rebuilt from %d metric rows", count)
+    init_episodes_db()
+    init_cold_index()
+
+
+def make_bundle(reading, metrics=(), alerts=(), ventilation=None):
+    return {
+        "reading": reading,
+        "metrics": list(metrics),
+        "alerts": list(alerts),
+        "ventilation": ventilation,
+    }
+
+
+def insert_reading_bundles(bundles):
+    paths = {table: table_db_path(table) for table in TABLES}
+
+    with ExitStack() as stack:
+        # Always enter in TABLES order so concurrent callers take the
+        # per-file locks in the same order.
+        conns = {}
+        for path in dict.fromkeys(paths.values()):
+            conns[path] = stack.enter_context(transaction(path))
+
+        sensor_conn = conns[paths["sensor_readings"]]
+        metric_records, metric_rows, alert_rows, ventilation_rows = [], [], [], []
+        metric_sensors = []
+        clock = {}
+
+        for bundle in bundles:
+            reading_id = sensor_conn.execute(
+                INSERT_SENSOR_SQL, sensor_row(bundle["reading"])
+            ).lastrowid
+            sensor_id = bundle["reading"].get("sensor_id", DEFAULT_SENSOR_ID)
+            metric_records.extend(bundle["metrics"])
+            metric_sensors.extend([sensor_id] * len(bundle["metrics"]))
+            metric_rows.extend(
+                metric_row(m, reading_id, sensor_id) for m in bundle["metrics"]
+            )
+            alert_rows.extend(alert_row(a, reading_id, sensor_id) for a in bundle["alerts"])
+            if bundle.get("ventilation") is not None:
+                ventilation_rows.append(
+                    ventilation_row(bundle["ventilation"], reading_id)
+                )
+
+        if metric_rows:
+            metrics_conn = conns[paths["metrics"]]
+            metrics_conn.executemany(INSERT_METRIC_SQL, metric_rows)
+            clock = update_rollups(metrics_conn, metric_records, metric_sensors)
+        if alert_rows:
+            conns[paths["alerts"]].executemany(INSERT_ALERT_SQL, alert_rows)
+        if ventilation_rows:
+            conns[paths["ventilation_history"]].executemany(
+                INSERT_VENTILATION_SQL, ventilation_rows
+            )
+    commit_band_clock(clock)
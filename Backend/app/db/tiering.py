@@ -0,0 +1,408 @@
+"""
+Cold tier for `sensor_readings`.
+
+    python -m app.db.tiering                       # move readings older than COLD_AFTER_SECONDS
+    python -m app.db.tiering --older-than-days 7 [--codec npz]
+    python -m app.db.tiering --list
+
+Readings older than COLD_AFTER_SECONDS leave SQLite in whole time partitions
+(COLD_PARTITION_SECONDS, one day by default). Each partition becomes a chunk
+of per-column numpy arrays sorted by (ts_epoch, id):
+
+    codec "npy"  a directory with one .npy file per column, memory-mapped on
+                 read, so a scan only pages in the columns and rows it touches
+    codec "npz"  one zlib-compressed .npz file, smaller on disk, decompressed
+                 when read
+
+Every chunk is listed in the `cold_chunks` index (time range, id range, row
+count, codec). Chunk files are complete before the index row is inserted and
+the hot rows are deleted, both in one transaction. Readings that arrive late
+for an already archived partition become an extra chunk on the next run.
+
+app.db.history reads both tiers, so callers never need to know where a
+reading lives.
+"""
+
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+
+from app.config.config import (
+    COLD_AFTER_SECONDS,
+    COLD_ARCHIVE_DIR,
+    COLD_CODEC,
+    COLD_PARTITION_SECONDS,
+)
+from app.db.connection import get_db_root, read_connection, table_db_path, transaction
+from app.utils.time_utils import from_epoch
+
+CODECS = ("npy", "npz")
+
+# Column -> dtype in a chunk; text columns are stored as UTF-8 bytes
+COLD_COLUMNS = {
+    "id": np.int64,
+    "timestamp": np.bytes_,
+    "ts_epoch": np.int64,
+    "temp": np.float64,
+    "pressure": np.float64,
+    "co_mean": np.float64,
+    "co_max": np.float64,
+    "co_valid": np.int8,
+    "pm2_5": np.float64,
+    "pm10": np.float64,
+    "co2": np.float64,
+    "humidity": np.float64,
+    "sensor_id": np.bytes_,
+}
+
+
+def cold_dir():
+    root = get_db_root()
+    if root is not None:
+        return os.path.join(root, os.path.basename(COLD_ARCHIVE_DIR))
+    return COLD_ARCHIVE_DIR
+
+
+def init_cold_index(path=None):
+    with transaction(path or table_db_path("cold_chunks")) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cold_chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                start_epoch INTEGER NOT NULL,
+                end_epoch INTEGER NOT NULL,
+                min_ts INTEGER NOT NULL,
+                max_ts INTEGER NOT NULL,
+                min_id INTEGER NOT NULL,
+                max_id INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                codec TEXT NOT NULL,
+                path TEXT NOT NULL UNIQUE,
+                created_at TEXT NOT NULL
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cold_chunks_table_epoch "
+            "ON cold_chunks (table_name, start_epoch)"
+        )
+
+
+# ------------------------------------------------
+# Chunk files
+# ------------------------------------------------
+def write_chunk_files(path, columns, codec=COLD_CODEC):
+    """Write {column: array} to `path` atomically (temp name, then rename)."""
+
+    if codec not in CODECS:
+        raise ValueError(f"Unknown cold codec: {codec}")
+    tmp = path + ".tmp"
+    for stale in (tmp, path):
+        if os.path.isdir(stale):
+            shutil.rmtree(stale)
+        elif os.path.exists(stale):
+            os.remove(stale)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if codec == "npz":
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **columns)
+    else:
+        os.makedirs(tmp)
+        for name, values in columns.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), values)
+    os.replace(tmp, path)
+
+
+class ColdChunk:
+    """Lazily opened arrays of one chunk."""
+
+    def __init__(self, path, codec):
+        self.path = path
+        self.codec = codec
+        self._npz = None
+
+    def has_column(self, name):
+        if self.codec == "npz":
+            if self._npz is None:
+                self._npz = np.load(self.path)
+            return name in self._npz.files
+        return os.path.exists(os.path.join(self.path, f"{name}.npy"))
+
+    def column(self, name):
+        if self.codec == "npz":
+            if self._npz is None:
+                self._npz = np.load(self.path)
+            return self._npz[name]
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def close(self):
+        if self._npz is not None:
+            self._npz.close()
+            self._npz = None
+
+
+def _decode(name, values):
+    """Chunk array -> the shape app.db.history returns for that column."""
+
+    if COLD_COLUMNS[name] is np.bytes_:
+        decoded = np.char.decode(values, "utf-8").astype(object)
+        # NULL text is stored as an empty string
+        decoded[decoded == ""] = None
+        return decoded
+    return np.asarray(values)
+
+
+def cold_chunks(start=None, end=None, table="sensor_readings"):
+    """Index rows of the chunks that may hold readings in [start, end)."""
+
+    sql = (
+        "SELECT path, codec, min_ts, max_ts FROM cold_chunks WHERE table_name = ?"
+    )
+    params = [table]
+    if start is not None:
+        sql += " AND max_ts >= ?"
+        params.append(start)
+    if end is not None:
+        sql += " AND min_ts < ?"
+        params.append(end)
+    sql += " ORDER BY min_ts, path"
+    conn = read_connection(table_db_path("cold_chunks"))
+    return conn.execute(sql, params).fetchall()
+
+
+def _read_chunk(base, rel_path, codec, start, end, columns):
+    chunk = ColdChunk(os.path.join(base, rel_path), codec)
+    try:
+        ts = chunk.column("ts_epoch")
+        lo = 0 if start is None else int(np.searchsorted(ts, start, "left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, end, "left"))
+        block = {}
+        for name in columns:
+            if chunk.has_column(name):
+                block[name] = _decode(name, chunk.column(name)[lo:hi])
+            else:
+                # Chunks archived before a column was added read as NULL
+                block[name] = (
+                    np.full(hi - lo, None, dtype=object) if COLD_COLUMNS[name] is np.bytes_
+                    else np.full(hi - lo, np.nan)
+                )
+        return block
+    finally:
+        chunk.close()
+
+
+def _empty(columns):
+    return {
+        name: np.empty(0, dtype=object if COLD_COLUMNS[name] is np.bytes_ else COLD_COLUMNS[name])
+        for name in columns
+    }
+
+
+def iter_cold_blocks(start=None, end=None, columns=None, descending=False):
+    """Yield {column: array} blocks of archived readings in [start, end).
+
+    Blocks come in time order and each is sorted by (ts_epoch, id), so the
+    concatenation of all blocks is too. Chunks whose time ranges overlap
+    (late readings for an archived partition) are merged into one block.
+    """
+
+    columns = tuple(columns or COLD_COLUMNS)
+    keyed = columns + tuple(k for k in ("ts_epoch", "id") if k not in columns)
+    base = cold_dir()
+
+    # Group chunks into clusters of overlapping time ranges
+    clusters, cluster_end = [], None
+    for rel_path, codec, min_ts, max_ts in cold_chunks(start, end):
+        if clusters and min_ts <= cluster_end:
+            clusters[-1].append((rel_path, codec))
+            cluster_end = max(cluster_end, max_ts)
+        else:
+            clusters.append([(rel_path, codec)])
+            cluster_end = max_ts
+
+    for cluster in (reversed(clusters) if descending else clusters):
+        parts = [_read_chunk(base, path, codec, start, end, keyed) for path, codec in cluster]
+        if len(parts) == 1:
+            block = parts[0]
+        else:
+            block = {name: np.concatenate([p[name] for p in parts]) for name in keyed}
+            order = np.lexsort((block["id"], block["ts_epoch"]))
+            block = {name: values[order] for name, values in block.items()}
+        if not len(block["id"]):
+            continue
+        if descending:
+            block = {name: values[::-1] for name, values in block.items()}
+        yield {name: block[name] for name in columns}
+
+
+def read_cold_columns(start=None, end=None, columns=None):
+    """Concatenated {column: array} of the archived readings in [start, end)."""
+
+    columns = tuple(columns or COLD_COLUMNS)
+    blocks = list(iter_cold_blocks(start, end, columns))
+    if not blocks:
+        return _empty(columns)
+    return {name: np.concatenate([b[name] for b in blocks]) for name in columns}
+
+
+def cold_epoch_range():
+    """(min ts_epoch, max ts_epoch) over the cold tier, or (None, None)."""
+
+    conn = read_connection(table_db_path("cold_chunks"))
+    return conn.execute(
+        "SELECT MIN(min_ts), MAX(max_ts) FROM cold_chunks WHERE table_name = 'sensor_readings'"
+    ).fetchone()
+
+
+# ------------------------------------------------
+# Tiering job
+# ------------------------------------------------
+_SELECT_HOT_SQL = (
+    f"SELECT {', '.join(COLD_COLUMNS)} FROM sensor_readings "
+    "WHERE ts_epoch >= ? AND ts_epoch < ? ORDER BY ts_epoch, id"
+)
+
+
+def _hot_partitions(cutoff, partition_seconds):
+    rows = read_connection(table_db_path("sensor_readings")).execute(
+        "SELECT DISTINCT (ts_epoch / ?) * ? FROM sensor_readings WHERE ts_epoch < ?",
+        (partition_seconds, partition_seconds, cutoff),
+    ).fetchall()
+    return sorted(row[0] for row in rows)
+
+
+def _to_arrays(rows):
+    columns = {}
+    for i, (name, dtype) in enumerate(zip(COLD_COLUMNS, COLD_COLUMNS.values())):
+        values = [row[i] for row in rows]
+        if dtype is np.bytes_:
+            columns[name] = np.array(
+                [(v or "").encode("utf-8") for v in values], dtype=np.bytes_
+            )
+        elif dtype is np.float64:
+            columns[name] = np.array(
+                [np.nan if v is None else v for v in values], dtype=np.float64
+            )
+        else:
+            columns[name] = np.array(values, dtype=dtype)
+    return columns
+
+
+def _partition_columns(start, end, chunk_size=10000):
+    # Streamed from this thread's WAL reader, so ingest keeps writing meanwhile
+    cur = read_connection(table_db_path("sensor_readings")).execute(_SELECT_HOT_SQL, (start, end))
+    parts = []
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            parts.append(_to_arrays(rows))
+    finally:
+        cur.close()
+    if not parts:
+        return None
+    return {name: np.concatenate([part[name] for part in parts]) for name in COLD_COLUMNS}
+
+
+def archive_partition(start, end, codec=COLD_CODEC):
+    """Move the hot readings in [start, end) to a new cold chunk; returns rows moved."""
+
+    columns = _partition_columns(start, end)
+    if columns is None:
+        return 0
+    ids = columns["id"]
+    day = time.strftime("%Y/%m/%d", time.gmtime(start))
+    ext = ".npz" if codec == "npz" else ""
+    rel_path = f"sensor_readings/{day}/{start}-{int(ids.min())}-{int(ids.max())}{ext}"
+    write_chunk_files(os.path.join(cold_dir(), rel_path), columns, codec)
+
+    # The index lives in the readings' own file, so the index row and the
+    # delete commit together
+    with transaction(table_db_path("sensor_readings")) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO cold_chunks (table_name, start_epoch, end_epoch, "
+            "min_ts, max_ts, min_id, max_id, rows, codec, path, created_at) "
+            "VALUES ('sensor_readings', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (start, end, int(columns["ts_epoch"][0]), int(columns["ts_epoch"][-1]),
+             int(ids.min()), int(ids.max()), len(ids), codec, rel_path,
+             from_epoch(time.time())),
+        )
+        conn.execute(
+            "DELETE FROM sensor_readings WHERE ts_epoch >= ? AND ts_epoch < ? "
+            "AND id BETWEEN ? AND ?",
+            (start, end, int(ids.min()), int(ids.max())),
+        )
+    return len(ids)
+
+
+def tier_readings(older_than=COLD_AFTER_SECONDS, now=None, codec=COLD_CODEC,
+                  partition_seconds=COLD_PARTITION_SECONDS):
+    """Archive every whole partition older than `older_than` seconds.
+
+    Returns {partition start: rows moved}.
+    """
+
+    init_cold_index()
+    now = time.time() if now is None else now
+    cutoff = int((now - older_than) // partition_seconds * partition_seconds)
+    moved = {}
+    for start in _hot_partitions(cutoff, partition_seconds):
+        moved[start] = archive_partition(start, start + partition_seconds, codec)
+    return moved
+
+
+def expire_cold_chunks(cutoff, table="sensor_readings"):
+    """Drop chunks whose newest reading is older than `cutoff`.
+
+    Returns (chunks removed, rows removed). Chunks straddling the cutoff are
+    kept whole.
+    """
+
+    init_cold_index()
+    with transaction(table_db_path("cold_chunks")) as conn:
+        expired = conn.execute(
+            "SELECT id, path, rows FROM cold_chunks WHERE table_name = ? AND max_ts < ?",
+            (table, cutoff),
+        ).fetchall()
+        conn.executemany("DELETE FROM cold_chunks WHERE id = ?", [(row[0],) for row in expired])
+
+    # Files go after the index commit, so a reader never sees a missing chunk
+    base = cold_dir()
+    for _, rel_path, _ in expired:
+        path = os.path.join(base, rel_path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+    return len(expired), sum(row[2] for row in expired)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old sensor readings to the cold tier")
+    parser.add_argument("--older-than-days", type=float,
+                        default=COLD_AFTER_SECONDS / 86400.0)
+    parser.add_argument("--codec", choices=CODECS, default=COLD_CODEC)
+    parser.add_argument("--list", action="store_true", help="show the chunk index")
+    args = parser.parse_args()
+
+    init_cold_index()
+    if args.list:
+        conn = read_connection(table_db_path("cold_chunks"))
+        for path, rows, codec, min_ts, max_ts in conn.execute(
+            "SELECT path, rows, codec, min_ts, max_ts FROM cold_chunks ORDER BY min_ts"
+        ):
+            print(f"🧊 {path} | {rows} rows | {codec} | {from_epoch(min_ts)} → {from_epoch(max_ts)}")
+        return
+
+    moved = tier_readings(args.older_than_days * 86400.0, codec=args.codec)
+    for start, rows in moved.items():
+        print(f"📦 {from_epoch(start)}: {rows} readings archived")
+    print(f"✅ {sum(moved.values())} readings moved to {cold_dir()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,67 @@
 import json
-import sqlite3
 
-from app.config.config import VENTILATION_DB_PATH
+from app.db.connection import ensure_columns, table_db_path, transaction
+from app.utils.time_utils import to_epoch
 
+INSERT_VENTILATION_SQL = """
+    INSERT INTO ventilation_history
+        (timestamp, mode, fan_supply, fan_exhaust, ac_power, reasons, reading_id, ts_epoch)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
 
-def init_ventilation_db():
-    conn = sqlite3.connect(VENTILATION_DB_PATH)
-    cur = conn.cursor()
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS ventilation_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            mode TEXT NOT NULL,
-            fan_supply INTEGER NOT NULL,
-            fan_exhaust INTEGER NOT NULL,
-            ac_power INTEGER NOT NULL,
-            reasons TEXT NOT NULL
+def init_ventilation_db(path=None):
+    with transaction(path or table_db_path("ventilation_history")) as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ventilation_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                fan_supply INTEGER NOT NULL,
+                fan_exhaust INTEGER NOT NULL,
+                ac_power INTEGER NOT NULL,
+                reasons TEXT NOT NULL,
+                reading_id INTEGER,
+                ts_epoch INTEGER
+            )
+            """
+        )
+        ensure_columns(
+            conn, "ventilation_history", {"reading_id": "INTEGER", "ts_epoch": "INTEGER"}
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ventilation_reading "
+            "ON ventilation_history (reading_id)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ventilation_mode_epoch "
+            "ON ventilation_history (mode, ts_epoch)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ventilation_epoch "
+            "ON ventilation_history (ts_epoch)"
         )
-        """
-    )
 
-    conn.commit()
-    conn.close()
+
+def ventilation_row(record, reading_id=None):
+    return (
+        record["timestamp"],
+        record["ventilation_mode"],
+        record["fan_supply_speed"],
+        record["fan_exhaust_speed"],
+        record["ac_power"],
+        json.dumps(record.get("reasons", [])),
+        reading_id,
+        int(to_epoch(record["timestamp"])),
+    )
 
 
 def insert_ventilation_record(record):
-    conn = sqlite3.connect(VENTILATION_DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        INSERT INTO ventilation_history
-            (timestamp, mode, fan_supply, fan_exhaust, ac_power, reasons)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (
-            record["timestamp"],
-            record["ventilation_mode"],
-            record["fan_supply_speed"],
-            record["fan_exhaust_speed"],
-            record["ac_power"],
-            json.dumps(record.get("reasons", [])),
-        ),
-    )
+    insert_ventilation_records([record])
+
 
-    conn.commit()
-    conn.close()
\ No newline at end of file
+def insert_ventilation_records(records):
+    """Insert many HVAC decisions with one executemany inside a single transaction."""
+    with transaction(table_db_path("ventilation_history")) as conn:
+        conn.executemany(INSERT_VENTILATION_SQL, [ventilation_row(r) for r in records])
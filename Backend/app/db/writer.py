@@ -0,0 +1,373 @@
+"""
+Background group-commit writer.
+
+The ingest path hands finished rows to the writer and returns immediately;
+a single background thread drains the queue and flushes rows in batches
+(whichever comes first: DB_WRITER_BATCH_SIZE rows or DB_WRITER_FLUSH_INTERVAL
+seconds). Each flush groups rows per table and writes every group with one
+executemany inside one transaction; reading bundles go through
+app.db.storage so their rows share a reading_id.
+
+Rows are never silently lost to a struggling database. A flush that fails
+for a storage reason (sqlite3.OperationalError: locked, busy, I/O) and rows
+that find the queue full for SPILL_SUBMIT_TIMEOUT_SECONDS go to the spill
+journal (app.db.spill), which is drained back through the same inserts. A
+flush that fails on the data instead is retried row by row, so one bad row
+cannot take its batch with it. A row that still fails (poison) goes to the
+dead-letter file next to the journal; for a bundle, its reading is stored
+on its own first, so only the derived rows wait there.
+"""
+
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from app.config.config import (
+    DB_WRITER_BATCH_SIZE,
+    DB_WRITER_FLUSH_INTERVAL,
+    DB_WRITER_MAX_QUEUE,
+    SPILL_ENABLED,
+    SPILL_SUBMIT_TIMEOUT_SECONDS,
+)
+from app.db.alerts_db import insert_alert_records
+from app.db.episodes_db import upsert_episodes
+from app.db.metrics_db import insert_metric_records
+from app.db.sensor_db import insert_sensor_readings
+from app.db.spill import SpillJournal, dead_letter
+from app.db.storage import insert_reading_bundles, make_bundle
+from app.db.ventilation_db import insert_ventilation_records
+from app.telemetry.instruments import count_error, count_rows, observe_stage
+
+logger = logging.getLogger(__name__)
+
+BUNDLE = "bundle"
+SENSOR = "sensor"
+METRIC = "metric"
+ALERT = "alert"
+VENTILATION = "ventilation"
+EPISODE = "episode"
+
+# Flush order matters: the reading is written before anything derived from it.
+_BATCH_INSERTS = (
+    (BUNDLE, insert_reading_bundles),
+    (SENSOR, insert_sensor_readings),
+    (METRIC, insert_metric_records),
+    (ALERT, insert_alert_records),
+    (VENTILATION, insert_ventilation_records),
+    (EPISODE, upsert_episodes),
+)
+
+_STOP = object()
+
+
+class BatchWriter:
+    def __init__(
+        self,
+        batch_size=DB_WRITER_BATCH_SIZE,
+        flush_interval=DB_WRITER_FLUSH_INTERVAL,
+        max_queue=DB_WRITER_MAX_QUEUE,
+        journal=None,
+        submit_timeout=SPILL_SUBMIT_TIMEOUT_SECONDS,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Without a journal, producers block on a full queue as before
+        self.journal = journal
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._stop_drain = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "errors": 0,
+            "spilled": 0,
+            "poison": 0,
+            "salvaged": 0,
+            "dead_lettered": 0,
+            "lost": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+            "last_batch_rows": 0,
+        }
+
+    # ------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="db-writer", daemon=True
+            )
+            self._thread.start()
+        if self.journal is not None and self._stop_drain is None:
+            self._stop_drain = self.journal.start(self._store_spilled)
+        return self
+
+    def stop(self, timeout=None):
+        """Flush everything still queued, then stop the background thread."""
+
+        if self._thread is None or not self._thread.is_alive():
+            self._drain_inline()
+        else:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        if self.journal is not None:
+            if self._stop_drain is not None:
+                self._stop_drain.set()
+                self._stop_drain = None
+            # Last chance for spilled rows; whatever is left waits for the next start
+            if self.journal.depth():
+                self.journal.drain(self._store_spilled)
+            self.journal.close()
+
+    def flush(self, timeout=None):
+        """Block until every row submitted before this call is on disk."""
+
+        if self._thread is None or not self._thread.is_alive():
+            self._drain_inline()
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    # ------------------------------------------------
+    # Producers
+    # ------------------------------------------------
+    def submit(self, kind, record):
+        try:
+            self._queue.put(
+                (kind, record), timeout=None if self.journal is None else self.submit_timeout
+            )
+        except queue.Full:
+            # The database is falling behind: park the row on disk instead of waiting
+            self._spill([(kind, record)])
+            return
+        with self._lock:
+            self._stats["enqueued"] += 1
+            depth = self._queue.qsize()
+            if depth > self._stats["max_depth"]:
+                self._stats["max_depth"] = depth
+
+    def submit_reading_bundle(self, reading, metrics=(), alerts=(), ventilation=None):
+        """Queue a reading with everything derived from it, stored together."""
+
+        self.submit(BUNDLE, make_bundle(reading, metrics, alerts, ventilation))
+
+    def submit_sensor_reading(self, reading):
+        self.submit(SENSOR, reading)
+
+    def submit_metric(self, metric):
+        self.submit(METRIC, metric)
+
+    def submit_alert(self, alert):
+        self.submit(ALERT, alert)
+
+    def submit_ventilation(self, record):
+        self.submit(VENTILATION, record)
+
+    def submit_episode(self, episode):
+        """Queue an alert episode snapshot (later snapshots overwrite earlier)."""
+
+        self.submit(EPISODE, episode)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["queue_depth"] = self._queue.qsize()
+        if self.journal is not None:
+            for name, value in self.journal.stats().items():
+                snapshot[f"spill_{name}"] = value
+        return snapshot
+
+    # ------------------------------------------------
+    # Consumer
+    # ------------------------------------------------
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, markers, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+
+                if stop or markers or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if stop:
+                # Anything enqueued after the stop marker still gets written.
+                batch.extend(self._take_all(markers))
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set()
+            if stop:
+                return
+
+    def _take_all(self, markers):
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if isinstance(item, threading.Event):
+                markers.append(item)
+            elif item is not _STOP:
+                rows.append(item)
+
+    def _drain_inline(self):
+        markers = []
+        rows = self._take_all(markers)
+        if rows:
+            self._write(rows)
+        for marker in markers:
+            marker.set()
+
+    def _insert(self, kind, insert_many, rows):
+        """Write rows of one kind; returns (rows written, rows to try again later)."""
+
+        try:
+            insert_many(rows)
+            count_rows(kind, len(rows))
+            return len(rows), []
+        except sqlite3.OperationalError as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            count_error("db_write", e)
+            logger.error("❌ DB writer failed to store %d %s rows: %s", len(rows), kind, e)
+            return 0, rows
+        except Exception as e:
+            if len(rows) == 1:
+                with self._lock:
+                    self._stats["poison"] += 1
+                count_error("db_poison", e)
+                logger.error("❌ DB writer cannot store a %s row: %s", kind, e)
+                return self._salvage(kind, rows[0], e), []
+            # Some row is bad (e.g. breaks a NOT NULL): find it one row at a time
+            with self._lock:
+                self._stats["errors"] += 1
+            count_error("db_write", e)
+            written, leftover = 0, []
+            for row in rows:
+                done, failed = self._insert(kind, insert_many, [row])
+                written += done
+                leftover.extend(failed)
+            return written, leftover
+
+    def _salvage(self, kind, record, error):
+        """Keep what can be kept of a poison row; returns rows written."""
+
+        written = 0
+        if kind == BUNDLE:
+            # The raw reading is worth storing even if its derived rows are not
+            try:
+                insert_sensor_readings([record["reading"]])
+                count_rows(SENSOR, 1)
+                written = 1
+                with self._lock:
+                    self._stats["salvaged"] += 1
+            except Exception as e:
+                logger.error("❌ DB writer cannot store the bundle's reading either: %s", e)
+        try:
+            dead_letter(kind, record, error, self.journal.directory if self.journal else None)
+            with self._lock:
+                self._stats["dead_lettered"] += 1
+        except Exception as e:
+            with self._lock:
+                self._stats["lost"] += 1
+            logger.error("❌ Could not dead-letter a %s row, dropped: %s", kind, e)
+        return written
+
+    def _store(self, batch):
+        """Write (kind, record) pairs; returns (rows written, pairs left over)."""
+
+        grouped = {}
+        for kind, record in batch:
+            grouped.setdefault(kind, []).append(record)
+
+        written, leftover = 0, []
+        for kind, insert_many in _BATCH_INSERTS:
+            rows = grouped.get(kind)
+            if not rows:
+                continue
+            done, failed = self._insert(kind, insert_many, rows)
+            written += done
+            leftover.extend((kind, record) for record in failed)
+        return written, leftover
+
+    def _store_spilled(self, batch):
+        written, leftover = self._store(batch)
+        with self._lock:
+            self._stats["written"] += written
+        return leftover
+
+    def _spill(self, items):
+        accepted = 0
+        if self.journal is not None:
+            try:
+                accepted = self.journal.append(items)
+            except Exception as e:
+                logger.error("❌ Could not journal %d rows: %s", len(items), e)
+        with self._lock:
+            self._stats["spilled"] += accepted
+            self._stats["lost"] += len(items) - accepted
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        written, leftover = self._store(batch)
+        if leftover:
+            self._spill(leftover)
+
+        observe_stage("db_flush", time.perf_counter() - started)
+        with self._lock:
+            self._stats["written"] += written
+            self._stats["batches"] += 1
+            self._stats["last_batch_rows"] = written
+            self._stats["last_flush_ms"] = (time.perf_counter() - started) * 1000.0
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process-wide writer, starting it on first use."""
+
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BatchWriter(
+                    journal=SpillJournal() if SPILL_ENABLED else None
+                ).start()
+                atexit.register(shutdown_writer)
+    return _writer
+
+
+def shutdown_writer(timeout=None):
+    """Flush and stop the process-wide writer (safe to call more than once)."""
+
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop(timeout)
@@ -0,0 +1,374 @@
+"""
+Declarative HVAC rules, compiled once into a fast evaluator.
+
+RULES is an ordered table of groups. A group runs when its `guard` holds
+(checked once, when the group is reached); with `first_match` its rules are
+alternatives (if / elif), otherwise every matching rule applies. A rule has:
+
+    when    conditions that must all hold:
+              ("in", field, values)        field value is one of values
+              ("any_in", fields, values)   any of the fields is one of values
+              ("lt" | "gt", field, x)      numeric comparison
+              ("crossing", field, sevs)    forecast crossing into one of sevs
+              ("mode", modes)              current ventilation mode is one of modes
+    mode    ventilation mode to switch to
+    mode_if only switch when the current mode is one of these
+    set     outputs assigned outright
+    floor   outputs raised to at least this value
+    add     outputs incremented
+    reason  str.format template over FIELDS, formatted only when the rule fires
+    stop    skip every later group
+
+Fields are read with the same defaults the hand-written controller used;
+tests/test_hvac_rules.py checks the engine against that controller on
+seeded random packets.
+"""
+
+import argparse
+import string
+from datetime import datetime, timezone
+
+from app.config.config import FORECAST_PREVENTILATE_SEVERITIES
+
+SEVERE = ("high", "critical")
+FORECAST_NAMES = ("co", "co2", "pm2_5", "pm10", "wbgt", "temp")
+
+DEFAULT_ACTIONS = {
+    "ventilation_mode": "NORMAL",
+    "fan_supply_speed": 40,
+    "fan_exhaust_speed": 30,
+    "ac_power": 0,
+}
+_OUTPUTS = ("fan_supply_speed", "fan_exhaust_speed", "ac_power")
+
+# name -> (path into the status packet, default when missing[, transform])
+FIELDS = {
+    "co_severity": (("co", "severity"), "none"),
+    "co_level_upper": (("co", "level"), "green", str.upper),
+    "co_value": (("co", "value"), 0.0),
+    "co2_severity": (("co2", "severity"), "none"),
+    "co2_level_upper": (("co2", "level"), "green", str.upper),
+    "co2_value": (("co2", "value"), 0.0),
+    "pm25_severity": (("pm", "pm2_5", "severity"), "none"),
+    "pm25_level": (("pm", "pm2_5", "level"), "green"),
+    "pm25_value": (("pm", "pm2_5", "value"), 0.0),
+    "pm10_severity": (("pm", "pm10", "severity"), "none"),
+    "pm10_level": (("pm", "pm10", "level"), "green"),
+    "pm10_value": (("pm", "pm10", "value"), 0.0),
+    "temp_severity": (("temp", "severity"), "none"),
+    "temp_level": (("temp", "level"), "green"),
+    "temp_value": (("temp", "value"), 0.0),
+    "wbgt_severity": (("wbgt", "severity"), "none"),
+    "wbgt_level": (("wbgt", "level"), "green"),
+    "wbgt_value": (("wbgt", "value"), 0.0),
+    "pressure_severity": (("pressure", "severity"), "none"),
+    "pressure_level": (("pressure", "level"), "green"),
+    "pressure_value": (("pressure", "value"), 1015.0),
+}
+for _name in FORECAST_NAMES:
+    FIELDS[f"{_name}_crossing"] = (("forecast", _name, "crossing"), None)
+    FIELDS[f"{_name}_crossing_level"] = (("forecast", _name, "crossing"), None, lambda c: c["level"])
+    FIELDS[f"{_name}_crossing_eta_min"] = (
+        ("forecast", _name, "crossing"), None, lambda c: c["eta_s"] / 60,
+    )
+    FIELDS[f"{_name}_forecast"] = (("forecast", _name, "value"), 0.0)
+del _name
+
+_PM_READOUT = (
+    "PM2.5={pm25_value:.1f}µg/m³ ({pm25_level}), PM10={pm10_value:.1f}µg/m³ ({pm10_level})"
+)
+_HEAT_READOUT = "Temp={temp_value:.1f}°C ({temp_level}), WBGT={wbgt_value:.1f}°C ({wbgt_level})"
+
+
+def _forecast_rule(name):
+    heat = name in ("wbgt", "temp")
+    return {
+        "when": (("crossing", f"{name}_crossing", FORECAST_PREVENTILATE_SEVERITIES),),
+        "mode": "PRE_VENTILATION",
+        "floor": (
+            {"fan_supply_speed": 60, "ac_power": 50} if heat
+            else {"fan_exhaust_speed": 70, "fan_supply_speed": 55}
+        ),
+        "reason": (
+            f"{name.upper()} forecast {{{name}_forecast:.1f}} ({{{name}_crossing_level}}) "
+            f"in ~{{{name}_crossing_eta_min:.0f}} min → pre-ventilate"
+        ),
+    }
+
+
+RULES = (
+    # 1) CO — toxic gas overrides everything else
+    {"group": "co", "priority": 1, "first_match": True, "rules": (
+        {"when": (("in", "co_severity", SEVERE),),
+         "mode": "EMERGENCY_PURGE",
+         "set": {"fan_exhaust_speed": 100, "fan_supply_speed": 40, "ac_power": 0},
+         "reason": "CO {co_level_upper} ({co_value:.1f} ppm) → EMERGENCY_PURGE",
+         "stop": True},
+    )},
+    {"group": "co2", "priority": 2, "first_match": True, "rules": (
+        {"when": (("in", "co2_severity", SEVERE),),
+         "mode": "CO2_PURGE",
+         "floor": {"fan_supply_speed": 90, "fan_exhaust_speed": 75},
+         "reason": "CO2 {co2_level_upper} ({co2_value:.0f} ppm) → increase fresh air"},
+        {"when": (("in", "co2_severity", ("warning",)),),
+         "floor": {"fan_supply_speed": 70, "fan_exhaust_speed": 55},
+         "reason": "CO2 warning ({co2_value:.0f} ppm) → boost ventilation"},
+    )},
+    # 2) PM (dust)
+    {"group": "pm", "priority": 3, "first_match": True, "rules": (
+        {"when": (("any_in", ("pm25_severity", "pm10_severity"), SEVERE),),
+         "mode": "DUST_CONTROL",
+         "set": {"fan_exhaust_speed": 90, "fan_supply_speed": 60, "ac_power": 0},
+         "reason": "PM danger: " + _PM_READOUT},
+        {"when": (("any_in", ("pm25_severity", "pm10_severity"), ("warning",)),),
+         "mode": "DUST_CONTROL",
+         "floor": {"fan_exhaust_speed": 70, "fan_supply_speed": 50},
+         "reason": "PM warning: " + _PM_READOUT},
+    )},
+    # 3) Temperature / WBGT — heat stress
+    {"group": "heat", "priority": 4, "first_match": True, "rules": (
+        {"when": (("any_in", ("wbgt_severity", "temp_severity"), SEVERE),),
+         "mode": "HEAT_STRESS",
+         "floor": {"fan_supply_speed": 80, "fan_exhaust_speed": 60, "ac_power": 80},
+         "reason": "Heat danger: " + _HEAT_READOUT},
+        {"when": (("any_in", ("wbgt_severity", "temp_severity"), ("warning",)),),
+         "mode": "HEAT_STRESS", "mode_if": ("NORMAL",),
+         "floor": {"fan_supply_speed": 60, "fan_exhaust_speed": 50, "ac_power": 50},
+         "reason": "Heat warning: " + _HEAT_READOUT},
+    )},
+    # 4) Forecast — pre-ventilate, only while nothing is active yet
+    {"group": "forecast", "priority": 5, "guard": ("mode", ("NORMAL",)),
+     "rules": tuple(_forecast_rule(name) for name in FORECAST_NAMES)},
+    # 5) Pressure — supply / exhaust balance (normal ~ 1005–1025 hPa)
+    {"group": "pressure", "priority": 6, "rules": (
+        {"when": (("in", "pressure_level", ("orange", "red")), ("lt", "pressure_value", 1005)),
+         "add": {"fan_supply_speed": 15},
+         "reason": "Low pressure ({pressure_value:.1f} hPa) → increase supply"},
+        {"when": (("in", "pressure_level", ("orange", "red")), ("gt", "pressure_value", 1025)),
+         "add": {"fan_exhaust_speed": 15},
+         "reason": "High pressure ({pressure_value:.1f} hPa) → increase exhaust"},
+        {"when": (("in", "pressure_severity", SEVERE),),
+         "mode": "PRESSURE_CORRECTION", "mode_if": ("NORMAL",),
+         "reason": "Pressure anomaly severity={pressure_severity}"},
+    )},
+)
+
+
+# ------------------------------------------------
+# Compilation
+# ------------------------------------------------
+# The table is turned into the source of one Python function: every field a
+# group tests is read once into a local, conditions become plain boolean
+# expressions, and a reason is only formatted when its rule fires.
+
+_EMPTY = {}
+
+
+def _clamp_expr(name):
+    return f"max(0, min(100, int({name})))"
+
+
+class _Codegen:
+    def __init__(self, fields):
+        self.fields = fields
+        self.lines = []
+        self.constants = {"_EMPTY": _EMPTY, "_now": _now}
+
+    def constant(self, value):
+        name = f"_K{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def emit(self, depth, line):
+        self.lines.append("    " * depth + line)
+
+    # -- field access --------------------------------
+    @staticmethod
+    def node_name(prefix):
+        return "_n_" + "_".join(prefix)
+
+    def define_nodes(self, path, depth, defined):
+        """Emit locals for every dict node on the way to `path`'s leaf."""
+
+        parent = "packet"
+        for i in range(1, len(path)):
+            prefix = path[:i]
+            name = self.node_name(prefix)
+            if name not in defined:
+                self.emit(depth, f"{name} = {parent}.get({prefix[-1]!r})")
+                self.emit(depth, f"if not isinstance({name}, dict): {name} = _EMPTY")
+                defined.add(name)
+            parent = name
+
+    def field_expr(self, field):
+        path, default, *transform = self.fields[field]
+        node = self.node_name(path[:-1]) if len(path) > 1 else "packet"
+        expr = f"{node}.get({path[-1]!r}, {self.constant(default)})"
+        if transform:
+            expr = f"{self.constant(transform[0])}({expr})"
+        return expr
+
+    def bind_fields(self, names, depth, defined):
+        for name in names:
+            self.define_nodes(self.fields[name][0], depth, defined)
+        for name in names:
+            if name not in defined:
+                self.emit(depth, f"{name} = {self.field_expr(name)}")
+                defined.add(name)
+
+    # -- rules ---------------------------------------
+    @staticmethod
+    def condition_fields(spec):
+        if spec[0] == "mode":
+            return ()
+        if spec[0] == "any_in":
+            return tuple(spec[1])
+        return (spec[1],)
+
+    def condition(self, spec):
+        op = spec[0]
+        if op == "mode":
+            return f"mode in {self.constant(frozenset(spec[1]))}"
+        if op == "any_in":
+            values = self.constant(frozenset(spec[2]))
+            return "(" + " or ".join(f"{name} in {values}" for name in spec[1]) + ")"
+        if op == "in":
+            return f"{spec[1]} in {self.constant(frozenset(spec[2]))}"
+        if op == "lt":
+            return f"{spec[1]} < {self.constant(spec[2])}"
+        if op == "gt":
+            return f"{spec[1]} > {self.constant(spec[2])}"
+        if op == "crossing":
+            return f"({spec[1]} and {spec[1]}['severity'] in {self.constant(frozenset(spec[2]))})"
+        raise ValueError(f"Unknown rule condition: {op}")
+
+    def finish(self, depth):
+        self.emit(depth, "if len(reasons) > 1 and len(set(reasons)) != len(reasons):")
+        self.emit(depth + 1, "reasons = list(dict.fromkeys(reasons))")
+        self.emit(depth, "return {")
+        self.emit(depth + 1, "'timestamp': packet.get('timestamp') or _now(),")
+        self.emit(depth + 1, "'ventilation_mode': mode,")
+        for key in _OUTPUTS:
+            self.emit(depth + 1, f"{key!r}: {_clamp_expr(key)},")
+        self.emit(depth + 1, "'reasons': reasons,")
+        self.emit(depth, "}")
+
+    def rule_body(self, rule, depth, defined):
+        if "mode" in rule:
+            mode = self.constant(rule["mode"])
+            if "mode_if" in rule:
+                self.emit(depth, f"if mode in {self.constant(frozenset(rule['mode_if']))}: mode = {mode}")
+            else:
+                self.emit(depth, f"mode = {mode}")
+        for key, value in rule.get("set", {}).items():
+            self.emit(depth, f"{key} = {self.constant(value)}")
+        for key, value in rule.get("floor", {}).items():
+            value = self.constant(value)
+            self.emit(depth, f"if {key} < {value}: {key} = {value}")
+        for key, value in rule.get("add", {}).items():
+            self.emit(depth, f"{key} += {self.constant(value)}")
+
+        names = [n for _, n, _, _ in string.Formatter().parse(rule["reason"]) if n]
+        # Reason-only fields are read here, inside the branch that fires
+        scope = set(defined)
+        for name in names:
+            self.define_nodes(self.fields[name][0], depth, scope)
+        args = ", ".join(
+            f"{name}={name if name in defined else self.field_expr(name)}"
+            for name in dict.fromkeys(names)
+        )
+        self.emit(depth, f"reasons.append({self.constant(rule['reason'])}.format({args}))")
+        if rule.get("stop"):
+            self.finish(depth)
+
+    def group(self, group, depth, defined):
+        guard = group.get("guard")
+        if guard:
+            self.emit(depth, f"if {self.condition(guard)}:")
+            depth += 1
+            # Locals bound inside the guard only exist there
+            defined = set(defined)
+
+        names = []
+        for rule in group["rules"]:
+            for spec in rule["when"]:
+                names.extend(self.condition_fields(spec))
+        self.bind_fields(list(dict.fromkeys(names)), depth, defined)
+
+        keyword = "if"
+        for rule in group["rules"]:
+            test = " and ".join(self.condition(spec) for spec in rule["when"])
+            self.emit(depth, f"{keyword} {test}:")
+            self.rule_body(rule, depth + 1, defined)
+            if group.get("first_match"):
+                keyword = "elif"
+
+    def function(self, groups):
+        self.emit(0, "def decide(packet):")
+        self.emit(1, "mode = " + self.constant(DEFAULT_ACTIONS["ventilation_mode"]))
+        for key in _OUTPUTS:
+            self.emit(1, f"{key} = {self.constant(DEFAULT_ACTIONS[key])}")
+        self.emit(1, "reasons = []")
+        defined = set()
+        for group in groups:
+            self.emit(1, f"# {group['group']}")
+            self.group(group, 1, defined)
+        self.finish(1)
+        return "\n".join(self.lines) + "\n"
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class RuleEngine:
+    """RULES compiled into one generated function (see `source`)."""
+
+    def __init__(self, rules=RULES, fields=FIELDS):
+        self.groups = sorted(rules, key=lambda g: g["priority"])
+        codegen = _Codegen(fields)
+        self.source = codegen.function(self.groups)
+        namespace = dict(codegen.constants)
+        exec(compile(self.source, "<hvac rules>", "exec"), namespace)
+        self._decide = namespace["decide"]
+
+    def decide(self, status_packet):
+        """HVAC actions for one status packet (see hvac_controller.decide_hvac_actions)."""
+
+        return self._decide(status_packet)
+
+    def decide_zones(self, packets):
+        """Decide for many zones at once: a list of packets, or {zone: packet}."""
+
+        decide = self._decide
+        if isinstance(packets, dict):
+            return {zone: decide(packet) for zone, packet in packets.items()}
+        return [decide(packet) for packet in packets]
+
+
+_engine = RuleEngine()
+
+
+def get_rule_engine():
+    """The engine compiled from RULES at import time."""
+
+    return _engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HVAC rule table")
+    parser.add_argument("--source", action="store_true", help="print the generated evaluator")
+    args = parser.parse_args()
+
+    if args.source:
+        print(_engine.source)
+        return
+
+    for group in _engine.groups:
+        kind = "first match" if group.get("first_match") else "all matches"
+        guarded = ", guarded" if group.get("guard") else ""
+        print(f"📋 {group['group']}: {len(group['rules'])} rules, {kind}{guarded}")
+
+
+if __name__ == "__main__":
+    main()
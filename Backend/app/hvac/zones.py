@@ -0,0 +1,109 @@
+"""
+One HVAC decision per zone, from every node reporting in it.
+
+A zone's ventilation is shared by its nodes, so deciding from whichever node
+reported last would flip the fans back and forth between them. Instead the
+zone is judged by its worst node per metric: the entry with the highest
+severity (ties: highest value) is taken for each metric, together with that
+node's forecast for it, and the merged packet goes through the usual
+decide_hvac_actions. Nodes silent for longer than ZONE_NODE_MAX_AGE_SECONDS
+drop out of their zone.
+"""
+
+import threading
+
+from app.config.config import ZONE_NODE_MAX_AGE_SECONDS
+from app.utils.time_utils import to_epoch
+
+_SEVERITY_RANK = {"none": 0, "warning": 1, "high": 2, "critical": 3}
+
+# Path into the status packet -> forecast name
+_METRICS = (
+    (("co",), "co"),
+    (("co2",), "co2"),
+    (("pm", "pm2_5"), "pm2_5"),
+    (("pm", "pm10"), "pm10"),
+    (("temp",), "temp"),
+    (("wbgt",), "wbgt"),
+    (("pressure",), None),
+)
+
+
+def _lookup(packet, path):
+    for key in path:
+        packet = packet.get(key) if isinstance(packet, dict) else None
+    return packet
+
+
+def _score(entry):
+    value = entry.get("value")
+    return (
+        _SEVERITY_RANK.get(entry.get("severity"), 0),
+        value if isinstance(value, (int, float)) else float("-inf"),
+    )
+
+
+def zone_status_packet(packets):
+    """Merge the latest status packets of a zone's nodes into one (worst per metric)."""
+
+    packets = list(packets)
+    if len(packets) == 1:
+        return packets[0]
+
+    merged = {"timestamp": max((p["timestamp"] for p in packets), key=to_epoch)}
+    forecast = {}
+    for path, name in _METRICS:
+        worst = worst_packet = None
+        for packet in packets:
+            entry = _lookup(packet, path)
+            if entry and (worst is None or _score(entry) > _score(worst)):
+                worst, worst_packet = entry, packet
+        if worst is None:
+            continue
+        target = merged
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = worst
+        node_forecast = (worst_packet.get("forecast") or {}).get(name) if name else None
+        if node_forecast is not None:
+            forecast[name] = node_forecast
+    if forecast:
+        merged["forecast"] = forecast
+    return merged
+
+
+class ZoneTracker:
+    def __init__(self, max_age=ZONE_NODE_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._zones = {}    # zone -> {node: (epoch, status_packet)}
+        self._lock = threading.Lock()
+
+    def update(self, zone, node, status_packet):
+        """Record `node`'s latest packet; returns the zone's merged packet."""
+
+        epoch = to_epoch(status_packet["timestamp"])
+        with self._lock:
+            nodes = self._zones.setdefault(zone, {})
+            previous = nodes.get(node)
+            if previous is None or epoch >= previous[0]:
+                nodes[node] = (epoch, status_packet)
+            for other in [n for n, (seen, _) in nodes.items() if seen < epoch - self.max_age]:
+                del nodes[other]
+            packets = [packet for _, packet in nodes.values()]
+        return zone_status_packet(packets)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "zones": len(self._zones),
+                "nodes": sum(len(nodes) for nodes in self._zones.values()),
+            }
+
+
+_tracker = ZoneTracker()
+
+
+def get_zone_tracker():
+    """The process-wide tracker fed by the sharded ingest path."""
+
+    return _tracker
@@ -0,0 +1,92 @@
+"""
+Threshold band classifiers, compiled once from app.config.thresholds.
+
+Each classifier sorts its bands by lower bound and answers lookups with a
+bisect, returning precomputed (level, low, high, severity) tuples. Gaps and
+overlaps in a threshold table are logged when the classifier is built.
+"""
+
+import logging
+from bisect import bisect_right
+
+from app.config.thresholds import (
+    CO_LIMITS,
+    CO2_LIMITS,
+    ENV_SEVERITY,
+    PM_SEVERITY,
+    PM10_LIMITS,
+    PM25_LIMITS,
+    PRESSURE_LIMITS,
+    TEMP_LIMITS,
+    WBGT_SEVERITY,
+    WBGT_THRESHOLDS,
+)
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = ("unknown", None, None, "none")
+
+
+class BandClassifier:
+    __slots__ = ("name", "bands", "lows", "highs", "severity_map", "issues")
+
+    def __init__(self, name, limits, severity_map, floor=0):
+        self.name = name
+        self.severity_map = severity_map
+        ordered = sorted(limits.items(), key=lambda item: item[1][0])
+        self.bands = tuple(
+            (level, low, high, severity_map.get(level, "none"))
+            for level, (low, high) in ordered
+        )
+        self.lows = tuple(band[1] for band in self.bands)
+        self.highs = tuple(band[2] for band in self.bands)
+        self.issues = self._check(floor)
+        for issue in self.issues:
+            logger.warning("%s thresholds: %s", name, issue)
+
+    def _check(self, floor):
+        issues = []
+        if self.bands and self.lows[0] > floor:
+            issues.append(
+                f"values below {self.lows[0]} are not covered (classified as unknown)"
+            )
+        for prev, cur in zip(self.bands, self.bands[1:]):
+            if cur[1] > prev[2]:
+                issues.append(f"gap between {prev[0]} and {cur[0]}: [{prev[2]}, {cur[1]})")
+            elif cur[1] < prev[2]:
+                issues.append(f"{prev[0]} overlaps {cur[0]}: [{cur[1]}, {prev[2]})")
+        return issues
+
+    def lookup(self, value):
+        """Return (level, low, high, severity) for `value`."""
+
+        i = bisect_right(self.lows, value) - 1
+        if i >= 0 and value < self.highs[i]:
+            return self.bands[i]
+        return UNKNOWN
+
+    def classify(self, value):
+        """Return (level, low, high), the shape the metrics modules use."""
+
+        return self.lookup(value)[:3]
+
+    def severity(self, level):
+        return self.severity_map.get(level, "none")
+
+    def onset(self):
+        """Lowest value that raises an alert, or None when bands alert on both sides."""
+
+        alerting = [band for band in self.bands if band[3] != "none"]
+        quiet = [band for band in self.bands if band[3] == "none"]
+        if not alerting or (quiet and min(b[1] for b in alerting) < max(b[1] for b in quiet)):
+            return None
+        return min(band[1] for band in alerting)
+
+
+CO_BANDS = BandClassifier("CO", CO_LIMITS, ENV_SEVERITY)
+CO2_BANDS = BandClassifier("CO2", CO2_LIMITS, ENV_SEVERITY)
+PM25_BANDS = BandClassifier("PM2.5", PM25_LIMITS, PM_SEVERITY)
+PM10_BANDS = BandClassifier("PM10", PM10_LIMITS, PM_SEVERITY)
+TEMP_BANDS = BandClassifier("TEMP", TEMP_LIMITS, ENV_SEVERITY, floor=-273)
+PRESSURE_BANDS = BandClassifier("PRESSURE", PRESSURE_LIMITS, ENV_SEVERITY)
+WBGT_BANDS = BandClassifier("WBGT", WBGT_THRESHOLDS, WBGT_SEVERITY)
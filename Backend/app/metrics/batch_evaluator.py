@@ -0,0 +1,365 @@
+"""
+Vectorized counterpart of evaluate_all_metrics for many readings at once.
+
+Input is columnar: a dict of equal-length arrays keyed like a validated
+payload ("timestamp", "temp", "pressure", "co_mean", "co_max", "co_valid",
+"pm2_5", "pm10", "co2"). Every band lookup is a single searchsorted over
+the threshold table, and WBGT is computed for the whole batch in one pass.
+
+The returned metric and alert columns are in the same order as the scalar
+function would emit them, reading by reading; `iter_results` turns a batch
+back into per-reading dicts with the scalar output's shape.
+"""
+
+import numpy as np
+
+from app.config.config import DEFAULT_SENSOR_ID
+from app.config.thresholds import CO_CEILING, CO_STEL, CO_TWA
+from app.metrics.bands import (
+    CO_BANDS,
+    CO2_BANDS,
+    PM10_BANDS,
+    PM25_BANDS,
+    PRESSURE_BANDS,
+    TEMP_BANDS,
+    WBGT_BANDS,
+)
+from app.metrics.exposure import ExposureEngine
+from app.metrics.temp_pressure_wbgt import DEFAULT_WBGT_RH, wbgt_coefficients
+
+# Metric rows emitted per reading, in scalar order, with their window
+_METRIC_ROWS = (
+    ("CO_CEILING", "instant"),
+    ("CO_STEL", "15min"),
+    ("CO_TWA", "8h"),
+    ("PM2_5_LEVEL", "instant"),
+    ("PM10_LEVEL", "instant"),
+    ("TEMP_LEVEL", "instant"),
+    ("PRESSURE_LEVEL", "instant"),
+    ("CO2_LEVEL", "instant"),
+    ("WBGT", "instant"),
+)
+METRIC_TYPES = tuple(metric for metric, _ in _METRIC_ROWS)
+METRIC_WINDOWS = tuple(window for _, window in _METRIC_ROWS)
+
+
+class _BandTable:
+    """A BandClassifier's bands as arrays for searchsorted."""
+
+    def __init__(self, classifier):
+        bands = classifier.bands
+        self.bounds = [(low, high) for _, low, high, _ in bands] + [(None, None)]
+        self.lows = np.array(classifier.lows, dtype=float)
+        self.highs = np.array(classifier.highs, dtype=float)
+        # Index len(bands) is the "unknown" slot
+        self.levels = np.array([b[0] for b in bands] + ["unknown"], dtype=object)
+        self.severities = np.array([b[3] for b in bands] + ["none"], dtype=object)
+        self.high_or_nan = np.append(self.highs, np.nan)
+        self.unknown = len(bands)
+
+    def lookup(self, values):
+        idx = np.searchsorted(self.lows, values, side="right") - 1
+        safe = np.clip(idx, 0, self.unknown - 1)
+        inside = (idx >= 0) & (values < self.highs[safe])
+        return np.where(inside, safe, self.unknown)
+
+
+_CO = _BandTable(CO_BANDS)
+_CO2 = _BandTable(CO2_BANDS)
+_PM25 = _BandTable(PM25_BANDS)
+_PM10 = _BandTable(PM10_BANDS)
+_TEMP = _BandTable(TEMP_BANDS)
+_PRESSURE = _BandTable(PRESSURE_BANDS)
+_WBGT = _BandTable(WBGT_BANDS)
+
+# Mirrors process_co_alerts: category -> (limit, severity, message label)
+_CO_ALERTS = {
+    "CO_STEL": (CO_STEL, "high", "STEL"),
+    "CO_TWA": (CO_TWA, "warning", "TWA"),
+    "CO_CEILING": (CO_CEILING, "critical", "CEILING"),
+}
+
+
+def compute_wbgt_array(temp_c, humidity=DEFAULT_WBGT_RH):
+    """Vectorized compute_wbgt; `humidity` is a scalar or per-reading array."""
+
+    T = np.asarray(temp_c, dtype=float)
+    RH = np.asarray(humidity, dtype=float)
+    if RH.ndim == 0:
+        # One humidity for the whole batch: same cached terms as the scalar path
+        a, c = wbgt_coefficients(RH.item())
+    else:
+        a = 0.7 * np.arctan(0.151977 * np.sqrt(RH + 8.313659)) + 0.3
+        c = 0.7 * (
+            - np.arctan(RH - 1.676331)
+            + 0.00391838 * (RH ** 1.5) * np.arctan(0.023101 * RH)
+            - 4.686035
+        )
+    return T * a + 0.7 * np.arctan(T + RH) + c
+
+
+def _humidity(values, n):
+    """Per-reading humidity with the default where none was reported."""
+
+    if values is None:
+        return DEFAULT_WBGT_RH
+    humidity = np.array(
+        [np.nan if v is None else v for v in values] if isinstance(values, list) else values,
+        dtype=float,
+    )
+    if np.isnan(humidity).all():
+        return DEFAULT_WBGT_RH
+    return np.where(np.isnan(humidity), DEFAULT_WBGT_RH, humidity)
+
+
+def _status(values, table, idx):
+    return {
+        "value": values,
+        "level": table.levels[idx],
+        "severity": table.severities[idx],
+    }
+
+
+def _exposure_arrays(ts, co_mean, sensor_ids, exposure):
+    # STEL/TWA are inherently sequential per sensor; each step is O(1)
+    n = len(ts)
+    stel = np.empty(n)
+    twa = np.empty(n)
+    update = exposure.update
+    for i in range(n):
+        stel[i], twa[i] = update(sensor_ids[i], ts[i], co_mean[i].item())
+    return stel, twa
+
+
+def evaluate_batch(columns, exposure=None):
+    """Evaluate a columnar batch of readings.
+
+    Readings must be in time order per sensor (optional "sensor_id" column).
+    STEL/TWA state comes from `exposure`; a fresh ExposureEngine is used when
+    omitted, so backfills do not disturb the live ingest state.
+
+    Returns {"metrics": {...}, "alerts": {...}, "status": {...}} where every
+    leaf is an array. Metric and alert columns carry a "reading_index" array
+    pointing back into the input batch.
+    """
+
+    ts = np.asarray(columns["timestamp"], dtype=object)
+    temp = np.asarray(columns["temp"], dtype=float)
+    pressure = np.asarray(columns["pressure"], dtype=float)
+    co_mean = np.asarray(columns["co_mean"], dtype=float)
+    co_max = np.asarray(columns["co_max"], dtype=float)
+    pm25 = np.asarray(columns["pm2_5"], dtype=float)
+    pm10 = np.asarray(columns["pm10"], dtype=float)
+    co2 = np.asarray(columns["co2"], dtype=float)
+    n = len(ts)
+    sensor_ids = columns.get("sensor_id")
+    if sensor_ids is None:
+        sensor_ids = [DEFAULT_SENSOR_ID] * n
+    else:
+        # Stored readings from before sensor_id was recorded have none
+        sensor_ids = [sensor_id or DEFAULT_SENSOR_ID for sensor_id in sensor_ids]
+
+    stel, twa = _exposure_arrays(
+        ts, co_mean, sensor_ids, exposure if exposure is not None else ExposureEngine()
+    )
+    co_idx = _CO.lookup(co_max)
+    co2_idx = _CO2.lookup(co2)
+    pm25_idx = _PM25.lookup(pm25)
+    pm10_idx = _PM10.lookup(pm10)
+    temp_idx = _TEMP.lookup(temp)
+    pressure_idx = _PRESSURE.lookup(pressure)
+    wbgt = compute_wbgt_array(temp, _humidity(columns.get("humidity"), n))
+    wbgt_idx = _WBGT.lookup(wbgt)
+
+    status = {
+        "timestamp": ts,
+        "co": _status(co_max, _CO, co_idx),
+        "co2": _status(co2, _CO2, co2_idx),
+        "pm": {
+            "pm2_5": _status(pm25, _PM25, pm25_idx),
+            "pm10": _status(pm10, _PM10, pm10_idx),
+        },
+        "temp": _status(temp, _TEMP, temp_idx),
+        "wbgt": _status(wbgt, _WBGT, wbgt_idx),
+        "pressure": _status(pressure, _PRESSURE, pressure_idx),
+    }
+
+    # -------------------------
+    # Metric rows (reading-major, METRIC_TYPES order)
+    # -------------------------
+    k = len(METRIC_TYPES)
+    metric_values = np.column_stack([co_max, stel, twa, pm25, pm10, temp, pressure, co2, wbgt])
+    metric_limits = np.column_stack([
+        np.full(n, float(CO_CEILING)),
+        np.full(n, float(CO_STEL)),
+        np.full(n, float(CO_TWA)),
+        _PM25.high_or_nan[pm25_idx],
+        _PM10.high_or_nan[pm10_idx],
+        _TEMP.high_or_nan[temp_idx],
+        _PRESSURE.high_or_nan[pressure_idx],
+        _CO2.high_or_nan[co2_idx],
+        _WBGT.high_or_nan[wbgt_idx],
+    ])
+    metric_status = np.column_stack([
+        np.where(co_max > CO_CEILING, "danger", "safe").astype(object),
+        np.where(stel > CO_STEL, "danger", "safe").astype(object),
+        np.where(twa > CO_TWA, "danger", "safe").astype(object),
+        _PM25.levels[pm25_idx],
+        _PM10.levels[pm10_idx],
+        _TEMP.levels[temp_idx],
+        _PRESSURE.levels[pressure_idx],
+        _CO2.levels[co2_idx],
+        _WBGT.levels[wbgt_idx],
+    ])
+    metrics = {
+        "reading_index": np.repeat(np.arange(n), k),
+        "timestamp": np.repeat(ts, k),
+        "type": np.tile(np.array(METRIC_TYPES, dtype=object), n),
+        "value": metric_values.ravel(),
+        "window": np.tile(np.array(METRIC_WINDOWS, dtype=object), n),
+        "limit": metric_limits.ravel(),
+        "status": metric_status.ravel(),
+    }
+
+    # -------------------------
+    # Alerts, in scalar order: PM2.5, PM10, CO STEL/TWA/ceiling, WBGT, TEMP,
+    # PRESSURE, CO2
+    # -------------------------
+    candidates = (
+        ("PM2.5", _PM25.severities[pm25_idx] != "none", pm25, _PM25, pm25_idx),
+        ("PM10", _PM10.severities[pm10_idx] != "none", pm10, _PM10, pm10_idx),
+        ("CO_STEL", stel > CO_STEL, stel, None, None),
+        ("CO_TWA", twa > CO_TWA, twa, None, None),
+        ("CO_CEILING", co_max > CO_CEILING, co_max, None, None),
+        ("WBGT", _WBGT.severities[wbgt_idx] != "none", wbgt, _WBGT, wbgt_idx),
+        ("TEMP", _TEMP.severities[temp_idx] != "none", temp, _TEMP, temp_idx),
+        ("PRESSURE", _PRESSURE.severities[pressure_idx] != "none", pressure, _PRESSURE, pressure_idx),
+        ("CO2", _CO2.severities[co2_idx] != "none", co2, _CO2, co2_idx),
+    )
+
+    rows, order = [], []
+    for rank, (category, mask, values, table, idx) in enumerate(candidates):
+        hits = np.nonzero(mask)[0]
+        rows.append((category, hits, values, table, idx))
+        order.append(np.column_stack([hits, np.full(len(hits), rank)]))
+
+    alert_reading, alert_cat, alert_value, alert_limit = [], [], [], []
+    alert_severity, alert_message = [], []
+    for category, hits, values, table, idx in rows:
+        for i in hits:
+            value = values[i].item()
+            alert_reading.append(i)
+            alert_cat.append(category)
+            alert_value.append(value)
+            if table is None:
+                limit, severity, label = _CO_ALERTS[category]
+                alert_limit.append(float(limit))
+                alert_severity.append(severity)
+                alert_message.append(f"CO {label} exceeded: {value} > {limit}")
+                continue
+
+            level = table.levels[idx[i]]
+            low, high = table.bounds[idx[i]]
+            alert_limit.append(high)
+            alert_severity.append(table.severities[idx[i]])
+            if category == "WBGT":
+                alert_message.append(f"WBGT={value:.1f}°C → {level.upper()} risk level")
+            else:
+                alert_message.append(f"{category}={value} is {level.upper()} ({low}-{high})")
+
+    all_order = np.concatenate(order) if order else np.empty((0, 2), dtype=int)
+    perm = np.lexsort((all_order[:, 1], all_order[:, 0])) if len(all_order) else []
+    reading_index = np.array(alert_reading, dtype=int)[perm]
+    alerts = {
+        "reading_index": reading_index,
+        "timestamp": ts[reading_index],
+        "category": np.array(alert_cat, dtype=object)[perm],
+        "value": np.array(alert_value, dtype=float)[perm],
+        "limit": np.array(alert_limit, dtype=float)[perm],
+        "severity": np.array(alert_severity, dtype=object)[perm],
+        "message": np.array(alert_message, dtype=object)[perm],
+    }
+
+    return {"metrics": metrics, "alerts": alerts, "status": status}
+
+
+def _py(value):
+    value = value.item() if hasattr(value, "item") else value
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _leaf(node, i):
+    return {key: _py(arr[i]) for key, arr in node.items()}
+
+
+def _status_packet(status, i):
+    return {
+        "timestamp": status["timestamp"][i],
+        "co": _leaf(status["co"], i),
+        "co2": _leaf(status["co2"], i),
+        "pm": {
+            "pm2_5": _leaf(status["pm"]["pm2_5"], i),
+            "pm10": _leaf(status["pm"]["pm10"], i),
+        },
+        "temp": _leaf(status["temp"], i),
+        "wbgt": _leaf(status["wbgt"], i),
+        "pressure": _leaf(status["pressure"], i),
+    }
+
+
+def iter_status_packets(batch):
+    """Yield only the per-reading status packets (the HVAC controller's input)."""
+
+    status = batch["status"]
+    for i in range(len(status["timestamp"])):
+        yield _status_packet(status, i)
+
+
+def iter_results(batch):
+    """Yield one dict per reading shaped like evaluate_all_metrics' output."""
+
+    metrics, alerts, status = batch["metrics"], batch["alerts"], batch["status"]
+    k = len(METRIC_TYPES)
+    n = len(status["timestamp"])
+    alert_bounds = np.searchsorted(alerts["reading_index"], np.arange(n + 1))
+
+    for i in range(n):
+        metric_rows = [
+            {
+                "timestamp": metrics["timestamp"][j],
+                "type": metrics["type"][j],
+                "value": _py(metrics["value"][j]),
+                "window": metrics["window"][j],
+                "limit": _py(metrics["limit"][j]),
+                "status": metrics["status"][j],
+            }
+            for j in range(i * k, (i + 1) * k)
+        ]
+        alert_rows = [
+            {
+                "timestamp": alerts["timestamp"][j],
+                "category": alerts["category"][j],
+                "value": _py(alerts["value"][j]),
+                "limit": _py(alerts["limit"][j]),
+                "severity": alerts["severity"][j],
+                "message": alerts["message"][j],
+            }
+            for j in range(alert_bounds[i], alert_bounds[i + 1])
+        ]
+        status_packet = _status_packet(status, i)
+        wbgt_low, wbgt_high = _WBGT.bounds[_WBGT.lookup(status["wbgt"]["value"][i])]
+        yield {
+            "metrics": metric_rows,
+            "alerts": alert_rows,
+            "results": {
+                "co": status_packet["co"],
+                "wbgt": {
+                    "value": status_packet["wbgt"]["value"],
+                    "level": status_packet["wbgt"]["level"],
+                    "range": (wbgt_low, wbgt_high),
+                },
+                "status_packet": status_packet,
+            },
+        }
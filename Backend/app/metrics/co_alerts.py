@@ -1,4 +1,3 @@
-from app.db.alerts_db import insert_alert_record
 from app.config.thresholds import CO_STEL, CO_TWA, CO_CEILING
 
 
@@ -35,7 +34,4 @@ def process_co_alerts(timestamp, stel, twa, ceiling):
             "message": f"CO CEILING exceeded: {ceiling} > {CO_CEILING}"
         })
 
-    for a in alerts:
-        insert_alert_record(a)
-
     return alerts
@@ -1,6 +1,4 @@
 from app.config.thresholds import CO_STEL, CO_TWA, CO_CEILING
-from app.utils.time_utils import parse_timestamp
-from app.db.sensor_db import insert_sensor_reading
 
 
 def compute_co_ceiling(timestamp, co_max):
@@ -12,3 +10,25 @@ def compute_co_ceiling(timestamp, co_max):
         "limit": CO_CEILING,
         "status": "danger" if co_max > CO_CEILING else "safe"
     }
+
+
+def compute_co_stel(timestamp, stel):
+    return {
+        "timestamp": timestamp,
+        "type": "CO_STEL",
+        "value": stel,
+        "window": "15min",
+        "limit": CO_STEL,
+        "status": "danger" if stel > CO_STEL else "safe"
+    }
+
+
+def compute_co_twa(timestamp, twa):
+    return {
+        "timestamp": timestamp,
+        "type": "CO_TWA",
+        "value": twa,
+        "window": "8h",
+        "limit": CO_TWA,
+        "status": "danger" if twa > CO_TWA else "safe"
+    }
@@ -1,7 +1,10 @@
-from app.metrics.co_metrics import compute_co_ceiling
+from app.config.config import DEFAULT_SENSOR_ID
+from app.metrics.co_metrics import compute_co_ceiling, compute_co_stel, compute_co_twa
+from app.metrics.exposure import default_exposure_engine
 from app.metrics.pm_metrics import process_pm_metrics
-from app.config.thresholds import CO_LIMITS, CO2_LIMITS
+from app.metrics.bands import CO_BANDS, CO2_BANDS
 from app.metrics.temp_pressure_wbgt import (
+    DEFAULT_WBGT_RH,
     build_environment_alert,
     classify_pressure,
     classify_temp,
@@ -12,20 +15,13 @@ from app.metrics.temp_pressure_wbgt import (
 )
 from app.metrics.co_alerts import process_co_alerts
 
-def _classify_from_limits(value, limits):
-    if isinstance(limits, dict):
-        thresholds = sorted(limits.items(), key=lambda item: item[1][0])
-        for level, (low, high) in thresholds:
-            if low <= value < high:
-                return level, low, high
-    else:
-        for level, low, high in limits:
-            if low <= value < high:
-                return level, low, high
 
-    return "unknown", None, None
+def evaluate_all_metrics(reading, exposure=None):
+    """Evaluate one validated reading.
 
-def evaluate_all_metrics(reading):
+    `exposure` is the ExposureEngine holding rolling CO state; the live
+    process-wide engine is used when omitted.
+    """
     ts = reading["timestamp"]
 
     metrics = []
@@ -38,7 +34,17 @@ def evaluate_all_metrics(reading):
     # -------------------------
     co_ceiling_m = compute_co_ceiling(ts, reading["co_max"])
     metrics.append(co_ceiling_m)
-    co_level = _classify_from_limits(reading["co_max"], CO_LIMITS)
+
+    # -------------------------
+    # CO STEL (15 min) / TWA (8 h), rolling per sensor
+    # -------------------------
+    engine = exposure if exposure is not None else default_exposure_engine()
+    co_stel, co_twa = engine.update(
+        reading.get("sensor_id", DEFAULT_SENSOR_ID), ts, reading["co_mean"]
+    )
+    metrics.append(compute_co_stel(ts, co_stel))
+    metrics.append(compute_co_twa(ts, co_twa))
+    co_level = CO_BANDS.classify(reading["co_max"])
     co_status = {
         "value": reading["co_max"],
         "level": co_level[0],
@@ -49,7 +55,7 @@ def evaluate_all_metrics(reading):
     # -------------------------
     # CO2 (air quality / ventilation)
     # -------------------------
-    co2_level = _classify_from_limits(reading["co2"], CO2_LIMITS)
+    co2_level = CO2_BANDS.classify(reading["co2"])
     co2_status = {
         "value": reading["co2"],
         "level": co2_level[0],
@@ -59,7 +65,7 @@ def evaluate_all_metrics(reading):
     # -------------------------
     # PM Metrics
     # -------------------------
-    pm = process_pm_metrics(ts, reading["pm2_5"], reading["pm10"])
+    pm, pm_alerts = process_pm_metrics(ts, reading["pm2_5"], reading["pm10"])
     for key, metric in pm.items():
         metrics.append({
             "timestamp": ts,
@@ -69,14 +75,11 @@ def evaluate_all_metrics(reading):
             "limit": metric["high"],
             "status": metric["level"],
         })
-    # Alerts are generated inside process_pm_metrics
+    alerts.extend(pm_alerts)
 
     # -------------------------
-    # CO STEL/TWA Alerts
-    # (you can integrate STEL/TWA code)
+    # CO STEL/TWA/Ceiling Alerts
     # -------------------------
-    co_stel = None       # compute if needed
-    co_twa = None        # compute if needed
     ceiling = reading["co_max"]
 
     co_alert_list = process_co_alerts(ts, co_stel, co_twa, ceiling)
@@ -89,7 +92,7 @@ def evaluate_all_metrics(reading):
     pressure_lvl = classify_pressure(reading["pressure"])
 
     # WBGT  (approx)
-    wbgt_val = compute_wbgt(reading["temp"])
+    wbgt_val = compute_wbgt(reading["temp"], reading.get("humidity", DEFAULT_WBGT_RH))
     wbgt_status, wbgt_alert = process_wbgt(ts, wbgt_val)
     results["wbgt"] = wbgt_status
     temp_severity = level_to_severity(temp_lvl[0])
@@ -0,0 +1,167 @@
+"""
+Streaming CO exposure engine (15-minute STEL and 8-hour TWA).
+
+Each sensor keeps two rings of fixed-width time buckets holding the
+exposure integral (ppm x seconds) that fell into each bucket, plus a running
+total. A reading adds `co_mean x dt` over the interval it covers and evicts
+buckets that slid out of the window, so an update touches a bounded number
+of buckets no matter how much history is kept.
+
+The device reports co_mean as the average over the interval ending at the
+timestamp, so a reading covers [previous timestamp, timestamp]. Gaps longer
+than CO_EXPOSURE_MAX_GAP_SECONDS only count the last CO_SAMPLE_SECONDS of
+exposure; the rest is unobserved and contributes zero, as OSHA averaging
+assumes. Readings that arrive out of order add nothing.
+"""
+
+import math
+import threading
+
+from app.config.config import (
+    CO_EXPOSURE_MAX_GAP_SECONDS,
+    CO_SAMPLE_SECONDS,
+    CO_STEL_BUCKET_SECONDS,
+    CO_STEL_WINDOW_SECONDS,
+    CO_TWA_BUCKET_SECONDS,
+    CO_TWA_WINDOW_SECONDS,
+    DEFAULT_SENSOR_ID,
+)
+from app.db.history import epoch_range, iter_readings
+from app.utils.time_utils import to_epoch
+
+
+class _Window:
+    __slots__ = ("span", "width", "size", "buckets", "head", "total")
+
+    def __init__(self, span_seconds, bucket_seconds):
+        self.span = float(span_seconds)
+        self.width = float(bucket_seconds)
+        self.size = int(span_seconds // bucket_seconds)
+        self.buckets = [0.0] * self.size
+        self.head = None   # absolute index of the newest bucket
+        self.total = 0.0
+
+    def advance(self, index):
+        if self.head is None:
+            self.head = index
+            return
+        steps = index - self.head
+        if steps <= 0:
+            return
+        if steps >= self.size:
+            self.buckets = [0.0] * self.size
+            self.total = 0.0
+        else:
+            for i in range(self.head + 1, index + 1):
+                slot = i % self.size
+                self.total -= self.buckets[slot]
+                self.buckets[slot] = 0.0
+        self.head = index
+
+    def add(self, start, end, ppm):
+        """Add exposure `ppm` held constant over [start, end) epoch seconds."""
+
+        # Newest bucket is the one holding the last instant before `end`
+        end_index = math.ceil(end / self.width) - 1
+        self.advance(end_index)
+
+        # Nothing older than the window can contribute
+        start = max(start, (end_index - self.size + 1) * self.width)
+        index = int(start // self.width)
+        while start < end:
+            stop = min(end, (index + 1) * self.width)
+            dose = ppm * (stop - start)
+            self.buckets[index % self.size] += dose
+            self.total += dose
+            start = stop
+            index += 1
+
+    def average(self):
+        # Clamp float drift from repeated add/subtract
+        return max(0.0, self.total) / self.span
+
+
+class _SensorExposure:
+    __slots__ = ("stel", "twa", "last_ts", "lock")
+
+    def __init__(self):
+        self.stel = _Window(CO_STEL_WINDOW_SECONDS, CO_STEL_BUCKET_SECONDS)
+        self.twa = _Window(CO_TWA_WINDOW_SECONDS, CO_TWA_BUCKET_SECONDS)
+        self.last_ts = None
+        self.lock = threading.Lock()
+
+    def update(self, ts, ppm):
+        with self.lock:
+            if self.last_ts is None:
+                dt = CO_SAMPLE_SECONDS
+            else:
+                dt = ts - self.last_ts
+                if dt > CO_EXPOSURE_MAX_GAP_SECONDS:
+                    dt = CO_SAMPLE_SECONDS
+
+            if dt > 0 and ppm is not None:
+                self.stel.add(ts - dt, ts, ppm)
+                self.twa.add(ts - dt, ts, ppm)
+            elif dt > 0:
+                self.stel.advance(math.ceil(ts / self.stel.width) - 1)
+                self.twa.advance(math.ceil(ts / self.twa.width) - 1)
+
+            if self.last_ts is None or ts > self.last_ts:
+                self.last_ts = ts
+            return self.stel.average(), self.twa.average()
+
+
+class ExposureEngine:
+    def __init__(self):
+        self._sensors = {}
+        self._lock = threading.Lock()
+
+    def _sensor(self, sensor_id):
+        state = self._sensors.get(sensor_id)
+        if state is None:
+            with self._lock:
+                state = self._sensors.setdefault(sensor_id, _SensorExposure())
+        return state
+
+    def update(self, sensor_id, timestamp, co_ppm):
+        """Feed one reading; returns (stel, twa) in ppm for that sensor."""
+
+        stel, twa = self._sensor(sensor_id).update(to_epoch(timestamp), co_ppm)
+        return round(stel, 3), round(twa, 3)
+
+    def reset(self):
+        with self._lock:
+            self._sensors.clear()
+
+    def rebuild_from_db(self):
+        """Replay the last TWA window of stored readings after a restart.
+
+        Each reading goes back to the sensor that sent it; rows stored before
+        readings carried a sensor_id count as DEFAULT_SENSOR_ID. Returns the
+        number of readings replayed.
+        """
+
+        latest = epoch_range("sensor_readings")[1]
+        if latest is None:
+            return 0
+        rows = [
+            (row["sensor_id"] or DEFAULT_SENSOR_ID, row["timestamp"], row["co_mean"])
+            for row in iter_readings(
+                start=latest - CO_TWA_WINDOW_SECONDS,
+                columns=("sensor_id", "timestamp", "co_mean"),
+            )
+        ]
+
+        self.reset()
+        for sensor_id, timestamp, co_mean in rows:
+            self.update(sensor_id, timestamp, co_mean)
+        return len(rows)
+
+
+_engine = ExposureEngine()
+
+
+def default_exposure_engine():
+    """The process-wide engine used by the live ingest path."""
+
+    return _engine
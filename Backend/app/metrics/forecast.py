@@ -0,0 +1,164 @@
+"""
+Online per-sensor forecasts for CO, CO2, PM2.5, PM10, temperature and WBGT.
+
+Each (sensor, metric) pair keeps a Holt linear-trend state: a smoothed level
+and a smoothed slope (units per second). Readings arrive at irregular
+intervals, so the smoothing weights come from time constants rather than
+fixed alphas:
+
+    alpha = 1 - exp(-dt / FORECAST_LEVEL_TAU_SECONDS)
+    beta  = 1 - exp(-dt / FORECAST_TREND_TAU_SECONDS)
+
+An update is O(1) and nothing is ever retrained. The forecast is
+level + slope x FORECAST_HORIZON_SECONDS, classified against the same bands
+as the live value; when it lands in a more severe band the result carries
+the crossing and the estimated seconds until the band boundary is reached.
+"""
+
+import math
+import threading
+
+from app.config.config import (
+    FORECAST_HORIZON_SECONDS,
+    FORECAST_LEVEL_TAU_SECONDS,
+    FORECAST_MIN_SAMPLES,
+    FORECAST_TREND_TAU_SECONDS,
+)
+from app.metrics.bands import CO_BANDS, CO2_BANDS, PM10_BANDS, PM25_BANDS, TEMP_BANDS, WBGT_BANDS
+from app.utils.time_utils import to_epoch
+
+SEVERITY_RANK = {"none": 0, "warning": 1, "high": 2, "critical": 3}
+
+# metric -> (path into the status packet, band classifier, never negative)
+FORECAST_METRICS = {
+    "co": (("co",), CO_BANDS, True),
+    "co2": (("co2",), CO2_BANDS, True),
+    "pm2_5": (("pm", "pm2_5"), PM25_BANDS, True),
+    "pm10": (("pm", "pm10"), PM10_BANDS, True),
+    "temp": (("temp",), TEMP_BANDS, False),
+    "wbgt": (("wbgt",), WBGT_BANDS, False),
+}
+
+
+class HoltState:
+    __slots__ = ("level", "slope", "last_t", "samples", "error")
+
+    def __init__(self):
+        self.level = None
+        self.slope = 0.0
+        self.last_t = None
+        self.samples = 0
+        self.error = 0.0   # smoothed absolute one-step error
+
+    def update(self, t, value, level_tau, trend_tau):
+        if self.level is None:
+            self.level, self.last_t, self.samples = value, t, 1
+            return
+        dt = t - self.last_t
+        if dt <= 0:
+            # Out of order or duplicate: keep the state, the next reading catches up
+            return
+
+        predicted = self.level + self.slope * dt
+        alpha = 1.0 - math.exp(-dt / level_tau)
+        beta = 1.0 - math.exp(-dt / trend_tau)
+        level = predicted + alpha * (value - predicted)
+        self.slope += beta * ((level - self.level) / dt - self.slope)
+        self.error += alpha * (abs(value - predicted) - self.error)
+        self.level = level
+        self.last_t = t
+        self.samples += 1
+
+    def forecast(self, horizon):
+        return self.level + self.slope * horizon
+
+
+def _crossing(state, value, current, predicted):
+    """The more severe band `predicted` falls in, with the time to reach it."""
+
+    if SEVERITY_RANK[predicted[3]] <= SEVERITY_RANK[current[3]]:
+        return None
+    level, low, high, severity = predicted
+    # Rising into a band means crossing its lower bound, falling its upper
+    boundary = low if state.slope > 0 else high
+    if boundary is None or state.slope == 0:
+        return None
+    # Measured from the latest value, which the smoothed level lags behind
+    eta = max(0.0, (boundary - value) / state.slope)
+    return {"level": level, "severity": severity, "eta_s": round(eta, 1)}
+
+
+class ForecastEngine:
+    def __init__(
+        self,
+        horizon=FORECAST_HORIZON_SECONDS,
+        level_tau=FORECAST_LEVEL_TAU_SECONDS,
+        trend_tau=FORECAST_TREND_TAU_SECONDS,
+        min_samples=FORECAST_MIN_SAMPLES,
+    ):
+        self.horizon = horizon
+        self.level_tau = level_tau
+        self.trend_tau = trend_tau
+        self.min_samples = min_samples
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state(self, sensor_id, metric):
+        key = (sensor_id, metric)
+        state = self._states.get(key)
+        if state is None:
+            with self._lock:
+                state = self._states.setdefault(key, HoltState())
+        return state
+
+    def update(self, sensor_id, status_packet):
+        """Feed one evaluated reading; returns {metric: forecast} for warmed-up metrics.
+
+        A forecast is {"value", "horizon_s", "slope_per_min", "error", "level",
+        "severity", "crossing"}, where "crossing" is None or
+        {"level", "severity", "eta_s"}.
+        """
+
+        t = to_epoch(status_packet["timestamp"])
+        forecasts = {}
+        for metric, (path, bands, non_negative) in FORECAST_METRICS.items():
+            node = status_packet
+            for key in path:
+                node = node.get(key) or {}
+            value = node.get("value")
+            if value is None or not math.isfinite(value):
+                continue
+
+            state = self._state(sensor_id, metric)
+            state.update(t, value, self.level_tau, self.trend_tau)
+            if state.samples < self.min_samples:
+                continue
+
+            predicted_value = state.forecast(self.horizon)
+            if non_negative:
+                predicted_value = max(0.0, predicted_value)
+            predicted = bands.lookup(predicted_value)
+            current = bands.lookup(value)
+            forecasts[metric] = {
+                "value": round(predicted_value, 3),
+                "horizon_s": self.horizon,
+                "slope_per_min": round(state.slope * 60.0, 4),
+                "error": round(state.error, 3),
+                "level": predicted[0],
+                "severity": predicted[3],
+                "crossing": _crossing(state, value, current, predicted),
+            }
+        return forecasts
+
+    def reset(self):
+        with self._lock:
+            self._states.clear()
+
+
+_forecaster = ForecastEngine()
+
+
+def get_forecaster():
+    """The process-wide engine used by the live ingest path."""
+
+    return _forecaster
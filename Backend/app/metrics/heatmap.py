@@ -0,0 +1,221 @@
+"""
+Spatial concentration heatmaps for the digital twin.
+
+Sensors with known floor coordinates (SENSOR_POSITIONS) are interpolated
+onto a regular grid over HEATMAP_BOUNDS by inverse-distance weighting:
+
+    value(cell) = sum_s w(cell, s) * v_s / sum_s w(cell, s),   w = 1 / d ** HEATMAP_POWER
+
+Sensor positions are fixed, so the weight matrix (cells x sensors) is built
+once. Each reading then costs one small matrix product for all gases
+together. Sensors without a recent value for a gas drop out of that gas's
+sum.
+
+Grids are quantized to uint8 over HEATMAP_SCALES and cut into square tiles.
+An update carries only the tiles whose bytes changed since the last one
+sent, plus every tile every HEATMAP_KEYFRAME_SECONDS, so a client joining
+late catches up:
+
+    {"timestamp", "seq", "keyframe", "width", "height", "tile", "cell_size",
+     "origin": [x0, y0],
+     "gases": {gas: {"scale": [lo, hi], "tiles": [[tx, ty], ...], "data": base64}}}
+
+"data" holds the listed tiles back to back, tile x tile bytes each, row-major.
+Tiles on the far edges are padded past width/height with zeros.
+"""
+
+import base64
+import math
+import threading
+import time
+
+import numpy as np
+
+from app.config.config import (
+    HEATMAP_BOUNDS,
+    HEATMAP_CELL_SIZE,
+    HEATMAP_KEYFRAME_SECONDS,
+    HEATMAP_MAX_AGE_SECONDS,
+    HEATMAP_POWER,
+    HEATMAP_SCALES,
+    HEATMAP_TILE,
+    SENSOR_POSITIONS,
+)
+from app.utils.time_utils import to_epoch
+
+# gas -> path into the status packet
+_PATHS = {
+    "co": ("co",),
+    "co2": ("co2",),
+    "pm2_5": ("pm", "pm2_5"),
+    "pm10": ("pm", "pm10"),
+    "temp": ("temp",),
+    "wbgt": ("wbgt",),
+}
+
+
+def idw_weights(cell_xy, sensor_xy, power=HEATMAP_POWER):
+    """Unnormalized inverse-distance weights, shape (cells, sensors)."""
+
+    distance = np.hypot(
+        cell_xy[:, None, 0] - sensor_xy[None, :, 0],
+        cell_xy[:, None, 1] - sensor_xy[None, :, 1],
+    )
+    # A sensor sitting on a cell centre dominates it instead of dividing by zero
+    return 1.0 / np.maximum(distance, 1e-6) ** power
+
+
+class HeatmapGrid:
+    def __init__(
+        self,
+        positions=SENSOR_POSITIONS,
+        bounds=HEATMAP_BOUNDS,
+        cell_size=HEATMAP_CELL_SIZE,
+        tile=HEATMAP_TILE,
+        power=HEATMAP_POWER,
+        scales=HEATMAP_SCALES,
+        max_age=HEATMAP_MAX_AGE_SECONDS,
+        keyframe_seconds=HEATMAP_KEYFRAME_SECONDS,
+    ):
+        x0, y0, x1, y1 = bounds
+        self.origin = (x0, y0)
+        self.cell_size = cell_size
+        self.width = max(1, math.ceil((x1 - x0) / cell_size))
+        self.height = max(1, math.ceil((y1 - y0) / cell_size))
+        self.tile = tile
+        self.tiles_x = math.ceil(self.width / tile)
+        self.tiles_y = math.ceil(self.height / tile)
+        self.max_age = max_age
+        self.keyframe_seconds = keyframe_seconds
+
+        self.gases = tuple(gas for gas in scales if gas in _PATHS)
+        self._low = np.array([scales[g][0] for g in self.gases], dtype=np.float64)
+        self._span = np.array([scales[g][1] - scales[g][0] for g in self.gases], dtype=np.float64)
+
+        self.sensors = tuple(positions)
+        self._index = {sensor_id: i for i, sensor_id in enumerate(self.sensors)}
+        xs = x0 + (np.arange(self.width) + 0.5) * cell_size
+        ys = y0 + (np.arange(self.height) + 0.5) * cell_size
+        cells = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+        sensor_xy = np.array([positions[s] for s in self.sensors], dtype=np.float64).reshape(-1, 2)
+        self._weights = idw_weights(cells, sensor_xy, power)
+
+        self._values = np.full((len(self.sensors), len(self.gases)), np.nan)
+        self._seen = np.full(len(self.sensors), -np.inf)
+        padded = (len(self.gases), self.tiles_y * tile, self.tiles_x * tile)
+        self._quantized = np.zeros(padded, dtype=np.uint8)
+        self._sent = np.zeros(padded, dtype=np.uint8)
+        self._keyframe_at = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._stats = {"updates": 0, "published": 0, "tiles_sent": 0, "keyframes": 0}
+
+    def interpolate(self, now):
+        """Float grids, shape (gases, height, width); NaN where no sensor contributes."""
+
+        fresh = self._seen >= now - self.max_age
+        mask = np.isfinite(self._values) & fresh[:, None]
+        numerator = self._weights @ np.where(mask, self._values, 0.0)
+        denominator = self._weights @ mask.astype(np.float64)
+        grid = np.full_like(numerator, np.nan)
+        np.divide(numerator, denominator, out=grid, where=denominator > 0)
+        return grid.T.reshape(len(self.gases), self.height, self.width)
+
+    def _quantize(self, grid):
+        scaled = (grid - self._low[:, None, None]) * (255.0 / self._span[:, None, None])
+        # NaN (no data) fails the comparison and lands on 0
+        scaled[~(scaled >= 0)] = 0
+        np.minimum(scaled, 255, out=scaled)
+        self._quantized[:, :self.height, :self.width] = np.rint(scaled)
+
+    def _tiles(self):
+        """Quantized grids as (gases, tiles_y, tiles_x, tile, tile)."""
+
+        t = self.tile
+        shape = (len(self.gases), self.tiles_y, t, self.tiles_x, t)
+        return self._quantized.reshape(shape).transpose(0, 1, 3, 2, 4)
+
+    def update(self, sensor_id, status_packet, monotonic=None):
+        """Fold in one sensor's evaluated reading; returns a message or None."""
+
+        row = self._index.get(sensor_id)
+        if row is None:
+            return None
+        epoch = to_epoch(status_packet["timestamp"])
+        values = []
+        for gas in self.gases:
+            node = status_packet
+            for key in _PATHS[gas]:
+                node = node.get(key) or {}
+            value = node.get("value")
+            values.append(np.nan if value is None else value)
+
+        monotonic = time.monotonic() if monotonic is None else monotonic
+        with self._lock:
+            self._stats["updates"] += 1
+            if epoch < self._seen[row]:
+                return None
+            self._values[row] = values
+            self._seen[row] = epoch
+            self._quantize(self.interpolate(epoch))
+
+            keyframe = (
+                self._keyframe_at is None
+                or monotonic - self._keyframe_at >= self.keyframe_seconds
+            )
+            tiles = self._tiles()
+            if keyframe:
+                changed = np.ones(tiles.shape[:3], dtype=bool)
+            else:
+                t = self.tile
+                diff = (self._quantized != self._sent).reshape(
+                    len(self.gases), self.tiles_y, t, self.tiles_x, t
+                )
+                changed = diff.any(axis=(2, 4))
+            if not changed.any():
+                return None
+            if keyframe:
+                self._keyframe_at = monotonic
+                self._stats["keyframes"] += 1
+
+            gases = {}
+            for g, gas in enumerate(self.gases):
+                ty, tx = np.nonzero(changed[g])
+                if not len(ty):
+                    continue
+                gases[gas] = {
+                    "scale": [float(self._low[g]), float(self._low[g] + self._span[g])],
+                    "tiles": np.stack([tx, ty], axis=1).tolist(),
+                    "data": base64.b64encode(tiles[g][ty, tx].tobytes()).decode("ascii"),
+                }
+            np.copyto(self._sent, self._quantized)
+            self._seq += 1
+            self._stats["published"] += 1
+            self._stats["tiles_sent"] += int(changed.sum())
+            return {
+                "timestamp": status_packet["timestamp"],
+                "seq": self._seq,
+                "keyframe": keyframe,
+                "width": self.width,
+                "height": self.height,
+                "tile": self.tile,
+                "cell_size": self.cell_size,
+                "origin": list(self.origin),
+                "gases": gases,
+            }
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["sensors"] = len(self.sensors)
+        snapshot["cells"] = self.width * self.height
+        return snapshot
+
+
+_heatmap = HeatmapGrid()
+
+
+def get_heatmap():
+    """The process-wide grid fed by the live ingest path."""
+
+    return _heatmap
@@ -1,11 +1,9 @@
-from app.db.alerts_db import insert_alert_record
-
 def create_pm_alert(timestamp, category, value, limit, severity):
-    insert_alert_record({
+    return {
         "timestamp": timestamp,
         "category": category,
         "value": value,
         "limit": limit,
         "severity": severity,
         "message": f"{category} exceeded: {value} > {limit}"
-    })
+    }
@@ -1,39 +1,39 @@
-from app.db.alerts_db import insert_alert_record
-from app.config.thresholds import PM25_LIMITS, PM10_LIMITS
-
-
-def _classify(value: float, limits: dict):
-    for level, (low, high) in limits.items():
-        if low <= value < high:
-            return level, low, high
-    return "unknown", None, None
+from app.config.thresholds import PM_SEVERITY
+from app.metrics.bands import PM10_BANDS, PM25_BANDS
 
 
 def _level_to_severity(level):
-    return {
-        "green": "none",
-        "yellow": "none",
-        "orange": "warning",
-        "red": "high",
-        "dark-red": "critical",
-        "purple": "critical",
-    }.get(level, "none")
+    return PM_SEVERITY.get(level, "none")
 
 
 def classify_pm25(value):
-    level, low, high = _classify(value, PM25_LIMITS)
-    severity = _level_to_severity(level)
+    level, low, high, severity = PM25_BANDS.lookup(value)
     return level, severity, low, high
 
 
 def classify_pm10(value):
-    level, low, high = _classify(value, PM10_LIMITS)
-    severity = _level_to_severity(level)
+    level, low, high, severity = PM10_BANDS.lookup(value)
     return level, severity, low, high
 
 
+def build_pm_alert(category, timestamp, value, level, severity, low, high):
+    if severity == "none":
+        return None
+    return {
+        "timestamp": timestamp,
+        "category": category,
+        "value": value,
+        "limit": high,
+        "severity": severity,
+        "message": f"{category}={value} is {level.upper()} ({low}-{high})"
+    }
+
+
 def process_pm_metrics(timestamp, pm25, pm10):
+    """Classify PM2.5/PM10; returns (results, alerts)."""
+
     results = {}
+    alerts = []
 
     # PM2.5
     level25, sev25, low25, high25 = classify_pm25(pm25)
@@ -44,15 +44,9 @@ def process_pm_metrics(timestamp, pm25, pm10):
         "low": low25,
         "high": high25,
     }
-    if sev25 != "none":
-        insert_alert_record({
-            "timestamp": timestamp,
-            "category": "PM2.5",
-            "value": pm25,
-            "limit": high25,
-            "severity": sev25,
-            "message": f"PM2.5={pm25} is {level25.upper()} ({low25}-{high25})"
-        })
+    alert = build_pm_alert("PM2.5", timestamp, pm25, level25, sev25, low25, high25)
+    if alert:
+        alerts.append(alert)
 
     # PM10
     level10, sev10, low10, high10 = classify_pm10(pm10)
@@ -63,14 +57,8 @@ def process_pm_metrics(timestamp, pm25, pm10):
         "low": low10,
         "high": high10,
     }
-    if sev10 != "none":
-        insert_alert_record({
-            "timestamp": timestamp,
-            "category": "PM10",
-            "value": pm10,
-            "limit": high10,
-            "severity": sev10,
-            "message": f"PM10={pm10} is {level10.upper()} ({low10}-{high10})"
-        })
+    alert = build_pm_alert("PM10", timestamp, pm10, level10, sev10, low10, high10)
+    if alert:
+        alerts.append(alert)
 
-    return results
+    return results, alerts
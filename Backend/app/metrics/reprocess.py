@@ -0,0 +1,537 @@
+"""
+Recompute metrics, alerts and HVAC decisions for stored readings.
+
+    python -m app.metrics.reprocess [--from ISO] [--to ISO] [--workers N]
+    python -m app.metrics.reprocess --version 3        # resume run 3
+    python -m app.metrics.reprocess --list
+
+After a change to thresholds.py, a run streams `sensor_readings` in
+time-ordered chunks (REPROCESS_CHUNK_SECONDS each) to a process pool. Each
+worker evaluates its chunk with the vectorized evaluator and the HVAC
+controller; the parent writes the results to versioned tables
+(metrics_v<N>, alerts_v<N>, ventilation_history_v<N>) and leaves the live
+tables alone. Versioned tables are readable with app.db.history like their
+live counterparts.
+
+STEL/TWA are stateful, so each worker first replays the CO readings of the
+TWA window before its chunk into a fresh ExposureEngine. Forecasts are too:
+when FORECAST_ENABLED, the worker also evaluates the
+REPROCESS_FORECAST_WARMUP_SECONDS of readings before its chunk and feeds
+them, then the chunk, to a fresh ForecastEngine per sensor, so forecast
+crossings (and the pre-ventilation they trigger) reach the HVAC controller
+as they did live. A forecast state is only as long as the warm-up, so a
+reading right after a long gap may forecast slightly differently than the
+live run did. Alerts are the raw per-reading exceedances (no episodes or
+rate limiting).
+
+Every finished chunk is checkpointed in `reprocess_chunks`; running the same
+version again skips finished chunks and redoes the rest. A run records a
+hash of thresholds.py and refuses to resume after the thresholds changed.
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from app.config import thresholds
+from app.config.config import (
+    CO_EXPOSURE_MAX_GAP_SECONDS,
+    CO_TWA_WINDOW_SECONDS,
+    DEFAULT_SENSOR_ID,
+    FORECAST_ENABLED,
+    REPROCESS_CHUNK_SECONDS,
+    REPROCESS_FORECAST_WARMUP_SECONDS,
+    REPROCESS_MAX_PENDING,
+    REPROCESS_PROGRESS_SECONDS,
+    REPROCESS_WORKERS,
+)
+from app.db.connection import (
+    ensure_columns,
+    get_connection,
+    get_db_root,
+    set_db_root,
+    table_db_path,
+    transaction,
+    versioned_table,
+)
+from app.db.history import epoch_range, fetch_columns
+from app.db.storage import init_storage
+from app.hvac.hvac_controller import decide_hvac_actions_many
+from app.metrics.batch_evaluator import evaluate_batch, iter_status_packets
+from app.metrics.exposure import ExposureEngine
+from app.metrics.forecast import ForecastEngine
+from app.utils.time_utils import from_epoch, to_epoch
+
+_READING_COLUMNS = (
+    "id", "timestamp", "ts_epoch", "temp", "pressure", "co_mean", "co_max",
+    "co_valid", "pm2_5", "pm10", "co2", "humidity", "sensor_id",
+)
+
+# Same columns as the live tables; limits are nullable because readings
+# outside every band have none
+_SCHEMAS = {
+    "metrics": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            metric_type TEXT NOT NULL,
+            value REAL,
+            window TEXT NOT NULL,
+            limit_value REAL,
+            status TEXT NOT NULL,
+            reading_id INTEGER,
+            ts_epoch INTEGER,
+            sensor_id TEXT
+        )
+    """,
+    "alerts": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            category TEXT NOT NULL,
+            value REAL,
+            limit_value REAL,
+            severity TEXT NOT NULL,
+            message TEXT NOT NULL,
+            reading_id INTEGER,
+            ts_epoch INTEGER,
+            sensor_id TEXT
+        )
+    """,
+    "ventilation_history": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            fan_supply INTEGER NOT NULL,
+            fan_exhaust INTEGER NOT NULL,
+            ac_power INTEGER NOT NULL,
+            reasons TEXT NOT NULL,
+            reading_id INTEGER,
+            ts_epoch INTEGER
+        )
+    """,
+}
+
+_INDEXES = {
+    "metrics": ("metric_type, ts_epoch", "ts_epoch"),
+    "alerts": ("category, ts_epoch", "severity, ts_epoch", "ts_epoch"),
+    "ventilation_history": ("mode, ts_epoch", "ts_epoch"),
+}
+
+_INSERT_COLUMNS = {
+    "metrics": (
+        "timestamp, metric_type, value, window, limit_value, status, reading_id, ts_epoch, "
+        "sensor_id"
+    ),
+    "alerts": (
+        "timestamp, category, value, limit_value, severity, message, reading_id, ts_epoch, "
+        "sensor_id"
+    ),
+    "ventilation_history": (
+        "timestamp, mode, fan_supply, fan_exhaust, ac_power, reasons, reading_id, ts_epoch"
+    ),
+}
+
+
+def thresholds_hash():
+    with open(thresholds.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+# ------------------------------------------------
+# Schema
+# ------------------------------------------------
+def init_reprocess_db():
+    with transaction(table_db_path("reprocess_runs")) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS reprocess_runs (
+                version INTEGER PRIMARY KEY,
+                start_epoch INTEGER NOT NULL,
+                end_epoch INTEGER NOT NULL,
+                chunk_seconds INTEGER NOT NULL,
+                thresholds_hash TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                finished_at TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS reprocess_chunks (
+                version INTEGER NOT NULL,
+                start_epoch INTEGER NOT NULL,
+                readings INTEGER NOT NULL,
+                metrics INTEGER NOT NULL,
+                alerts INTEGER NOT NULL,
+                ventilation INTEGER NOT NULL,
+                done_at TEXT NOT NULL,
+                PRIMARY KEY (version, start_epoch)
+            )
+        """)
+
+
+def init_output_tables(version):
+    for base, ddl in _SCHEMAS.items():
+        table = versioned_table(base, version)
+        with transaction(table_db_path(table)) as conn:
+            conn.execute(ddl.format(table=table))
+            if base != "ventilation_history":
+                # Tables of runs started before readings carried a sensor
+                ensure_columns(conn, table, {"sensor_id": "TEXT"})
+            for columns in _INDEXES[base]:
+                suffix = columns.replace(", ", "_")
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {table} ({columns})"
+                )
+
+
+# ------------------------------------------------
+# Runs and checkpoints
+# ------------------------------------------------
+def _now():
+    return from_epoch(time.time())
+
+
+def get_run(version):
+    conn, lock = get_connection(table_db_path("reprocess_runs"))
+    with lock:
+        row = conn.execute(
+            "SELECT version, start_epoch, end_epoch, chunk_seconds, thresholds_hash, "
+            "created_at, finished_at FROM reprocess_runs WHERE version = ?",
+            (version,),
+        ).fetchone()
+    if row is None:
+        return None
+    keys = ("version", "start", "end", "chunk_seconds", "thresholds_hash",
+            "created_at", "finished_at")
+    return dict(zip(keys, row))
+
+
+def list_runs():
+    conn, lock = get_connection(table_db_path("reprocess_runs"))
+    with lock:
+        versions = [
+            row[0] for row in
+            conn.execute("SELECT version FROM reprocess_runs ORDER BY version")
+        ]
+    return [get_run(v) for v in versions]
+
+
+def create_run(start=None, end=None, chunk_seconds=REPROCESS_CHUNK_SECONDS, version=None):
+    """Register a new run over [start, end) (default: every stored reading)."""
+
+    first, last = epoch_range("sensor_readings")
+    if first is None:
+        raise RuntimeError("sensor_readings is empty; nothing to reprocess")
+    start = first if start is None else int(start)
+    end = last + 1 if end is None else int(end)
+    if end <= start:
+        raise ValueError(f"Empty range: [{start}, {end})")
+
+    with transaction(table_db_path("reprocess_runs")) as conn:
+        if version is None:
+            version = conn.execute(
+                "SELECT COALESCE(MAX(version), 1) + 1 FROM reprocess_runs"
+            ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO reprocess_runs (version, start_epoch, end_epoch, chunk_seconds, "
+            "thresholds_hash, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (version, start, end, int(chunk_seconds), thresholds_hash(), _now()),
+        )
+    init_output_tables(version)
+    return get_run(version)
+
+
+def plan_chunks(run):
+    return [
+        (s, min(s + run["chunk_seconds"], run["end"]))
+        for s in range(run["start"], run["end"], run["chunk_seconds"])
+    ]
+
+
+def done_chunks(version):
+    """{chunk start: readings} for every checkpointed chunk of a run."""
+
+    conn, lock = get_connection(table_db_path("reprocess_chunks"))
+    with lock:
+        return dict(conn.execute(
+            "SELECT start_epoch, readings FROM reprocess_chunks WHERE version = ?",
+            (version,),
+        ))
+
+
+# ------------------------------------------------
+# Worker side
+# ------------------------------------------------
+def _init_worker(db_root):
+    set_db_root(db_root)
+
+
+def _warm_exposure(start):
+    """ExposureEngine holding the CO history a live run would have at `start`.
+
+    Every sensor is warmed from its own readings only.
+    """
+
+    engine = ExposureEngine()
+    warm = fetch_columns(
+        "sensor_readings",
+        start - CO_TWA_WINDOW_SECONDS - CO_EXPOSURE_MAX_GAP_SECONDS, start,
+        columns=("sensor_id", "timestamp", "co_mean"),
+    )
+    for sensor_id, ts, co_mean in zip(
+        warm["sensor_id"], warm["timestamp"], warm["co_mean"].tolist()
+    ):
+        engine.update(sensor_id or DEFAULT_SENSOR_ID, ts, co_mean)
+    return engine
+
+
+def _forecast_packets(batch, sensor_ids, first):
+    """Status packets from reading `first` on, each with its sensor's forecast.
+
+    Readings before `first` only warm the forecaster up.
+    """
+
+    forecaster = ForecastEngine()
+    packets = []
+    for i, (sensor_id, packet) in enumerate(zip(sensor_ids, iter_status_packets(batch))):
+        packet["forecast"] = forecaster.update(sensor_id, packet)
+        if i >= first:
+            packets.append(packet)
+    return packets
+
+
+def process_chunk(start, end):
+    """Evaluate the readings in [start, end); returns columnar results."""
+
+    fetch_start = start - REPROCESS_FORECAST_WARMUP_SECONDS if FORECAST_ENABLED else start
+    cols = fetch_columns("sensor_readings", fetch_start, end, columns=_READING_COLUMNS)
+    ids, epochs = cols["id"], cols["ts_epoch"]
+    first = int(np.searchsorted(epochs, start))
+    n = len(ids) - first
+    result = {"start": start, "readings": n}
+    if n == 0:
+        return result
+
+    batch = evaluate_batch(cols, exposure=_warm_exposure(fetch_start))
+    sensor_ids = [sensor_id or DEFAULT_SENSOR_ID for sensor_id in cols["sensor_id"]]
+    sensors = np.array(sensor_ids, dtype=object)
+
+    metrics = batch["metrics"]
+    keep = metrics["reading_index"] >= first
+    idx = metrics["reading_index"][keep]
+    result["metrics"] = (
+        metrics["timestamp"][keep].tolist(), metrics["type"][keep].tolist(),
+        metrics["value"][keep].tolist(), metrics["window"][keep].tolist(),
+        metrics["limit"][keep].tolist(), metrics["status"][keep].tolist(),
+        ids[idx].tolist(), epochs[idx].tolist(), sensors[idx].tolist(),
+    )
+
+    alerts = batch["alerts"]
+    keep = alerts["reading_index"] >= first
+    idx = alerts["reading_index"][keep]
+    result["alerts"] = (
+        alerts["timestamp"][keep].tolist(), alerts["category"][keep].tolist(),
+        alerts["value"][keep].tolist(), alerts["limit"][keep].tolist(),
+        alerts["severity"][keep].tolist(), alerts["message"][keep].tolist(),
+        ids[idx].tolist(), epochs[idx].tolist(), sensors[idx].tolist(),
+    )
+
+    if FORECAST_ENABLED:
+        packets = _forecast_packets(batch, sensor_ids, first)
+    else:
+        packets = iter_status_packets(batch)
+    actions = decide_hvac_actions_many(packets)
+    ids, epochs = ids[first:], epochs[first:]
+    result["ventilation"] = (
+        [a["timestamp"] for a in actions],
+        [a["ventilation_mode"] for a in actions],
+        [a["fan_supply_speed"] for a in actions],
+        [a["fan_exhaust_speed"] for a in actions],
+        [a["ac_power"] for a in actions],
+        [json.dumps(a["reasons"]) for a in actions],
+        ids.tolist(), epochs.tolist(),
+    )
+    return result
+
+
+# ------------------------------------------------
+# Parent side
+# ------------------------------------------------
+def write_chunk(version, start, end, result):
+    """Replace the chunk's rows in the versioned tables and checkpoint it.
+
+    Rows from an interrupted earlier attempt are deleted first, so a chunk
+    can be written any number of times.
+    """
+
+    counts = {}
+    for base, key in (("metrics", "metrics"), ("alerts", "alerts"),
+                      ("ventilation_history", "ventilation")):
+        table = versioned_table(base, version)
+        columns = result.get(key)
+        with transaction(table_db_path(table)) as conn:
+            conn.execute(
+                f"DELETE FROM {table} WHERE ts_epoch >= ? AND ts_epoch < ?", (start, end)
+            )
+            if columns:
+                placeholders = ", ".join("?" * len(columns))
+                # NaN limits/values are stored as NULL by sqlite3
+                conn.executemany(
+                    f"INSERT INTO {table} ({_INSERT_COLUMNS[base]}) VALUES ({placeholders})",
+                    zip(*columns),
+                )
+        counts[key] = len(columns[0]) if columns else 0
+
+    with transaction(table_db_path("reprocess_chunks")) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO reprocess_chunks "
+            "(version, start_epoch, readings, metrics, alerts, ventilation, done_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (version, start, result["readings"], counts["metrics"], counts["alerts"],
+             counts["ventilation"], _now()),
+        )
+    return counts
+
+
+class Progress:
+    def __init__(self, total_chunks, done, interval=REPROCESS_PROGRESS_SECONDS):
+        self.total = total_chunks
+        self.done = done
+        self.session_chunks = 0
+        self.readings = 0
+        self.interval = interval
+        self.started = self._last = time.monotonic()
+
+    def update(self, readings, force=False):
+        self.done += 1
+        self.session_chunks += 1
+        self.readings += readings
+        now = time.monotonic()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        elapsed = now - self.started
+        rate = self.readings / elapsed if elapsed > 0 else 0.0
+        eta = elapsed / self.session_chunks * (self.total - self.done)
+        print(
+            f"⏳ {self.done}/{self.total} chunks | {self.readings} readings "
+            f"| {rate:.0f} readings/s | ETA {eta:.0f}s"
+        )
+
+
+def run_reprocess(run, workers=REPROCESS_WORKERS):
+    """Process every unfinished chunk of `run`; returns totals for this session."""
+
+    if run["thresholds_hash"] != thresholds_hash():
+        raise RuntimeError(
+            f"thresholds.py changed since run {run['version']} started; "
+            "start a new version instead of resuming"
+        )
+    version = run["version"]
+    init_output_tables(version)
+    chunks = plan_chunks(run)
+    finished = done_chunks(version)
+    todo = [(s, e) for s, e in chunks if s not in finished]
+
+    progress = Progress(len(chunks), len(chunks) - len(todo))
+    totals = {"readings": 0, "metrics": 0, "alerts": 0, "ventilation": 0}
+    workers = workers or os.cpu_count() or 1
+    bounds = dict(todo)
+
+    # Spawned workers start without the parent's SQLite connections
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(get_db_root(),),
+    ) as pool:
+        queue = iter(todo)
+        pending = set()
+        while True:
+            while len(pending) < workers * REPROCESS_MAX_PENDING:
+                chunk = next(queue, None)
+                if chunk is None:
+                    break
+                pending.add(pool.submit(process_chunk, *chunk))
+            if not pending:
+                break
+            completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                result = future.result()
+                start = result["start"]
+                counts = write_chunk(version, start, bounds[start], result)
+                totals["readings"] += result["readings"]
+                for key, count in counts.items():
+                    totals[key] += count
+                progress.update(result["readings"], force=not pending)
+
+    with transaction(table_db_path("reprocess_runs")) as conn:
+        conn.execute(
+            "UPDATE reprocess_runs SET finished_at = ? WHERE version = ?", (_now(), version)
+        )
+    return totals
+
+
+def _bound(value):
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return int(to_epoch(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocess stored readings into versioned tables")
+    parser.add_argument("--from", dest="start", help="first reading time (ISO or epoch)")
+    parser.add_argument("--to", dest="end", help="stop before this reading time")
+    parser.add_argument("--version", type=int,
+                        help="output version; an existing run with this version is resumed")
+    parser.add_argument("--workers", type=int, default=REPROCESS_WORKERS,
+                        help="worker processes (0 = one per CPU)")
+    parser.add_argument("--chunk-hours", type=float,
+                        default=REPROCESS_CHUNK_SECONDS / 3600.0)
+    parser.add_argument("--list", action="store_true", help="show runs and their progress")
+    args = parser.parse_args()
+
+    init_storage()
+    init_reprocess_db()
+
+    if args.list:
+        for run in list_runs():
+            done = len(done_chunks(run["version"]))
+            state = "finished" if run["finished_at"] else "incomplete"
+            print(
+                f"v{run['version']}: {from_epoch(run['start'])} → {from_epoch(run['end'])} "
+                f"| {done}/{len(plan_chunks(run))} chunks | {state} "
+                f"| thresholds {run['thresholds_hash']}"
+            )
+        return
+
+    run = get_run(args.version) if args.version is not None else None
+    if run is None:
+        run = create_run(
+            _bound(args.start), _bound(args.end),
+            int(args.chunk_hours * 3600), version=args.version,
+        )
+        print(f"🚀 Reprocessing into version {run['version']}")
+    else:
+        print(f"🔁 Resuming version {run['version']}")
+
+    started = time.perf_counter()
+    totals = run_reprocess(run, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ v{run['version']}: {totals['readings']} readings → {totals['metrics']} metrics, "
+        f"{totals['alerts']} alerts, {totals['ventilation']} HVAC decisions in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import math
+from functools import lru_cache
 
-from app.config.thresholds import TEMP_LIMITS, PRESSURE_LIMITS, WBGT_THRESHOLDS
-from app.db.alerts_db import insert_alert
+from app.config.thresholds import ENV_SEVERITY
+from app.metrics.bands import PRESSURE_BANDS, TEMP_BANDS, WBGT_BANDS
 
 DEFAULT_WBGT_RH = 40
 
@@ -24,48 +25,55 @@ def estimate_wet_bulb(temp_c: float, humidity: float = DEFAULT_WBGT_RH) -> float
     )
 
 
+@lru_cache(maxsize=4096)
+def wbgt_coefficients(humidity: float = DEFAULT_WBGT_RH):
+    """The humidity-only terms of WBGT = a * T + 0.7 * atan(T + RH) + c.
+
+    Stull's formula only couples temperature and humidity through
+    atan(T + RH). Humidity is either the 40% default or a sensor value with
+    a few hundred distinct readings, so (a, c) is computed once per value.
+    """
+
+    RH = humidity
+    a = 0.7 * math.atan(0.151977 * math.sqrt(RH + 8.313659)) + 0.3
+    c = 0.7 * (
+        - math.atan(RH - 1.676331)
+        + 0.00391838 * (RH ** 1.5) * math.atan(0.023101 * RH)
+        - 4.686035
+    )
+    return a, c
+
+
 def compute_wbgt(temp_c: float, humidity: float = DEFAULT_WBGT_RH) -> float:
     """Approximate WBGT using wet-bulb estimate and dry-bulb temperature.
 
-    When no humidity reading is provided, a 40% default is used to match the
-    agreed-upon baseline for environments without a dedicated humidity sensor.
+    `humidity` is the measured relative humidity (%) when the node reports
+    one; otherwise the 40% default is used, the agreed-upon baseline for
+    environments without a dedicated humidity sensor.
     """
 
-    twb = estimate_wet_bulb(temp_c, humidity)
-    return 0.7 * twb + 0.3 * temp_c
+    a, c = wbgt_coefficients(humidity)
+    return temp_c * a + 0.7 * math.atan(temp_c + humidity) + c
+
+
+def wbgt_max_error(temp_range=(-40.0, 125.0), humidity_range=(0.0, 100.0), step=0.25):
+    """Largest |compute_wbgt - closed-form Stull blend| over a grid (°C).
+
+    Asserted by tests/test_wbgt.py.
+    """
 
+    def points(low, high):
+        return [low + k * step for k in range(int((high - low) / step) + 1)]
 
-def _classify(value, limits):
-    if isinstance(limits, dict):
-        thresholds = ((level, bounds[0], bounds[1]) for level, bounds in limits.items())
-    else:
-        thresholds = limits
+    return max(
+        abs(compute_wbgt(t, rh) - (0.7 * estimate_wet_bulb(t, rh) + 0.3 * t))
+        for rh in points(*humidity_range)
+        for t in points(*temp_range)
+    )
 
-    for level, low, high in thresholds:
-        if low <= value < high:
-            return level, low, high
-    return "unknown", None, None
 
 def _level_to_severity(level: str):
-    return {
-        "green": "none",
-        "yellow": "warning",
-        "yellow-low": "warning",
-        "yellow-high": "warning",
-        "orange-low": "warning",
-        "orange-high": "warning",
-        "orange": "warning",
-        "red-low": "high",
-        "red-high": "high",
-        "red": "high",
-        "dark-red-low": "critical",
-        "dark-red-high": "critical",
-        "dark-red": "critical",
-        "dark_red": "critical",
-        "purple-low": "critical",
-        "purple-high": "critical",
-        "purple": "critical",
-    }.get(level, "none")
+    return ENV_SEVERITY.get(level, "none")
 
 def level_to_severity(level: str) -> str:
     """Public wrapper for mapping band names to severity strings."""
@@ -74,15 +82,15 @@ def level_to_severity(level: str) -> str:
 
 
 def classify_temp(temp):
-    return _classify(temp, TEMP_LIMITS)
+    return TEMP_BANDS.classify(temp)
 
 
 def classify_pressure(p):
-    return _classify(p, PRESSURE_LIMITS)
+    return PRESSURE_BANDS.classify(p)
 
 
 def classify_wbgt(w):
-    return _classify(w, WBGT_THRESHOLDS)
+    return WBGT_BANDS.classify(w)
 
 def process_wbgt(timestamp, wbgt_value):
     level, low, high = classify_wbgt(wbgt_value)
@@ -128,3 +136,4 @@ def build_environment_alert(category: str, timestamp: str, value: float, level_d
         "severity": severity,
         "message": f"{category}={value} is {level.upper()} ({low}-{high})"
     }
+
@@ -1 +1,2 @@
 from .validate_payload import validate_payload
+from .binary_payload import decode_reading, encode_reading, parse_payload
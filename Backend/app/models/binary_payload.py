@@ -0,0 +1,147 @@
+"""
+Fixed-layout binary sensor payload, with JSON as the fallback format.
+
+Layout v1 (little-endian, 41 bytes):
+
+    offset  type     field
+    0       uint8    payload type (PAYLOAD_TYPE_READING = 0xA1)
+    1       uint8    layout version (1)
+    2       uint8    flags: bit0 co_valid, bit1 co2 present, bit2 humidity present
+    3       uint16   node id (0 = not set)
+    5       uint32   timestamp, epoch seconds UTC
+    9       float32  temp, pressure, co_mean, co_max, pm2_5, pm10, co2
+    37      uint32   CRC-32 of bytes 0..36
+
+Layout v2 (45 bytes) appends float32 humidity (% RH) at offset 37, with the
+CRC-32 of bytes 0..40 at offset 41. Encoders only emit v2 for readings that
+carry a humidity value, so v1-only decoders keep working for the rest.
+
+The type byte is outside printable ASCII, so it can never be mistaken for
+the start of a JSON document. Decoding reads straight from the MQTT payload
+buffer through a memoryview and applies the same NaN/inf and range checks
+as validate_payload.
+"""
+
+import json
+import re
+import struct
+import zlib
+
+from app.models.validate_payload import check_ranges, validate_payload
+from app.utils.time_utils import from_epoch, to_epoch
+
+PAYLOAD_TYPE_READING = 0xA1
+VERSION = 2
+
+FLAG_CO_VALID = 0x01
+FLAG_CO2 = 0x02
+FLAG_HUMIDITY = 0x04
+
+# layout version -> body struct (the CRC follows the body)
+_LAYOUTS = {
+    1: struct.Struct("<BBBHI7f"),
+    2: struct.Struct("<BBBHI8f"),
+}
+_CRC = struct.Struct("<I")
+READING_SIZES = {version: layout.size + _CRC.size for version, layout in _LAYOUTS.items()}
+
+_FIELDS = ("temp", "pressure", "co_mean", "co_max", "pm2_5", "pm10", "co2")
+
+_NODE_ID = struct.Struct("<H")
+_JSON_SENSOR_ID = re.compile(rb'"sensor_id"\s*:\s*(?:"((?:[^"\\]|\\.)*)"|(-?\d+))')
+
+
+def is_binary(payload):
+    return len(payload) > 0 and payload[0] == PAYLOAD_TYPE_READING
+
+
+def encode_reading(reading, node_id=0):
+    """Pack a reading dict (validate_payload shape, epoch or ISO timestamp)."""
+
+    timestamp = reading["timestamp"]
+    if isinstance(timestamp, str):
+        timestamp = to_epoch(timestamp)
+
+    flags = FLAG_CO_VALID if reading.get("co_valid") else 0
+    co2 = reading.get("co2")
+    if co2 is not None:
+        flags |= FLAG_CO2
+
+    values = [
+        reading["temp"], reading["pressure"], reading["co_mean"],
+        reading["co_max"], reading["pm2_5"], reading["pm10"],
+        0.0 if co2 is None else co2,
+    ]
+    version = 1
+    humidity = reading.get("humidity")
+    if humidity is not None:
+        flags |= FLAG_HUMIDITY
+        values.append(humidity)
+        version = 2
+
+    body = _LAYOUTS[version].pack(
+        PAYLOAD_TYPE_READING, version, flags, node_id, int(timestamp), *values
+    )
+    return body + _CRC.pack(zlib.crc32(body))
+
+
+def decode_reading(payload):
+    """Decode a binary reading from any bytes-like object without copying."""
+
+    view = memoryview(payload)
+    version = view[1] if len(view) > 1 else None
+    layout = _LAYOUTS.get(version)
+    if layout is None:
+        raise ValueError(f"Unsupported binary payload version: {version}")
+    if len(view) != READING_SIZES[version]:
+        raise ValueError(
+            f"Binary payload is {len(view)} bytes, expected {READING_SIZES[version]}"
+        )
+
+    (expected_crc,) = _CRC.unpack_from(view, layout.size)
+    if zlib.crc32(view[:layout.size]) != expected_crc:
+        raise ValueError("Binary payload checksum mismatch")
+
+    ptype, _, flags, node_id, epoch, *values = layout.unpack_from(view)
+    if ptype != PAYLOAD_TYPE_READING:
+        raise ValueError(f"Unknown payload type: {ptype:#x}")
+    if not flags & FLAG_CO2:
+        raise ValueError("Missing field: co2")
+
+    reading = dict(zip(_FIELDS, values))
+    if flags & FLAG_HUMIDITY:
+        reading["humidity"] = values[7]
+    reading["timestamp"] = from_epoch(epoch)
+    reading["co_valid"] = bool(flags & FLAG_CO_VALID)
+    if node_id:
+        reading["sensor_id"] = str(node_id)
+    return check_ranges(reading)
+
+
+def sensor_key(payload):
+    """The sender's id without decoding the payload, or None if it has none.
+
+    Binary payloads give their node id, JSON ones their "sensor_id" (found by
+    a scan, not a parse), both as the string decode/validate would store.
+    """
+
+    if is_binary(payload):
+        if len(payload) < 3 + _NODE_ID.size:
+            return None
+        (node_id,) = _NODE_ID.unpack_from(payload, 3)
+        return str(node_id) if node_id else None
+    match = _JSON_SENSOR_ID.search(payload)
+    if match is None:
+        return None
+    key = match.group(1) if match.group(1) is not None else match.group(2)
+    return key.decode("utf-8", "replace")
+
+
+def parse_payload(payload):
+    """Return a validated reading from a binary or JSON MQTT payload."""
+
+    if is_binary(payload):
+        return decode_reading(payload)
+    if isinstance(payload, memoryview):
+        payload = payload.tobytes()
+    return validate_payload(json.loads(payload))
@@ -1,3 +1,27 @@
+import math
+
+from app.config.config import SENSOR_FIELD_RANGES
+
+# May be absent from a reading; checked only when present
+OPTIONAL_FIELDS = ("humidity",)
+
+
+def check_ranges(reading):
+    """Reject NaN/inf and values outside SENSOR_FIELD_RANGES."""
+
+    for field, (low, high) in SENSOR_FIELD_RANGES.items():
+        if field not in reading:
+            if field in OPTIONAL_FIELDS:
+                continue
+            raise ValueError(f"Missing field: {field}")
+        value = reading[field]
+        if not math.isfinite(value):
+            raise ValueError(f"Non-finite value for {field}: {value}")
+        if not low <= value <= high:
+            raise ValueError(f"{field}={value} outside [{low}, {high}]")
+    return reading
+
+
 def validate_payload(d):
     required = [
         "timestamp", "temp", "pressure",
@@ -9,7 +33,7 @@ def validate_payload(d):
         if r not in d:
             raise ValueError(f"Missing field: {r}")
 
-    return {
+    reading = {
         "timestamp": d["timestamp"],
         "temp": float(d["temp"]),
         "pressure": float(d["pressure"]),
@@ -20,3 +44,13 @@ def validate_payload(d):
         "pm10": float(d["pm10"]),
         "co2": float(d["co2"])
     }
+
+    # Optional relative humidity (%), for WBGT instead of the 40% default
+    if d.get("humidity") is not None:
+        reading["humidity"] = float(d["humidity"])
+
+    # Optional node identifier, used to keep per-sensor rolling state apart
+    if "sensor_id" in d:
+        reading["sensor_id"] = str(d["sensor_id"])
+
+    return check_ranges(reading)
@@ -0,0 +1,138 @@
+"""
+Append-only capture log of raw MQTT payloads.
+
+Segments are files named capture-<first receive time, ms>-<seq>.seg in
+CAPTURE_DIR. Each starts with the 8-byte magic SEGMENT_MAGIC followed by
+records:
+
+    uint32  payload length
+    float64 receive time (epoch seconds)
+    uint16  topic length
+    bytes   topic (utf-8)
+    bytes   payload
+
+all little-endian. A segment rolls over past CAPTURE_SEGMENT_BYTES. A record
+cut short by a crash is ignored by the reader.
+"""
+
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from app.config.config import CAPTURE_DIR, CAPTURE_FLUSH_SECONDS, CAPTURE_SEGMENT_BYTES
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b"IASCAP1\n"
+_RECORD = struct.Struct("<IdH")
+
+
+class CaptureLog:
+    def __init__(
+        self,
+        directory=CAPTURE_DIR,
+        segment_bytes=CAPTURE_SEGMENT_BYTES,
+        flush_seconds=CAPTURE_FLUSH_SECONDS,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_seconds = flush_seconds
+        self._file = None
+        self._size = 0
+        self._seq = 0
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def _open_segment(self, received_at):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"capture-{int(received_at * 1000):015d}-{self._seq:04d}.seg"
+        self._seq += 1
+        self._file = open(os.path.join(self.directory, name), "ab", buffering=1 << 20)
+        self._file.write(SEGMENT_MAGIC)
+        self._size = len(SEGMENT_MAGIC)
+
+    def append(self, topic, payload, received_at=None):
+        if received_at is None:
+            received_at = time.time()
+        topic_bytes = topic.encode()
+        header = _RECORD.pack(len(payload), received_at, len(topic_bytes))
+
+        with self._lock:
+            if self._file is None or self._size >= self.segment_bytes:
+                self._open_segment(received_at)
+            self._file.write(header)
+            self._file.write(topic_bytes)
+            self._file.write(payload)
+            self._size += len(header) + len(topic_bytes) + len(payload)
+            self.records += 1
+
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_seconds:
+                self._file.flush()
+                self._last_flush = now
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def list_segments(directory=CAPTURE_DIR):
+    """Segment files in capture order."""
+
+    return sorted(glob.glob(os.path.join(directory, "capture-*.seg")))
+
+
+def read_segment(path):
+    """Yield (received_at, topic, payload memoryview) from one segment.
+
+    The file is memory-mapped; payloads are views into the mapping and are
+    only valid until the generator moves on.
+    """
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= len(SEGMENT_MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                if view[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                    raise ValueError(f"{path} is not a capture segment")
+                offset, end = len(SEGMENT_MAGIC), len(view)
+                while offset + _RECORD.size <= end:
+                    length, received_at, topic_len = _RECORD.unpack_from(view, offset)
+                    start = offset + _RECORD.size
+                    stop = start + topic_len + length
+                    if stop > end:
+                        logger.warning("Truncated record at %s:%d ignored", path, offset)
+                        break
+                    topic = view[start:start + topic_len].tobytes().decode()
+                    payload = view[start + topic_len:stop]
+                    try:
+                        yield received_at, topic, payload
+                    finally:
+                        payload.release()
+                    offset = stop
+            finally:
+                view.release()
+
+
+def read_capture(directory=CAPTURE_DIR, start=None, end=None):
+    """Yield every record in `directory` with start <= received_at < end."""
+
+    for path in list_segments(directory):
+        first_ms = int(os.path.basename(path).split("-")[1])
+        if end is not None and first_ms / 1000.0 >= end:
+            break
+        for record in read_segment(path):
+            received_at = record[0]
+            if (start is None or received_at >= start) and (end is None or received_at < end):
+                yield record
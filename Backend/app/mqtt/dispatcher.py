@@ -0,0 +1,165 @@
+"""
+Bounded hand-off between the paho network thread and processing workers.
+
+The network callback only enqueues; a pool of worker threads runs the
+pipeline. Messages are routed to a worker by key (the sensor's node id or
+JSON sensor_id, else the topic), so readings from one sensor are always
+processed in arrival order while different sensors proceed in parallel,
+even when they all publish on one topic.
+
+Backpressure policies when a worker queue is full:
+    "block"        wait for space (pushes back on the broker socket)
+    "drop_oldest"  discard the oldest queued message for that worker
+    "drop_newest"  discard the incoming message
+"""
+
+import logging
+import threading
+import time
+import zlib
+from collections import deque
+
+from app.config.config import (
+    MQTT_BACKPRESSURE_POLICY,
+    MQTT_LAG_WARN_SECONDS,
+    MQTT_QUEUE_MAXSIZE,
+    MQTT_WORKER_COUNT,
+)
+
+from app.telemetry.instruments import observe_stage
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class _WorkerQueue:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = deque()
+        self.cond = threading.Condition()
+
+
+class MessageDispatcher:
+    def __init__(
+        self,
+        handler,
+        workers=MQTT_WORKER_COUNT,
+        max_queue=MQTT_QUEUE_MAXSIZE,
+        policy=MQTT_BACKPRESSURE_POLICY,
+        lag_warn_seconds=MQTT_LAG_WARN_SECONDS,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        if workers < 1:
+            raise ValueError("MessageDispatcher needs at least one worker")
+
+        self.handler = handler
+        self.policy = policy
+        self.lag_warn_seconds = lag_warn_seconds
+        capacity = max(1, max_queue // workers)
+        self._queues = [_WorkerQueue(capacity) for _ in range(workers)]
+        self._threads = []
+        self._running = False
+        self._lock = threading.Lock()
+        self._stats = {
+            "received": 0,
+            "processed": 0,
+            "failed": 0,
+            "dropped_oldest": 0,
+            "dropped_newest": 0,
+            "lagging": 0,
+            "max_lag_seconds": 0.0,
+        }
+
+    # ------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------
+    def start(self):
+        self._running = True
+        for i, wq in enumerate(self._queues):
+            t = threading.Thread(
+                target=self._run, args=(wq,), name=f"mqtt-worker-{i}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=None):
+        """Let workers finish what is queued, then stop them."""
+
+        self._running = False
+        for wq in self._queues:
+            with wq.cond:
+                wq.cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    # ------------------------------------------------
+    # Producer (paho network thread)
+    # ------------------------------------------------
+    def dispatch(self, key, item):
+        """Queue `item` on the worker owning `key`; returns False if dropped."""
+
+        wq = self._queues[zlib.crc32(key.encode()) % len(self._queues)]
+        entry = (time.monotonic(), item)
+
+        with self._lock:
+            self._stats["received"] += 1
+
+        with wq.cond:
+            if len(wq.items) >= wq.capacity:
+                if self.policy == "drop_newest":
+                    self._count("dropped_newest")
+                    return False
+                if self.policy == "drop_oldest":
+                    wq.items.popleft()
+                    self._count("dropped_oldest")
+                else:
+                    while len(wq.items) >= wq.capacity and self._running:
+                        wq.cond.wait()
+            wq.items.append(entry)
+            wq.cond.notify_all()
+        return True
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["dropped"] = snapshot["dropped_oldest"] + snapshot["dropped_newest"]
+        snapshot["queue_depth"] = sum(len(wq.items) for wq in self._queues)
+        snapshot["workers"] = len(self._queues)
+        snapshot["policy"] = self.policy
+        return snapshot
+
+    # ------------------------------------------------
+    # Workers
+    # ------------------------------------------------
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _run(self, wq):
+        while True:
+            with wq.cond:
+                while not wq.items and self._running:
+                    wq.cond.wait()
+                if not wq.items:
+                    return
+                enqueued_at, item = wq.items.popleft()
+                wq.cond.notify_all()
+
+            lag = time.monotonic() - enqueued_at
+            observe_stage("queue_wait", lag)
+            with self._lock:
+                if lag > self._stats["max_lag_seconds"]:
+                    self._stats["max_lag_seconds"] = lag
+                if lag > self.lag_warn_seconds:
+                    self._stats["lagging"] += 1
+
+            try:
+                self.handler(item)
+                self._count("processed")
+            except Exception:
+                self._count("failed")
+                logger.exception("❌ Worker error")
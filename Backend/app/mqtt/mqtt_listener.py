@@ -1,22 +1,61 @@
-import json
+import logging
+import time
+
 import paho.mqtt.client as mqtt
 
-from app.models.validate_payload import validate_payload
-from app.db.sensor_db import insert_sensor_reading
+from app.models.binary_payload import parse_payload, sensor_key
 from app.metrics.evaluator import evaluate_all_metrics
-from app.db.metrics_db import insert_metric_record
-from app.db.alerts_db import insert_alert_record
-from app.db.ventilation_db import insert_ventilation_record
+from app.metrics.forecast import get_forecaster
+from app.metrics.heatmap import get_heatmap
+from app.alerts.sink import get_alert_sink
+from app.db.retention import get_retention_manager
+from app.db.writer import get_writer
+from app.mqtt.capture import CaptureLog
+from app.mqtt.dispatcher import MessageDispatcher
+from app.mqtt.publisher import get_publisher
 from app.hvac.hvac_controller import decide_hvac_actions
+from app.hvac.zones import get_zone_tracker
+from app.state import get_state_cache
+from app.telemetry import (
+    count_error,
+    count_message,
+    observe_lag,
+    observe_stage,
+    register_collector,
+    start_http_server,
+    start_summary_logger,
+    timed,
+)
+from app.utils.time_utils import to_epoch
 from app.config.config import (
     MQTT_SERVER,
     MQTT_PORT,
     MQTT_TOPIC,
     MQTT_UNITY_TOPIC,
     MQTT_UNITY_ALERT_TOPIC,
+    MQTT_HEATMAP_TOPIC,
     MQTT_VENTILATION_TOPIC,
+    MQTT_ZONE_UNITY_ALERT_TOPIC,
+    MQTT_ZONE_UNITY_TOPIC,
+    MQTT_ZONE_VENTILATION_TOPIC,
+    MQTT_WORKER_COUNT,
+    CAPTURE_ENABLED,
+    DEFAULT_SENSOR_ID,
+    FORECAST_ENABLED,
+    HEATMAP_ENABLED,
+    RETENTION_ENABLED,
+    STATE_CACHE_ENABLED,
+    TELEMETRY_HTTP_PORT,
+    TELEMETRY_SUMMARY_INTERVAL_SECONDS,
 )
 
+logger = logging.getLogger(__name__)
+
+# Set by start_listener when processing runs on worker threads
+_dispatcher = None
+# Set by start_listener when CAPTURE_ENABLED
+_capture = None
+
 
 def _extract_color(level: str) -> str:
     sanitized = (level or "").replace("_", "-")
@@ -44,18 +83,28 @@ def build_unity_alert_messages(status_packet):
 
     severity_rank = {"none": 0, "warning": 1, "high": 2, "critical": 3}
 
+    forecasts = status_packet.get("forecast") or {}
+
     def _append_if_active(messages, name, data):
         if not data:
             return
 
+        forecast = forecasts.get(name)
+        crossing = forecast.get("crossing") if forecast else None
         severity = data.get("severity", "none")
-        if severity not in {"warning", "high", "critical"}:
+        eta = None
+        if crossing:
+            # Forecast to get worse: announce the coming severity ahead of time
+            severity, eta = crossing["severity"], crossing["eta_s"]
+        elif severity not in {"warning", "high", "critical"}:
             return
 
         messages.append(
             {
                 "gas": name,
-                "predicted_value": data.get("value"),
+                "predicted_value": forecast["value"] if forecast else data.get("value"),
+                "current_value": data.get("value"),
+                "eta_seconds": eta,
                 "level": severity,
                 "timestamp": ts,
             }
@@ -91,53 +140,205 @@ def build_unity_alert_messages(status_packet):
 
 
 
-def on_message(client, userdata, msg):
-    try:
-        data = json.loads(msg.payload.decode())
-        reading = validate_payload(data)
+def _topics(zone, node):
+    """(ventilation, Unity status, Unity alert) topics for a reading."""
+
+    if zone is None:
+        return MQTT_VENTILATION_TOPIC, MQTT_UNITY_TOPIC, MQTT_UNITY_ALERT_TOPIC
+    return tuple(
+        template.format(zone=zone, node=node)
+        for template in (
+            MQTT_ZONE_VENTILATION_TOPIC, MQTT_ZONE_UNITY_TOPIC, MQTT_ZONE_UNITY_ALERT_TOPIC,
+        )
+    )
 
-        insert_sensor_reading(reading)
 
-        results = evaluate_all_metrics(reading)
+def handle_message(client, payload, zone=None, node=None):
+    """Run the full pipeline for one raw sensor payload.
 
-        # Store metrics
-        for m in results["metrics"]:
-            insert_metric_record(m)
+    Under sharded ingestion `zone` and `node` come from the topic: together
+    they name the sensor, the HVAC decision covers the whole zone and
+    results go to that zone's topics.
+    """
+    stage = "decode"
+    started = time.perf_counter()
+    try:
+        with timed("decode"):
+            reading = parse_payload(payload)
+            if zone is not None:
+                reading["sensor_id"] = f"{zone}/{node}"
 
-        # Store alerts
-        for a in results["alerts"]:
-            insert_alert_record(a)
+        stage = "evaluate"
+        with timed(stage):
+            results = evaluate_all_metrics(reading)
 
         status_packet = results["results"]["status_packet"]
-        ventilation_actions = decide_hvac_actions(status_packet)
-        insert_ventilation_record(ventilation_actions)
+        sensor_id = reading.get("sensor_id", DEFAULT_SENSOR_ID)
+        if FORECAST_ENABLED:
+            stage = "forecast"
+            with timed(stage):
+                status_packet["forecast"] = get_forecaster().update(sensor_id, status_packet)
+
+        stage = "hvac"
+        with timed(stage):
+            if zone is None:
+                ventilation_actions = decide_hvac_actions(status_packet)
+            else:
+                # One decision for the zone, from its worst node per metric
+                ventilation_actions = decide_hvac_actions(
+                    get_zone_tracker().update(zone, node, status_packet)
+                )
+
+        # The alert sink merges ongoing exceedances into episodes and
+        # returns only the alerts worth a row of their own
+        stage = "alerts"
+        with timed(stage):
+            alerts = get_alert_sink().process(reading, results["alerts"], results["metrics"])
+
+        # Latest state for /state readers, swapped in as one update
+        if STATE_CACHE_ENABLED:
+            stage = "state"
+            with timed(stage):
+                get_state_cache().update(
+                    sensor_id, status_packet, ventilation_actions,
+                    get_alert_sink().open_episodes(sensor_id),
+                )
+
+        # The grid spans the whole floor, so it needs every sensor in one process
+        heatmap = None
+        if HEATMAP_ENABLED and zone is None:
+            stage = "heatmap"
+            with timed(stage):
+                heatmap = get_heatmap().update(sensor_id, status_packet)
+
+        # Reading, metrics, alerts and HVAC decision are stored together
+        stage = "store"
+        with timed(stage):
+            get_writer().submit_reading_bundle(
+                reading,
+                metrics=results["metrics"],
+                alerts=alerts,
+                ventilation=ventilation_actions,
+            )
+
+        stage = "publish"
+        with timed(stage):
+            publisher = get_publisher()
+            ventilation_topic, unity_topic, alert_topic = _topics(zone, node)
+            publish_payload = dict(ventilation_actions)
+            publish_payload.pop("reasons", None)
 
-        publish_payload = dict(ventilation_actions)
-        publish_payload.pop("reasons", None)
+            sent_ventilation = publisher.publish(client, ventilation_topic, publish_payload)
+            observe_lag(time.time() - to_epoch(reading["timestamp"]))
+            unity_payload = build_unity_payload(status_packet)
+            sent_unity = publisher.publish(client, unity_topic, unity_payload)
 
-        client.publish(MQTT_VENTILATION_TOPIC, json.dumps(publish_payload))
-        unity_payload = build_unity_payload(status_packet)
-        client.publish(MQTT_UNITY_TOPIC, json.dumps(unity_payload))
+            # Alerts are events, not state: never retained
+            unity_alerts = build_unity_alert_messages(status_packet)
+            sent_alerts = [
+                alert_msg for alert_msg in unity_alerts
+                if publisher.publish(client, alert_topic, alert_msg, retain=False)
+            ]
+            # Tile deltas only make sense in sequence: never retained
+            if heatmap is not None:
+                publisher.publish(client, MQTT_HEATMAP_TOPIC, heatmap, force=True, retain=False)
 
-        unity_alerts = build_unity_alert_messages(status_packet)
-        for alert_msg in unity_alerts:
-            client.publish(MQTT_UNITY_ALERT_TOPIC, json.dumps(alert_msg))
+        observe_stage("total", time.perf_counter() - started)
+        count_message("processed")
 
-        print("\n📥 Received:", reading)
-        print("📊 Stored metrics, alerts, and ventilation actions.")
-        print(f"📡 Published ventilation commands : {publish_payload}")
-        print(f"🎮 Sent Unity status payload: {unity_payload}")
-        if unity_alerts:
-            print(f"🚨 Sent Unity alert packets ({len(unity_alerts)}): {unity_alerts}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📥 Received: %s", reading)
+            logger.debug("📊 Queued metrics, alerts, and ventilation actions for storage.")
+            if sent_ventilation:
+                logger.debug("📡 Published ventilation commands : %s", publish_payload)
+            if sent_unity:
+                logger.debug("🎮 Sent Unity status payload: %s", unity_payload)
+            if sent_alerts:
+                logger.debug("🚨 Sent Unity alert packets (%d): %s", len(sent_alerts), sent_alerts)
 
     except Exception as e:
-        print("❌ Error:", e)
+        count_message("failed")
+        count_error(stage, e)
+        logger.error("❌ Error in %s: %s", stage, e)
+
+
+def _process_queued(item):
+    client, payload = item
+    handle_message(client, payload)
+
+
+def on_message(client, userdata, msg):
+    if _capture is not None:
+        _capture.append(msg.topic, msg.payload)
+    if _dispatcher is None:
+        handle_message(client, msg.payload)
+        return
+    # Key by sender so each sensor's readings stay in order; sensors sharing
+    # a topic still spread over the workers
+    key = sensor_key(msg.payload) or msg.topic
+    _dispatcher.dispatch(key, (client, msg.payload))
+
+
+def get_dispatcher_stats():
+    return _dispatcher.stats() if _dispatcher is not None else None
+
+
+def get_publisher_stats():
+    return get_publisher().stats()
+
+
+def pipeline_gauges():
+    gauges = {}
+    sources = (
+        ("dispatcher", get_dispatcher_stats()),
+        ("writer", get_writer().stats()),
+        ("publisher", get_publisher_stats()),
+        ("alert_sink", get_alert_sink().stats()),
+        ("retention", get_retention_manager().stats() if RETENTION_ENABLED else None),
+        ("state", get_state_cache().stats() if STATE_CACHE_ENABLED else None),
+        ("heatmap", get_heatmap().stats() if HEATMAP_ENABLED else None),
+    )
+    for prefix, stats in sources:
+        for name, value in (stats or {}).items():
+            gauges[f"{prefix}_{name}"] = value
+    if _capture is not None:
+        gauges["capture_records"] = _capture.records
+    return gauges
 
 
 def start_listener():
-    print("🚀 MQTT Listener ready...")
+    global _dispatcher, _capture
+
+    logger.info("🚀 MQTT Listener ready...")
+    if CAPTURE_ENABLED:
+        _capture = CaptureLog()
+    if MQTT_WORKER_COUNT > 0:
+        _dispatcher = MessageDispatcher(_process_queued).start()
+
+    register_collector(pipeline_gauges)
+    http_server = start_http_server() if TELEMETRY_HTTP_PORT else None
+    stop_summary = (
+        start_summary_logger() if TELEMETRY_SUMMARY_INTERVAL_SECONDS > 0 else None
+    )
+    stop_retention = get_retention_manager().start() if RETENTION_ENABLED else None
+
     client = mqtt.Client()
     client.on_message = on_message
     client.connect(MQTT_SERVER, MQTT_PORT)
     client.subscribe(MQTT_TOPIC)
-    client.loop_forever()
\ No newline at end of file
+    try:
+        client.loop_forever()
+    finally:
+        if _dispatcher is not None:
+            _dispatcher.stop()
+            _dispatcher = None
+        get_alert_sink().close_all()
+        if _capture is not None:
+            _capture.close()
+            _capture = None
+        if stop_summary is not None:
+            stop_summary.set()
+        if stop_retention is not None:
+            stop_retention.set()
+        if http_server is not None:
+            http_server.shutdown()
\ No newline at end of file
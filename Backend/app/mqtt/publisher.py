@@ -0,0 +1,131 @@
+"""
+Change-detection publisher for outgoing MQTT topics.
+
+Remembers the last payload sent on each topic and skips a publish when the
+new payload is the same apart from ignored fields (the timestamp). An
+unchanged payload is still re-sent every `keepalive_seconds`, so consumers
+can tell a quiet line from a dead one. Suppressed payloads are never
+serialized.
+"""
+
+import json
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from app.config.config import (
+    MQTT_PUBLISH_KEEPALIVE_SECONDS,
+    MQTT_PUBLISH_ON_CHANGE,
+    MQTT_PUBLISH_QOS,
+    MQTT_PUBLISH_RETAIN,
+)
+
+IGNORED_FIELDS = ("timestamp",)
+
+
+class _TopicState:
+    __slots__ = ("fingerprint", "sent_at")
+
+    def __init__(self, fingerprint, sent_at):
+        self.fingerprint = fingerprint
+        self.sent_at = sent_at
+
+
+class ChangePublisher:
+    def __init__(
+        self,
+        on_change=MQTT_PUBLISH_ON_CHANGE,
+        keepalive_seconds=MQTT_PUBLISH_KEEPALIVE_SECONDS,
+        retain=MQTT_PUBLISH_RETAIN,
+        qos=MQTT_PUBLISH_QOS,
+        ignored_fields=IGNORED_FIELDS,
+    ):
+        self.on_change = on_change
+        self.keepalive_seconds = keepalive_seconds
+        self.retain = retain
+        self.qos = qos
+        self.ignored_fields = frozenset(ignored_fields)
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._stats = {"sent": 0, "suppressed": 0, "keepalive": 0, "failed": 0}
+
+    def _fingerprint(self, payload):
+        if isinstance(payload, dict):
+            return {k: v for k, v in payload.items() if k not in self.ignored_fields}
+        return payload
+
+    def publish(self, client, topic, payload, force=False, retain=None):
+        """Publish `payload` (dict or str) unless it repeats the last one.
+
+        `retain` overrides the publisher default for this message. Returns
+        True if the client accepted the message; paho reports a dropped
+        connection through the returned rc rather than an exception.
+        """
+
+        fingerprint = self._fingerprint(payload)
+        now = time.monotonic()
+
+        with self._lock:
+            state = self._topics.get(topic)
+            unchanged = (
+                self.on_change
+                and not force
+                and state is not None
+                and state.fingerprint == fingerprint
+            )
+            if unchanged and now - state.sent_at < self.keepalive_seconds:
+                self._stats["suppressed"] += 1
+                return False
+            self._topics[topic] = sent = _TopicState(fingerprint, now)
+
+        message = payload if isinstance(payload, str) else json.dumps(payload)
+        try:
+            info = client.publish(
+                topic, message, qos=self.qos,
+                retain=self.retain if retain is None else retain,
+            )
+        except Exception:
+            self._forget_failed(topic, sent)
+            raise
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            # e.g. MQTT_ERR_NO_CONN while the client is reconnecting
+            self._forget_failed(topic, sent)
+            return False
+        with self._lock:
+            self._stats["sent"] += 1
+            if unchanged:
+                self._stats["keepalive"] += 1
+        return True
+
+    def _forget_failed(self, topic, state):
+        with self._lock:
+            # Forget the cached payload so the next call retries, unless a
+            # later publish has already replaced it
+            if self._topics.get(topic) is state:
+                del self._topics[topic]
+            self._stats["failed"] += 1
+
+    def reset(self, topic=None):
+        """Forget cached payloads (all topics, or one) so the next publish is sent."""
+
+        with self._lock:
+            if topic is None:
+                self._topics.clear()
+            else:
+                self._topics.pop(topic, None)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["topics"] = len(self._topics)
+        return snapshot
+
+
+_publisher = ChangePublisher()
+
+
+def get_publisher():
+    """The process-wide publisher used by the MQTT listener."""
+
+    return _publisher
@@ -0,0 +1,148 @@
+"""
+Replay a raw capture log through the ingest pipeline.
+
+    python -m app.mqtt.replay --db-dir /tmp/incident               # real time
+    python -m app.mqtt.replay --db-dir /tmp/incident --speed 60    # 60x
+    python -m app.mqtt.replay --db-dir /tmp/incident --speed max   # as fast as possible
+        [--capture-dir capture] [--from ISO] [--to ISO] [--topic T] [--workers N]
+
+Results go to a scratch database directory (--db-dir), never the live one.
+Nothing is published to the broker: outgoing messages go to a client that
+only counts them. Messages captured on a zone topic (MQTT_ZONE_TOPIC) are
+replayed with the zone and node parsed from it, as the shard workers
+handle them live; anything else goes through the single-topic path.
+"""
+
+import argparse
+import logging
+import time
+
+import paho.mqtt.client as mqtt
+
+from app.config.config import CAPTURE_DIR
+from app.db.connection import close_all, set_db_root
+from app.db.storage import init_storage
+from app.db.writer import get_writer, shutdown_writer
+from app.models.binary_payload import sensor_key
+from app.mqtt.capture import read_capture
+from app.mqtt.dispatcher import MessageDispatcher
+from app.mqtt.mqtt_listener import handle_message
+from app.mqtt.sharding import topic_parser
+from app.utils.time_utils import to_epoch
+
+logger = logging.getLogger(__name__)
+
+
+class NullClient:
+    """Swallows publishes so a replay never reaches the real broker."""
+
+    def __init__(self):
+        self.published = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published += 1
+        return mqtt.MQTTMessageInfo(self.published)
+
+
+def replay(records, handler, speed=None):
+    """Feed (received_at, topic, payload) records to `handler(topic, payload)`.
+
+    `speed` None replays as fast as possible; otherwise inter-arrival gaps
+    are reproduced divided by `speed` (1.0 = real time). Returns the number
+    of records replayed.
+    """
+
+    count = 0
+    first_at = started = None
+    for received_at, topic, payload in records:
+        if speed is not None:
+            if first_at is None:
+                first_at, started = received_at, time.monotonic()
+            delay = (received_at - first_at) / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        handler(topic, payload)
+        count += 1
+    return count
+
+
+def topic_handler(client, parse=None):
+    """Return `handle(topic, payload)` that runs the pipeline with the topic's zone/node."""
+
+    parse = parse or topic_parser()
+
+    def handle(topic, payload):
+        fields = parse(topic)
+        if fields is None:
+            handle_message(client, payload)
+        else:
+            handle_message(client, payload, zone=fields["zone"], node=fields.get("node", ""))
+
+    return handle
+
+
+def _bound(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return to_epoch(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured MQTT traffic")
+    parser.add_argument("--capture-dir", default=CAPTURE_DIR)
+    parser.add_argument("--db-dir", required=True, help="scratch database directory")
+    parser.add_argument("--speed", default="1", help="replay speed factor, or 'max'")
+    parser.add_argument("--from", dest="start", help="first receive time (ISO or epoch)")
+    parser.add_argument("--to", dest="end", help="stop before this receive time")
+    parser.add_argument("--topic", action="append", help="only replay these topics")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="process on N dispatcher workers (0 = inline, in order)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Before anything opens a connection, so the live files are never touched
+    set_db_root(args.db_dir)
+
+    speed = None if args.speed == "max" else float(args.speed)
+    topics = set(args.topic) if args.topic else None
+    client = NullClient()
+
+    init_storage()
+    handle = topic_handler(client)
+    dispatcher = None
+    if args.workers > 0:
+        dispatcher = MessageDispatcher(
+            lambda item: handle(*item), workers=args.workers, policy="block",
+        ).start()
+
+    def handler(topic, payload):
+        if topics is not None and topic not in topics:
+            return
+        if dispatcher is None:
+            handle(topic, payload)
+        else:
+            # The mapped view is only valid until the reader moves on
+            payload = payload.tobytes()
+            dispatcher.dispatch(sensor_key(payload) or topic, (topic, payload))
+
+    started = time.perf_counter()
+    count = replay(
+        read_capture(args.capture_dir, _bound(args.start), _bound(args.end)),
+        handler, speed,
+    )
+    if dispatcher is not None:
+        dispatcher.stop()
+    get_writer().flush()
+    elapsed = time.perf_counter() - started
+    shutdown_writer()
+    close_all()
+
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Replayed {count} messages in {elapsed:.1f}s ({rate:.0f} msg/s) into {args.db_dir}")
+
+
+if __name__ == "__main__":
+    main()
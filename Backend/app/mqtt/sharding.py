@@ -0,0 +1,452 @@
+"""
+Multi-zone ingestion sharded across worker processes.
+
+The parent process subscribes to MQTT_ZONE_TOPIC with every {field} turned
+into a `+` wildcard (factory/+/+/sensors) and does nothing but route: the
+zone in each topic is looked up on a consistent-hash ring of SHARD_WORKERS
+workers and the raw payload is queued to the owning process. Each worker
+runs the whole pipeline (handle_message) for its zones on its own
+interpreter, so ingest scales across cores instead of sharing one GIL:
+
+    - all nodes of a zone land on one worker, in arrival order, so the
+      worker owns the zone's rolling state (exposure, forecasts, episodes)
+      and can decide the zone's HVAC from all of its nodes;
+    - worker N keeps its databases under SHARD_DB_DIR/shard-N;
+    - worker N publishes through its own broker connection, to the
+      per-zone MQTT_ZONE_* topics.
+
+Workers sit on the ring under fixed names, so changing SHARD_WORKERS moves
+only about 1/N of the zones; their new readings go to the new owner's shard.
+Heatmaps stay with the single-process listener, as the grid needs every
+sensor in one place.
+
+Only the parent serves HTTP. Every SHARD_FORWARD_INTERVAL_SECONDS each
+worker sends it a telemetry snapshot and the /state entries updated since
+the last one, and a parent thread folds them into its own registry and
+state cache. The same thread watches the workers: a dead worker is
+restarted on a fresh inbox, and whatever was still queued for it is lost
+and counted. A worker that dies more than SHARD_MAX_RESTARTS times stops
+ingest with an error instead of being restarted forever. Under the "block"
+policy a full inbox is waited on SHARD_PUT_TIMEOUT_SECONDS at a time, with
+a liveness check in between, so a dead worker never blocks the MQTT loop
+for good.
+"""
+
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import threading
+
+import paho.mqtt.client as mqtt
+
+from app.config.config import (
+    CAPTURE_ENABLED,
+    LOG_LEVEL,
+    MQTT_PORT,
+    MQTT_SERVER,
+    MQTT_ZONE_TOPIC,
+    RETENTION_ENABLED,
+    SHARD_BACKPRESSURE_POLICY,
+    SHARD_DB_DIR,
+    SHARD_FORWARD_INTERVAL_SECONDS,
+    SHARD_MAX_RESTARTS,
+    SHARD_PUT_TIMEOUT_SECONDS,
+    SHARD_QUEUE_MAXSIZE,
+    SHARD_VIRTUAL_NODES,
+    SHARD_WORKERS,
+    STATE_CACHE_ENABLED,
+    TELEMETRY_HTTP_PORT,
+    TELEMETRY_SUMMARY_INTERVAL_SECONDS,
+)
+from app.alerts.sink import get_alert_sink
+from app.db.connection import close_all, set_db_root
+from app.db.retention import get_retention_manager
+from app.db.storage import init_storage
+from app.db.writer import shutdown_writer
+from app.metrics.exposure import default_exposure_engine
+from app.mqtt.capture import CaptureLog
+from app.mqtt.mqtt_listener import handle_message, pipeline_gauges
+from app.state import get_state_cache
+from app.telemetry import register_collector, registry, start_http_server, start_summary_logger
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("block", "drop_newest")
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto named nodes, with virtual nodes."""
+
+    def __init__(self, nodes, replicas=SHARD_VIRTUAL_NODES):
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        points = sorted(
+            (_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas)
+        )
+        self._hashes = [h for h, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def lookup(self, key):
+        i = bisect.bisect(self._hashes, _hash(key))
+        return self._nodes[i % len(self._nodes)]
+
+
+# ------------------------------------------------
+# Topics
+# ------------------------------------------------
+def subscription_topic(template=MQTT_ZONE_TOPIC):
+    """`factory/{zone}/{node}/sensors` -> `factory/+/+/sensors`."""
+
+    return re.sub(r"\{\w+\}", "+", template)
+
+
+def topic_parser(template=MQTT_ZONE_TOPIC):
+    """Return a function mapping a topic to {field: value}, or None if it does not match."""
+
+    pattern = "".join(
+        f"(?P<{part[1:-1]}>[^/]+)" if re.fullmatch(r"\{\w+\}", part) else re.escape(part)
+        for part in re.split(r"(\{\w+\})", template)
+    )
+    regex = re.compile(pattern + r"\Z")
+
+    def parse(topic):
+        match = regex.match(topic)
+        return match.groupdict() if match else None
+
+    return parse
+
+
+def shard_name(index):
+    return f"shard-{index}"
+
+
+# ------------------------------------------------
+# Worker process
+# ------------------------------------------------
+def _forward(name, outbox, stop, interval):
+    """Send telemetry and changed /state entries to the parent until `stop` is set."""
+
+    since = 0
+    while True:
+        stopped = stop.wait(interval)
+        entries = []
+        if STATE_CACHE_ENABLED:
+            since, entries = get_state_cache().changes(since)
+        outbox.put((name, registry.snapshot(), entries))
+        if stopped:
+            return
+
+
+def _worker_main(name, inbox, outbox, handled, index, template, db_dir, client_factory,
+                 forward_interval):
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL.upper(), logging.INFO),
+        format=f"%(asctime)s %(levelname)s [{name}] %(name)s: %(message)s",
+    )
+    # Before anything opens a connection, so shards never share a file
+    set_db_root(os.path.join(db_dir, name))
+    init_storage()
+    # Readings carry their zone/node sensor id, so each node resumes its own exposure
+    replayed = default_exposure_engine().rebuild_from_db()
+    logger.info("🔁 Worker %s rebuilt CO STEL/TWA state from %d stored readings", name, replayed)
+    stop_retention = get_retention_manager().start() if RETENTION_ENABLED else None
+
+    if client_factory is None:
+        client = mqtt.Client()
+        client.connect(MQTT_SERVER, MQTT_PORT)
+        client.loop_start()
+    else:
+        client = client_factory()
+    parse = topic_parser(template)
+    register_collector(pipeline_gauges)
+    stop_forward = threading.Event()
+    forwarder = threading.Thread(
+        target=_forward, args=(name, outbox, stop_forward, forward_interval),
+        name="shard-forward", daemon=True,
+    )
+    forwarder.start()
+    logger.info("🧩 Worker %s ready (pid %d)", name, os.getpid())
+    try:
+        while True:
+            item = inbox.get()
+            if item is None:
+                break
+            topic, payload = item
+            fields = parse(topic)
+            handle_message(client, payload, zone=fields["zone"], node=fields.get("node", ""))
+            handled[index] += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        get_alert_sink().close_all()
+        if stop_retention is not None:
+            stop_retention.set()
+        shutdown_writer()
+        close_all()
+        # One last report, with the final counts
+        stop_forward.set()
+        forwarder.join()
+        if client_factory is None:
+            client.loop_stop()
+            client.disconnect()
+
+
+# ------------------------------------------------
+# Router (parent process)
+# ------------------------------------------------
+class ShardRouter:
+    def __init__(
+        self,
+        workers=SHARD_WORKERS,
+        template=MQTT_ZONE_TOPIC,
+        max_queue=SHARD_QUEUE_MAXSIZE,
+        policy=SHARD_BACKPRESSURE_POLICY,
+        replicas=SHARD_VIRTUAL_NODES,
+        db_dir=SHARD_DB_DIR,
+        client_factory=None,
+        put_timeout=SHARD_PUT_TIMEOUT_SECONDS,
+        max_restarts=SHARD_MAX_RESTARTS,
+        forward_interval=SHARD_FORWARD_INTERVAL_SECONDS,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        if workers < 1:
+            raise ValueError("ShardRouter needs at least one worker")
+        if "{zone}" not in template:
+            raise ValueError(f"Zone topic template has no {{zone}}: {template}")
+
+        self.template = template
+        self.policy = policy
+        self.db_dir = db_dir
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.max_restarts = max_restarts
+        self.forward_interval = forward_interval
+        # Picklable stand-in for each worker's broker connection (e.g. replay.NullClient)
+        self.client_factory = client_factory
+        self.names = [shard_name(i) for i in range(workers)]
+        self.ring = HashRing(self.names, replicas)
+        self._parse = topic_parser(template)
+        # Spawned, not forked: the parent already runs paho and telemetry threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._inboxes = {name: self._ctx.Queue(max_queue) for name in self.names}
+        self._outbox = self._ctx.Queue()
+        self._handled = self._ctx.Array("q", workers, lock=False)
+        self._processes = {}
+        self._restarts = dict.fromkeys(self.names, 0)
+        self._failed = None       # name of a worker that died too often
+        self._stopping = False
+        self._stopped = threading.Event()
+        self._monitor = None
+        self._owners = {}     # zone -> shard name (memoized ring lookups)
+        self._lock = threading.Lock()
+        self._restart_lock = threading.Lock()
+        self._stats = {
+            "received": 0, "routed": 0, "unmatched": 0, "dropped": 0,
+            "restarts": 0, "lost": 0,
+        }
+
+    def _spawn(self, name):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                name, self._inboxes[name], self._outbox, self._handled,
+                self.names.index(name), self.template, self.db_dir,
+                self.client_factory, self.forward_interval,
+            ),
+            name=name,
+            daemon=True,
+        )
+        process.start()
+        self._processes[name] = process
+
+    def start(self):
+        for name in self.names:
+            self._spawn(name)
+        self._monitor = threading.Thread(target=self._watch, name="shard-monitor", daemon=True)
+        self._monitor.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Let workers finish what is queued, then stop them."""
+
+        self._stopping = True
+        for name, process in self._processes.items():
+            # A dead worker's inbox may be full and is never read again
+            while process.is_alive():
+                try:
+                    self._inboxes[name].put(None, timeout=self.put_timeout)
+                    break
+                except queue.Full:
+                    continue
+        # Workers flush a last report on exit; keep reading until they are gone
+        for process in self._processes.values():
+            process.join(timeout)
+        self._processes = {}
+        self._stopped.set()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+
+    # ------------------------------------------------
+    # Worker reports and liveness
+    # ------------------------------------------------
+    def _receive(self, timeout):
+        try:
+            name, telemetry, entries = self._outbox.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        registry.merge_remote(name, telemetry)
+        get_state_cache().apply(entries)
+        return True
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            self._receive(self.forward_interval)
+            for name in self.names:
+                try:
+                    self.ensure_alive(name)
+                except RuntimeError:
+                    pass   # logged; dispatch raises it on the MQTT thread
+        while self._receive(0):
+            pass
+
+    def ensure_alive(self, name):
+        """Restart worker `name` if it died; raises once it died too often."""
+
+        with self._restart_lock:
+            if self._failed is not None:
+                raise RuntimeError(
+                    f"Shard worker {self._failed} died more than {self.max_restarts} times"
+                )
+            process = self._processes.get(name)
+            if self._stopping or process is None or process.is_alive():
+                return
+            if self._restarts[name] >= self.max_restarts:
+                self._failed = name
+                logger.critical(
+                    "💀 Shard worker %s died again (exit code %s); not restarting",
+                    name, process.exitcode,
+                )
+                raise RuntimeError(f"Shard worker {name} died more than {self.max_restarts} times")
+
+            # The dead worker may hold the inbox's read lock: start over on a new one
+            old = self._inboxes[name]
+            try:
+                lost = old.qsize()
+            except NotImplementedError:
+                lost = 0
+            # Never wait on its feeder at exit; nothing will read it again
+            old.cancel_join_thread()
+            self._inboxes[name] = self._ctx.Queue(self.max_queue)
+            self._restarts[name] += 1
+            with self._lock:
+                self._stats["restarts"] += 1
+                self._stats["lost"] += lost
+            logger.error(
+                "💥 Shard worker %s died (exit code %s); restarting, %d queued messages lost",
+                name, process.exitcode, lost,
+            )
+            self._spawn(name)
+
+    def owner(self, zone):
+        name = self._owners.get(zone)
+        if name is None:
+            name = self._owners[zone] = self.ring.lookup(zone)
+        return name
+
+    def dispatch(self, topic, payload):
+        """Queue a raw message on the worker owning its zone; returns False if not queued."""
+
+        fields = self._parse(topic)
+        with self._lock:
+            self._stats["received"] += 1
+            if fields is None:
+                self._stats["unmatched"] += 1
+                return False
+
+        name = self.owner(fields["zone"])
+        if self._failed is not None:
+            self.ensure_alive(name)   # raises: ingest has given up
+        item = (topic, bytes(payload))
+        if self.policy == "block":
+            while True:
+                try:
+                    self._inboxes[name].put(item, timeout=self.put_timeout)
+                    break
+                except queue.Full:
+                    # A full inbox may mean a dead worker rather than a slow one
+                    self.ensure_alive(name)
+        else:
+            try:
+                self._inboxes[name].put_nowait(item)
+            except queue.Full:
+                with self._lock:
+                    self._stats["dropped"] += 1
+                return False
+        with self._lock:
+            self._stats["routed"] += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["zones"] = len(self._owners)
+        snapshot["workers"] = len(self.names)
+        snapshot["workers_alive"] = sum(p.is_alive() for p in self._processes.values())
+        snapshot["handled"] = sum(self._handled)
+        try:
+            snapshot["queue_depth"] = sum(q.qsize() for q in self._inboxes.values())
+        except NotImplementedError:
+            # qsize() is unavailable on macOS
+            pass
+        return snapshot
+
+
+def start_sharded_listener(workers=SHARD_WORKERS):
+    """Subscribe to every zone topic and route messages to worker processes."""
+
+    router = ShardRouter(workers).start()
+    capture = CaptureLog() if CAPTURE_ENABLED else None
+
+    def on_message(client, userdata, msg):
+        if capture is not None:
+            capture.append(msg.topic, msg.payload)
+        router.dispatch(msg.topic, msg.payload)
+
+    def gauges():
+        result = {f"shards_{name}": value for name, value in router.stats().items()}
+        if capture is not None:
+            result["capture_records"] = capture.records
+        return result
+
+    register_collector(gauges)
+    http_server = start_http_server() if TELEMETRY_HTTP_PORT else None
+    stop_summary = (
+        start_summary_logger() if TELEMETRY_SUMMARY_INTERVAL_SECONDS > 0 else None
+    )
+
+    topic = subscription_topic(router.template)
+    logger.info("🚀 Sharded listener on %s: %d worker processes", topic, len(router.names))
+    client = mqtt.Client()
+    client.on_message = on_message
+    client.connect(MQTT_SERVER, MQTT_PORT)
+    client.subscribe(topic)
+    try:
+        client.loop_forever()
+    finally:
+        router.stop()
+        if capture is not None:
+            capture.close()
+        if stop_summary is not None:
+            stop_summary.set()
+        if http_server is not None:
+            http_server.shutdown()
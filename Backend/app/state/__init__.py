@@ -0,0 +1,2 @@
+from .cache import StateCache, get_state_cache
+from . import api  # registers the /state routes
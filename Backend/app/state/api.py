@@ -0,0 +1,44 @@
+"""
+Read API for the latest-state cache, on the telemetry HTTP server.
+
+    GET /state                    every sensor's latest state
+    GET /state?sensor=ID          one sensor
+    GET /state/sensors            {sensor_id: version}
+
+Responses carry an ETag. A request with If-None-Match gets 304 when nothing
+changed; adding ?wait=SECONDS turns it into a long-poll that returns as soon
+as the state changes (or 304 after the wait, capped at
+STATE_LONG_POLL_MAX_SECONDS). Nothing here touches the database.
+"""
+
+from app.config.config import STATE_LONG_POLL_MAX_SECONDS
+from app.state.cache import get_state_cache
+from app.telemetry.http_server import json_response, route
+
+
+@route("/state")
+def _state(request):
+    cache = get_state_cache()
+    sensor_id = request.query.get("sensor")
+    etag = request.headers.get("If-None-Match")
+    try:
+        wait = min(float(request.query.get("wait", 0)), STATE_LONG_POLL_MAX_SECONDS)
+    except ValueError:
+        return json_response({"error": "wait must be a number of seconds"}, status=400)
+
+    if etag and wait > 0:
+        cache.wait_for_change(sensor_id, etag, wait)
+
+    current, body = cache.render(sensor_id)
+    if body is None:
+        return json_response({"error": f"no state for sensor {sensor_id}"}, status=404)
+    headers = {"ETag": current, "Cache-Control": "no-cache"}
+    if etag == current:
+        return 304, headers, b""
+    headers["Content-Type"] = "application/json"
+    return 200, headers, body
+
+
+@route("/state/sensors")
+def _state_sensors(request):
+    return json_response(get_state_cache().sensors(), headers={"Cache-Control": "no-cache"})
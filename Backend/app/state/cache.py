@@ -0,0 +1,123 @@
+"""
+In-memory snapshot of the latest state per sensor.
+
+The ingest path calls `update()` once per processed reading with the status
+packet, the HVAC decision and the sensor's open alert episodes. Each update
+replaces the sensor's entry in one step under the lock and bumps a version
+counter, so readers never see half an update. Readers get pre-encoded JSON:
+a body is encoded at most once per version, however many clients poll it.
+
+Under sharded ingestion each worker fills its own cache; `changes()` hands
+the parent the entries updated since the last call and `apply()` stores
+them in the parent's cache, which serves /state.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class StateCache:
+    def __init__(self):
+        self._entries = {}    # sensor_id -> entry dict (replaced, never mutated)
+        self._versions = {}   # sensor_id -> version of its latest update
+        self._version = 0
+        self._bodies = {}     # sensor_id or None (all sensors) -> (version, bytes)
+        self._changed = threading.Condition(threading.Lock())
+        # Distinguishes ETags across restarts, when versions start over
+        self._boot = f"{os.getpid():x}{int(time.time()):x}"
+
+    def update(self, sensor_id, status_packet, hvac, alerts):
+        self.apply([{
+            "sensor_id": sensor_id,
+            "timestamp": status_packet.get("timestamp"),
+            "updated_at": time.time(),
+            "status": status_packet,
+            "hvac": hvac,
+            "alerts": alerts,
+        }])
+
+    def apply(self, entries):
+        """Store whole entries (as made by update(), possibly in another process)."""
+
+        if not entries:
+            return
+        with self._changed:
+            for entry in entries:
+                self._version += 1
+                entry = dict(entry, version=self._version)
+                self._entries[entry["sensor_id"]] = entry
+                self._versions[entry["sensor_id"]] = self._version
+            self._changed.notify_all()
+
+    def changes(self, since=0):
+        """(current version, entries updated after version `since`)."""
+
+        with self._changed:
+            return self._version, [
+                self._entries[sensor_id]
+                for sensor_id, version in self._versions.items() if version > since
+            ]
+
+    def _current(self, sensor_id):
+        if sensor_id is None:
+            return self._version
+        return self._versions.get(sensor_id)
+
+    def etag(self, version):
+        return f'"{self._boot}-{version}"'
+
+    def render(self, sensor_id=None):
+        """(ETag, JSON body) for one sensor or all of them; (None, None) if unknown."""
+
+        with self._changed:
+            version = self._current(sensor_id)
+            if version is None:
+                return None, None
+            cached = self._bodies.get(sensor_id)
+            if cached is not None and cached[0] == version:
+                return self.etag(version), cached[1]
+            if sensor_id is None:
+                payload = {"version": version, "sensors": dict(self._entries)}
+            else:
+                payload = self._entries[sensor_id]
+
+        # Encode outside the lock; entries are never mutated once stored
+        body = json.dumps(payload, default=str).encode()
+        with self._changed:
+            cached = self._bodies.get(sensor_id)
+            if cached is None or cached[0] < version:
+                self._bodies[sensor_id] = (version, body)
+        return self.etag(version), body
+
+    def wait_for_change(self, sensor_id, etag, timeout):
+        """Block until the state behind `etag` changes or `timeout` passes."""
+
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                version = self._current(sensor_id)
+                if version is not None and self.etag(version) != etag:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+
+    def sensors(self):
+        with self._changed:
+            return dict(self._versions)
+
+    def stats(self):
+        with self._changed:
+            return {"sensors": len(self._entries), "version": self._version}
+
+
+_cache = StateCache()
+
+
+def get_state_cache():
+    """The process-wide cache fed by the live ingest path."""
+
+    return _cache
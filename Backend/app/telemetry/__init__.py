@@ -0,0 +1,12 @@
+from .instruments import (
+    count_error,
+    count_message,
+    count_rows,
+    observe_lag,
+    observe_stage,
+    register_collector,
+    registry,
+    timed,
+)
+from .http_server import json_response, route, start_http_server
+from .summary import start_summary_logger
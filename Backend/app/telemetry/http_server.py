@@ -0,0 +1,109 @@
+"""
+Small stdlib HTTP server for local introspection endpoints.
+
+Handlers are registered per path and return (status, headers, body):
+
+    @route("/metrics")
+    def metrics(request):
+        return 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE}, text
+
+`request` carries the path, the parsed query string ({name: last value})
+and the request headers. Each request runs on its own thread, so a handler
+may block (long-poll) without stalling other clients.
+"""
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from app.config.config import TELEMETRY_HTTP_HOST, TELEMETRY_HTTP_PORT
+from app.telemetry.instruments import registry
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_routes = {}
+
+
+class Request:
+    __slots__ = ("path", "query", "headers")
+
+    def __init__(self, path, query, headers):
+        self.path = path
+        self.query = query
+        self.headers = headers
+
+
+def route(path):
+    """Register `handler(request)` for GET `path`."""
+
+    def decorator(handler):
+        _routes[path] = handler
+        return handler
+    return decorator
+
+
+def json_response(payload, status=200, headers=None):
+    body = json.dumps(payload).encode()
+    merged = {"Content-Type": "application/json"}
+    merged.update(headers or {})
+    return status, merged, body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "IAS/1.0"
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        handler = _routes.get(parts.path)
+        if handler is None:
+            self._send(404, {"Content-Type": "text/plain"}, b"not found\n")
+            return
+        request = Request(parts.path, dict(parse_qsl(parts.query)), self.headers)
+        try:
+            status, headers, body = handler(request)
+        except Exception:
+            logger.exception("HTTP handler for %s failed", parts.path)
+            self._send(500, {"Content-Type": "text/plain"}, b"internal error\n")
+            return
+        if isinstance(body, str):
+            body = body.encode()
+        self._send(status, headers, body or b"")
+
+    def _send(self, status, headers, body):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logger.debug("%s - %s", self.address_string(), fmt % args)
+
+
+@route("/metrics")
+def _metrics(request):
+    return 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE}, registry.render_prometheus()
+
+
+@route("/healthz")
+def _healthz(request):
+    return 200, {"Content-Type": "text/plain"}, b"ok\n"
+
+
+def start_http_server(host=TELEMETRY_HTTP_HOST, port=TELEMETRY_HTTP_PORT):
+    """Serve the registered routes on a daemon thread; returns the server."""
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="telemetry-http", daemon=True
+    )
+    thread.start()
+    logger.info("📈 Telemetry endpoint on http://%s:%d/metrics", host, server.server_port)
+    return server
@@ -0,0 +1,275 @@
+"""
+In-process instrumentation: counters, fixed-bucket histograms and gauges
+collected from the pipeline components, rendered in the Prometheus text
+format.
+
+    with timed("evaluate"):
+        ...
+    count_error("decode", exc)
+
+Everything is thread-safe; an observation is a bisect and a short lock.
+
+Processes that do the work elsewhere (shard workers) send `snapshot()` to
+the process serving the endpoint, which folds it in with `merge_remote()`:
+counters and histograms add up across sources, gauges keep their source
+as a prefix.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+PREFIX = "ias_"
+
+# Seconds; stage latencies are mostly sub-millisecond, DB flushes longer
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count", "lock")
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.total, self.count
+
+    def add(self, counts, total, count):
+        with self.lock:
+            for i, n in enumerate(counts):
+                self.counts[i] += n
+            self.total += total
+            self.count += count
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation."""
+
+        counts, _, count = self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}      # (name, labels) -> value
+        self._histograms = {}    # (name, labels) -> Histogram
+        self._help = {}
+        self._collectors = []    # callables returning {gauge name: value}
+        self._remote = {}        # source -> its latest snapshot()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name, labels=(), buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram(buckets))
+        return hist
+
+    def register_collector(self, collector):
+        """`collector()` returns {name: number}, exported as gauges."""
+
+        with self._lock:
+            self._collectors.append(collector)
+
+    def merge_remote(self, source, snapshot):
+        """Replace what `source` last reported with its new snapshot()."""
+
+        with self._lock:
+            self._remote[source] = snapshot
+
+    def forget_remote(self, source):
+        with self._lock:
+            self._remote.pop(source, None)
+
+    def counters(self):
+        with self._lock:
+            counters = dict(self._counters)
+            remotes = list(self._remote.values())
+        for remote in remotes:
+            for key, value in remote["counters"].items():
+                counters[key] = counters.get(key, 0) + value
+        return counters
+
+    def histograms(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+            remotes = list(self._remote.values())
+        if not remotes:
+            return histograms
+        merged = {}
+        for key, hist in histograms.items():
+            merged[key] = Histogram(hist.buckets)
+            merged[key].add(*hist.snapshot())
+        for remote in remotes:
+            for key, (buckets, counts, total, count) in remote["histograms"].items():
+                if key not in merged:
+                    merged[key] = Histogram(buckets)
+                merged[key].add(counts, total, count)
+        return merged
+
+    def _local_gauges(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        values = {}
+        for collector in collectors:
+            try:
+                values.update(collector() or {})
+            except Exception:
+                # A broken collector must not take the endpoint down
+                continue
+        return values
+
+    def gauges(self):
+        values = self._local_gauges()
+        with self._lock:
+            remotes = list(self._remote.items())
+        for source, remote in remotes:
+            for name, value in remote["gauges"].items():
+                values[f"{source}_{name}"] = value
+        return values
+
+    def snapshot(self):
+        """This process's own counters, histograms and gauges, picklable."""
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = list(self._histograms.items())
+        return {
+            "counters": counters,
+            "histograms": {
+                key: (hist.buckets,) + tuple(hist.snapshot()) for key, hist in histograms
+            },
+            "gauges": self._local_gauges(),
+        }
+
+    def render_prometheus(self):
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name in typed:
+                return
+            typed.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {PREFIX}{name} {self._help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in sorted(self.counters().items()):
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+
+        for (name, labels), hist in sorted(self.histograms().items()):
+            header(name, "histogram")
+            counts, total, count = hist.snapshot()
+            cumulative = 0
+            for bound, n in zip(hist.buckets, counts):
+                cumulative += n
+                le = labels + (("le", _number(bound)),)
+                lines.append(f"{PREFIX}{name}_bucket{_labels(le)} {cumulative}")
+            le = labels + (("le", "+Inf"),)
+            lines.append(f"{PREFIX}{name}_bucket{_labels(le)} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+
+        for name, value in sorted(self.gauges().items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            header(name, "gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+registry = Registry()
+registry.describe("stage_seconds", "Time spent in each ingest pipeline stage")
+registry.describe("messages_total", "MQTT messages handled, by outcome")
+registry.describe("errors_total", "Pipeline errors by stage and exception type")
+registry.describe("ingest_lag_seconds", "Sensor timestamp to HVAC publish")
+registry.describe("db_rows_total", "Rows written by the DB writer")
+
+
+class timed:
+    """Context manager recording the block's duration under `stage`."""
+
+    __slots__ = ("hist", "started")
+
+    def __init__(self, stage):
+        self.hist = registry.histogram("stage_seconds", (("stage", stage),))
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.started)
+        return False
+
+
+def observe_stage(stage, seconds):
+    registry.histogram("stage_seconds", (("stage", stage),)).observe(seconds)
+
+
+def observe_lag(seconds):
+    registry.histogram("ingest_lag_seconds", buckets=LAG_BUCKETS).observe(seconds)
+
+
+def count_message(outcome):
+    registry.inc("messages_total", (("outcome", outcome),))
+
+
+def count_error(stage, exc):
+    registry.inc("errors_total", (("stage", stage), ("type", type(exc).__name__)))
+
+
+def count_rows(table, rows):
+    registry.inc("db_rows_total", (("kind", table),), rows)
+
+
+def register_collector(collector):
+    registry.register_collector(collector)
@@ -0,0 +1,57 @@
+"""
+Periodic one-line summary of pipeline throughput and latency.
+"""
+
+import logging
+import threading
+import time
+
+from app.config.config import TELEMETRY_SUMMARY_INTERVAL_SECONDS
+from app.telemetry.instruments import registry
+
+logger = logging.getLogger("app.telemetry")
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.2f}"
+
+
+def summary_line(previous_total, elapsed):
+    """Build the summary text; returns (line, messages seen so far)."""
+
+    counters = registry.counters()
+    total = sum(v for (name, _), v in counters.items() if name == "messages_total")
+    errors = sum(v for (name, _), v in counters.items() if name == "errors_total")
+    rate = (total - previous_total) / elapsed if elapsed > 0 else 0.0
+
+    parts = [f"{rate:.1f} msg/s", f"total={total}", f"errors={errors}"]
+    for (name, labels), hist in sorted(registry.histograms().items()):
+        if name != "stage_seconds":
+            continue
+        stage = dict(labels)["stage"]
+        parts.append(f"{stage} p50/p99={_ms(hist.quantile(0.5))}/{_ms(hist.quantile(0.99))}ms")
+    lag = registry.histograms().get(("ingest_lag_seconds", ()))
+    if lag is not None:
+        parts.append(f"lag p99<={lag.quantile(0.99):g}s")
+    gauges = registry.gauges()
+    for name in ("dispatcher_queue_depth", "writer_queue_depth"):
+        if name in gauges:
+            parts.append(f"{name}={gauges[name]}")
+    return "📊 " + " | ".join(parts), total
+
+
+def start_summary_logger(interval=TELEMETRY_SUMMARY_INTERVAL_SECONDS):
+    """Log a summary line every `interval` seconds on a daemon thread."""
+
+    stop = threading.Event()
+
+    def run():
+        previous, last = 0, time.monotonic()
+        while not stop.wait(interval):
+            now = time.monotonic()
+            line, previous = summary_line(previous, now - last)
+            last = now
+            logger.info(line)
+
+    threading.Thread(target=run, name="telemetry-summary", daemon=True).start()
+    return stop
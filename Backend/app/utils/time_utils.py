@@ -1,7 +1,29 @@
-from datetime import datetime
+import calendar
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 
 def parse_timestamp(ts):
-    return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ")
+    return datetime.strptime(ts, ISO_FORMAT)
 
 def now_iso():
-    return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    return datetime.utcnow().strftime(ISO_FORMAT)
+
+@lru_cache(maxsize=4096)
+def to_epoch(ts):
+    """Seconds since the epoch for a sensor timestamp (UTC).
+
+    Cached: one reading's timestamp is converted for every row derived from it.
+    """
+    try:
+        return calendar.timegm(parse_timestamp(ts).timetuple())
+    except ValueError:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+
+def from_epoch(seconds):
+    return time.strftime(ISO_FORMAT, time.gmtime(seconds))
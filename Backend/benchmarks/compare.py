@@ -0,0 +1,50 @@
+"""
+Compare two benchmark result files scenario by scenario.
+
+    python -m benchmarks.compare OLD.json NEW.json
+"""
+
+import argparse
+import json
+
+_FIELDS = (
+    ("msgs_per_sec", "msg/s", True),
+    ("p99_ms", "p99 ms", False),
+    ("db_rows_per_sec", "rows/s", True),
+    ("peak_rss_kb", "RSS KiB", False),
+)
+
+
+def _change(old, new, higher_is_better):
+    if not old or new is None:
+        return "      -"
+    pct = (new - old) / old * 100.0
+    marker = "+" if (pct >= 0) == higher_is_better else "!"
+    return f"{pct:+6.1f}%{marker}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = {s["name"]: s for s in json.load(f)["scenarios"]}
+    with open(args.new) as f:
+        new_report = json.load(f)
+
+    print(f"{'scenario':<38} " + "  ".join(f"{label:>16}" for _, label, _ in _FIELDS))
+    for scenario in new_report["scenarios"]:
+        before = old.get(scenario["name"])
+        if before is None:
+            continue
+        cells = [
+            f"{_change(before[key], scenario[key], better):>16}"
+            for key, _, better in _FIELDS
+        ]
+        print(f"{scenario['name']:<38} " + "  ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Throughput and latency benchmarks for the ingest backend.
+
+    python -m benchmarks.run                    # full suite
+    python -m benchmarks.run --quick            # fewer messages per scenario
+    python -m benchmarks.run --only pipeline    # scenarios whose name contains "pipeline"
+    python -m benchmarks.run --list
+    python -m benchmarks.compare OLD.json NEW.json
+
+Every scenario runs in its own subprocess against fresh SQLite files in a
+temporary directory (IAS_DB_DIR), so runs are offline, independent and
+report their own peak RSS. Results are written as JSON to
+benchmarks/results/<utc time>-<commit>.json.
+
+Reported per scenario: msgs/sec, p50/p95/p99 latency (ms), DB rows/sec and
+peak RSS (KiB).
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (kind, stream parameters)
+SCENARIOS = {
+    "pipeline-calm-1s-steady-json": ("pipeline", dict(severity="calm", sensors=1)),
+    "pipeline-mixed-16s-steady-json": ("pipeline", dict(severity="mixed", sensors=16)),
+    "pipeline-mixed-16s-steady-binary": (
+        "pipeline", dict(severity="mixed", sensors=16, fmt="binary"),
+    ),
+    "pipeline-incident-16s-burst-json": (
+        "pipeline", dict(severity="incident", sensors=16, pattern="burst"),
+    ),
+    "dispatcher-mixed-64s-steady-json": ("dispatcher", dict(severity="mixed", sensors=64)),
+    "dispatcher-incident-64s-burst-json": (
+        "dispatcher", dict(severity="incident", sensors=64, pattern="burst"),
+    ),
+    "stage-decode-json": ("decode", dict(severity="mixed", sensors=16)),
+    "stage-decode-binary": ("decode", dict(severity="mixed", sensors=16, fmt="binary")),
+    "stage-evaluate": ("evaluate", dict(severity="mixed", sensors=16)),
+    "stage-evaluate-batch": ("evaluate_batch", dict(severity="mixed", sensors=16)),
+    "stage-hvac": ("hvac", dict(severity="mixed", sensors=16)),
+    "stage-alerts-incident": ("alerts", dict(severity="incident", sensors=16)),
+    "stage-store": ("store", dict(severity="mixed", sensors=16)),
+    "stage-publish": ("publish", dict(severity="mixed", sensors=16)),
+}
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    ordered = sorted(latencies)
+    last = len(ordered) - 1
+
+    def pick(q):
+        return round(ordered[min(last, int(q * len(ordered)))] * 1000.0, 4)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+# ------------------------------------------------
+# Scenario bodies (run inside the child process)
+# ------------------------------------------------
+def _timed_loop(items, func):
+    latencies = []
+    clock = time.perf_counter
+    started = clock()
+    for item in items:
+        t0 = clock()
+        func(item)
+        latencies.append(clock() - t0)
+    return clock() - started, latencies
+
+
+def _run_pipeline(stream):
+    from app.mqtt import mqtt_listener
+    from benchmarks.stub_client import StubClient, StubMessage
+
+    client = StubClient()
+    messages = [StubMessage(topic, payload) for topic, payload in stream]
+    elapsed, latencies = _timed_loop(
+        messages, lambda msg: mqtt_listener.on_message(client, None, msg)
+    )
+    return elapsed, latencies
+
+
+def _run_dispatcher(stream):
+    from app.mqtt import mqtt_listener
+    from app.mqtt.dispatcher import MessageDispatcher
+    from benchmarks.stub_client import StubClient
+
+    client = StubClient()
+    latencies = []
+
+    def handler(item):
+        dispatched_at, payload = item
+        mqtt_listener.handle_message(client, payload)
+        latencies.append(time.perf_counter() - dispatched_at)
+
+    dispatcher = MessageDispatcher(handler, policy="block").start()
+    started = time.perf_counter()
+    for topic, payload in stream:
+        dispatcher.dispatch(topic, (time.perf_counter(), payload))
+    dispatcher.stop()
+    return time.perf_counter() - started, latencies
+
+
+def _evaluated(readings):
+    from app.metrics.evaluator import evaluate_all_metrics
+    from app.metrics.exposure import ExposureEngine
+
+    engine = ExposureEngine()
+    return [evaluate_all_metrics(r, exposure=engine) for r in readings]
+
+
+def _run_stage(kind, stream):
+    from benchmarks.streams import decoded
+
+    if kind == "decode":
+        from app.models.binary_payload import parse_payload
+        return _timed_loop([payload for _, payload in stream], parse_payload)
+
+    readings = decoded(stream)
+
+    if kind == "evaluate":
+        from app.metrics.evaluator import evaluate_all_metrics
+        from app.metrics.exposure import ExposureEngine
+        engine = ExposureEngine()
+        return _timed_loop(readings, lambda r: evaluate_all_metrics(r, exposure=engine))
+
+    if kind == "evaluate_batch":
+        from app.metrics.batch_evaluator import evaluate_batch
+        columns = {key: [r[key] for r in readings] for key in readings[0]}
+        elapsed, _ = _timed_loop([columns], evaluate_batch)
+        # One call covers the whole stream; per-message latency is not meaningful
+        return elapsed, []
+
+    results = _evaluated(readings)
+
+    if kind == "hvac":
+        from app.hvac.hvac_controller import decide_hvac_actions
+        packets = [res["results"]["status_packet"] for res in results]
+        return _timed_loop(packets, decide_hvac_actions)
+
+    if kind == "alerts":
+        from app.alerts.sink import AlertSink
+        sink = AlertSink()
+        return _timed_loop(
+            list(zip(readings, results)), lambda pair: sink.process(pair[0], pair[1]["alerts"], pair[1]["metrics"])
+        )
+
+    if kind == "store":
+        from app.db.writer import get_writer
+        writer = get_writer()
+        bundles = list(zip(readings, results))
+        elapsed, latencies = _timed_loop(
+            bundles,
+            lambda pair: writer.submit_reading_bundle(
+                pair[0], metrics=pair[1]["metrics"], alerts=pair[1]["alerts"]
+            ),
+        )
+        started = time.perf_counter()
+        writer.flush()
+        return elapsed + (time.perf_counter() - started), latencies
+
+    if kind == "publish":
+        from app.mqtt.mqtt_listener import build_unity_payload
+        from app.mqtt.publisher import ChangePublisher
+        from benchmarks.stub_client import StubClient
+        client, publisher = StubClient(), ChangePublisher()
+        packets = [res["results"]["status_packet"] for res in results]
+        return _timed_loop(
+            packets,
+            lambda packet: publisher.publish(
+                client, "bench/unity", build_unity_payload(packet)
+            ),
+        )
+
+    raise ValueError(f"Unknown scenario kind: {kind}")
+
+
+def _count_rows():
+    from app.db.connection import get_connection, table_db_path
+
+    total = 0
+    for table in ("sensor_readings", "metrics", "alerts", "ventilation_history",
+                  "alert_episodes"):
+        conn, lock = get_connection(table_db_path(table))
+        with lock:
+            total += conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return total
+
+
+def run_child(name, messages, seed):
+    import logging
+
+    logging.basicConfig(level=logging.WARNING)
+
+    from app.db.storage import init_storage
+    from app.db.writer import get_writer, shutdown_writer
+    from app.telemetry.instruments import registry
+    from benchmarks.streams import make_stream
+
+    kind, params = SCENARIOS[name]
+    init_storage()
+    stream = make_stream(messages, seed=seed, **params)
+
+    if kind == "pipeline":
+        elapsed, latencies = _run_pipeline(stream)
+    elif kind == "dispatcher":
+        elapsed, latencies = _run_dispatcher(stream)
+    else:
+        elapsed, latencies = _run_stage(kind, stream)
+
+    # Anything the pipeline queued counts toward the run
+    flush_started = time.perf_counter()
+    get_writer().flush()
+    if kind in ("pipeline", "dispatcher"):
+        elapsed += time.perf_counter() - flush_started
+    shutdown_writer()
+    rows = _count_rows()
+
+    errors = sum(
+        value for (metric, _), value in registry.counters().items() if metric == "errors_total"
+    )
+    result = {
+        "name": name,
+        "kind": kind,
+        "params": params,
+        "messages": len(stream),
+        "seconds": round(elapsed, 6),
+        "msgs_per_sec": round(len(stream) / elapsed, 1) if elapsed else None,
+        "db_rows": rows,
+        "db_rows_per_sec": round(rows / elapsed, 1) if elapsed and rows else 0.0,
+        "errors": errors,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    result.update(_percentiles(latencies))
+    return result
+
+
+# ------------------------------------------------
+# Suite driver (parent process)
+# ------------------------------------------------
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_scenario(name, messages, seed):
+    with tempfile.TemporaryDirectory(prefix="ias-bench-") as db_dir:
+        env = dict(os.environ, IAS_DB_DIR=db_dir)
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--child", name,
+             "--messages", str(messages), "--seed", str(seed)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _cell(value, width, decimals):
+    if value is None:
+        return "-".rjust(width)
+    return f"{value:>{width}.{decimals}f}"
+
+
+def _print_row(result):
+    print(
+        f"{result['name']:<38} {_cell(result['msgs_per_sec'], 10, 1)} msg/s  "
+        f"p50 {_cell(result['p50_ms'], 8, 3)}  p95 {_cell(result['p95_ms'], 8, 3)}  "
+        f"p99 {_cell(result['p99_ms'], 8, 3)} ms  "
+        f"{_cell(result['db_rows_per_sec'], 10, 1)} rows/s  "
+        f"{result['peak_rss_kb'] / 1024:>7.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend throughput/latency benchmarks")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--quick", action="store_true", help="1000 messages per scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", action="append", default=[],
+                        help="run scenarios whose name contains this (repeatable)")
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/...)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.messages, args.seed)))
+        return
+
+    if args.list:
+        for name, (kind, params) in SCENARIOS.items():
+            print(f"{name:<38} {kind:<15} {params}")
+        return
+
+    messages = 1000 if args.quick else args.messages
+    names = [
+        name for name in SCENARIOS
+        if not args.only or any(part in name for part in args.only)
+    ]
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "messages": messages,
+        "seed": args.seed,
+        "scenarios": [],
+    }
+    for name in names:
+        result = _run_scenario(name, messages, args.seed)
+        report["scenarios"].append(result)
+        _print_row(result)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
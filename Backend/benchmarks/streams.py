@@ -0,0 +1,102 @@
+"""
+Synthetic sensor streams for the benchmarks.
+
+A stream is a list of (topic, payload bytes) in delivery order, fully
+determined by its parameters and seed:
+
+    severity  "calm"      everything in the green bands
+              "mixed"     mostly normal with regular excursions
+              "incident"  sustained CO/PM/heat exceedances
+    sensors   number of nodes, one topic each
+    pattern   "steady"    nodes report round-robin, one reading per minute
+              "burst"     each node flushes a backlog of readings at once
+                          (store-and-forward after a reconnect)
+    fmt       "json" or "binary"
+"""
+
+import json
+import random
+
+from app.models.binary_payload import encode_reading, parse_payload
+from app.utils.time_utils import from_epoch
+
+SEVERITIES = ("calm", "mixed", "incident")
+PATTERNS = ("steady", "burst")
+FORMATS = ("json", "binary")
+
+BURST_SIZE = 30
+START_EPOCH = 1735689600   # 2025-01-01T00:00:00Z
+
+
+def _sample(rng, severity, step):
+    reading = {
+        "temp": rng.uniform(18.0, 24.0),
+        "pressure": rng.uniform(1005.0, 1020.0),
+        "co_mean": rng.uniform(0.0, 8.0),
+        "co_max": rng.uniform(2.0, 12.0),
+        "co_valid": True,
+        "pm2_5": rng.uniform(5.0, 11.0),
+        "pm10": rng.uniform(6.0, 18.0),
+        "co2": rng.uniform(420.0, 700.0),
+    }
+    if severity == "mixed" and rng.random() < 0.2:
+        reading["co_max"] = rng.uniform(30.0, 260.0)
+        reading["co_mean"] = reading["co_max"] * 0.6
+        reading["pm2_5"] = rng.uniform(20.0, 120.0)
+        reading["temp"] = rng.uniform(28.0, 38.0)
+    elif severity == "incident":
+        ramp = min(1.0, step / 60.0)
+        reading["co_max"] = 40.0 + ramp * rng.uniform(100.0, 300.0)
+        reading["co_mean"] = reading["co_max"] * 0.7
+        reading["pm2_5"] = 30.0 + ramp * rng.uniform(20.0, 150.0)
+        reading["pm10"] = 50.0 + ramp * rng.uniform(50.0, 300.0)
+        reading["temp"] = 30.0 + ramp * rng.uniform(0.0, 10.0)
+        reading["co2"] = 1000.0 + ramp * rng.uniform(0.0, 4000.0)
+    reading["co_max"] = round(reading["co_max"])
+    return reading
+
+
+def _encode(reading, fmt, node):
+    if fmt == "binary":
+        return encode_reading(reading, node_id=node + 1)
+    return json.dumps(reading).encode()
+
+
+def make_stream(messages, severity="mixed", sensors=1, pattern="steady", fmt="json", seed=1):
+    if severity not in SEVERITIES:
+        raise ValueError(f"Unknown severity mix: {severity}")
+    if pattern not in PATTERNS:
+        raise ValueError(f"Unknown burst pattern: {pattern}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown payload format: {fmt}")
+
+    rng = random.Random(seed)
+    per_sensor = -(-messages // sensors)
+    readings = [[] for _ in range(sensors)]
+    for node in range(sensors):
+        for step in range(per_sensor):
+            reading = _sample(rng, severity, step)
+            reading["timestamp"] = from_epoch(START_EPOCH + step * 60)
+            reading["sensor_id"] = str(node + 1)
+            readings[node].append(reading)
+
+    if pattern == "steady":
+        order = [(node, step) for step in range(per_sensor) for node in range(sensors)]
+    else:
+        order = [
+            (node, step)
+            for chunk in range(0, per_sensor, BURST_SIZE)
+            for node in range(sensors)
+            for step in range(chunk, min(chunk + BURST_SIZE, per_sensor))
+        ]
+
+    return [
+        (f"factory/sensors/{node + 1}", _encode(readings[node][step], fmt, node))
+        for node, step in order[:messages]
+    ]
+
+
+def decoded(stream):
+    """The readings of a stream, as validate_payload would return them."""
+
+    return [parse_payload(payload) for _, payload in stream]
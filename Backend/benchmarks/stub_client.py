@@ -0,0 +1,24 @@
+"""Offline stand-ins for the paho client and message objects."""
+
+import paho.mqtt.client as mqtt
+
+
+class StubMessage:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class StubClient:
+    """Accepts publishes and only counts them."""
+
+    def __init__(self):
+        self.published = 0
+        self.bytes = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published += 1
+        self.bytes += len(payload or "")
+        return mqtt.MQTTMessageInfo(self.published)
@@ -1,12 +1,29 @@
-from app.db.sensor_db import init_sensor_db
-from app.db.metrics_db import init_metrics_db
-from app.db.alerts_db import init_alerts_db
+import logging
+
+from app.config.config import LOG_LEVEL, SHARDING_ENABLED
+from app.db.storage import init_storage
+from app.db.connection import close_all
+from app.db.writer import shutdown_writer
+from app.metrics.exposure import default_exposure_engine
 from app.mqtt.mqtt_listener import start_listener
-from app.db.ventilation_db import init_ventilation_db
+from app.mqtt.sharding import start_sharded_listener
+
+logger = logging.getLogger("app")
 
 if __name__ == "__main__":
-    init_sensor_db()
-    init_metrics_db()
-    init_alerts_db()
-    init_ventilation_db()
-    start_listener()
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL.upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    if SHARDING_ENABLED:
+        # Each worker process opens and writes its own shard
+        start_sharded_listener()
+    else:
+        init_storage()
+        replayed = default_exposure_engine().rebuild_from_db()
+        logger.info("🔁 Rebuilt CO STEL/TWA state from %d stored readings", replayed)
+        try:
+            start_listener()
+        finally:
+            shutdown_writer()
+            close_all()
@@ -0,0 +1,15 @@
+import pytest
+
+from app.db.connection import close_all, set_db_root
+from app.db.storage import init_storage
+
+
+@pytest.fixture
+def db_root(tmp_path):
+    """Every database under a scratch directory, with the current schema."""
+
+    set_db_root(str(tmp_path))
+    init_storage()
+    yield tmp_path
+    close_all()
+    set_db_root(None)
@@ -0,0 +1,64 @@
+"""Merging alerts into episodes and persisting their snapshots."""
+
+from app.alerts.sink import AlertSink
+from app.db.connection import get_connection, table_db_path
+from app.db.episodes_db import upsert_episodes
+from app.metrics.evaluator import evaluate_all_metrics
+from app.metrics.exposure import ExposureEngine
+
+from tests.test_storage import START_EPOCH, _reading
+
+
+class _Recorder:
+    def __init__(self):
+        self.episodes = []
+
+    def submit_episode(self, episode):
+        self.episodes.append(episode)
+
+
+def _run(co2_values):
+    writer = _Recorder()
+    sink = AlertSink(writer=writer)
+    exposure = ExposureEngine()
+    for step, co2 in enumerate(co2_values):
+        reading = _reading(step, co2=co2, temp=20.0)
+        results = evaluate_all_metrics(reading, exposure)
+        sink.process(reading, results["alerts"], results["metrics"])
+    return sink, [e for e in writer.episodes if e["category"] == "CO2"]
+
+
+def test_value_inside_the_clear_margin_holds_the_episode_open():
+    # 790 ppm is below the 800 ppm onset but within the 5% margin
+    sink, episodes = _run([1200.0] + [790.0] * 10)
+
+    assert [e["category"] for e in sink.open_episodes("node-1")] == ["CO2"]
+    assert all(e["end_ts"] is None for e in episodes)
+
+
+def test_clear_value_closes_the_episode_after_the_clear_time():
+    sink, episodes = _run([1200.0, 790.0, 600.0, 600.0, 600.0, 600.0])
+
+    assert sink.open_episodes("node-1") == []
+    assert episodes[-1]["end_ts"] is not None
+    revisions = [e["revision"] for e in episodes]
+    assert revisions == sorted(set(revisions))
+
+
+def test_stale_snapshot_cannot_reopen_a_closed_episode(db_root):
+    _, episodes = _run([1200.0, 600.0, 600.0, 600.0])
+    opened, closed = episodes[0], episodes[-1]
+    assert opened["count"] == closed["count"]
+
+    # The opening snapshot arrives last, e.g. drained late from the spill journal
+    upsert_episodes([closed])
+    upsert_episodes([opened])
+
+    conn, lock = get_connection(table_db_path("alert_episodes"))
+    with lock:
+        end_ts, revision = conn.execute(
+            "SELECT end_ts, revision FROM alert_episodes WHERE category = 'CO2' AND ts_epoch = ?",
+            (START_EPOCH,),
+        ).fetchone()
+    assert end_ts == closed["end_ts"]
+    assert revision == closed["revision"]
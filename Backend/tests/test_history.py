@@ -0,0 +1,49 @@
+"""History queries over the stored tables."""
+
+import numpy as np
+
+from app.db.history import fetch_columns, iter_alerts, iter_metrics
+from app.db.tiering import _partition_columns, archive_partition
+from app.db.writer import BatchWriter
+from app.metrics.evaluator import evaluate_all_metrics
+from app.utils.time_utils import from_epoch
+
+from tests.test_storage import START_EPOCH, _reading
+
+
+def test_metric_and_alert_rows_name_their_sensor(db_root):
+    alert = {
+        "timestamp": from_epoch(START_EPOCH), "category": "PM10", "value": 80.0,
+        "limit": 50.0, "severity": "warning", "message": "PM10=80.0 is YELLOW",
+    }
+    writer = BatchWriter()
+    for sensor_id in ("node-1", "node-2"):
+        reading = _reading(0, sensor_id=sensor_id)
+        results = evaluate_all_metrics(reading)
+        writer.submit_reading_bundle(reading, metrics=results["metrics"], alerts=[dict(alert)])
+    writer.stop()
+
+    assert {m["sensor_id"] for m in iter_metrics()} == {"node-1", "node-2"}
+    assert [a["sensor_id"] for a in iter_alerts()] == ["node-1", "node-2"]
+    columns = fetch_columns("metrics", columns=["sensor_id"], metric_type="CO2_LEVEL")
+    assert list(columns["sensor_id"]) == ["node-1", "node-2"]
+
+
+
+def test_tiered_readings_read_back_unchanged(db_root):
+    writer = BatchWriter()
+    for step in range(30):
+        writer.submit_sensor_reading(_reading(step, sensor_id=f"node-{step % 3}"))
+    writer.stop()
+    before = fetch_columns("sensor_readings")
+    end = START_EPOCH + 20 * 60
+
+    # Read in several chunks, the partition comes back whole and in order
+    chunked = _partition_columns(START_EPOCH, end, chunk_size=7)
+    np.testing.assert_array_equal(chunked["id"], before["id"][:20])
+
+    assert archive_partition(START_EPOCH, end) == 20
+    assert _partition_columns(START_EPOCH, end) is None
+    after = fetch_columns("sensor_readings")
+    for name, values in before.items():
+        np.testing.assert_array_equal(after[name], values, err_msg=name)
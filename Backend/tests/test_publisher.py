@@ -0,0 +1,49 @@
+"""Change-detection publishing."""
+
+import paho.mqtt.client as mqtt
+
+from app.mqtt.publisher import ChangePublisher
+
+
+class _Client:
+    """Accepts publishes while `rc` is success, like paho while connected."""
+
+    def __init__(self):
+        self.rc = mqtt.MQTT_ERR_SUCCESS
+        self.messages = []
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        info = mqtt.MQTTMessageInfo(len(self.messages))
+        info.rc = self.rc
+        if self.rc == mqtt.MQTT_ERR_SUCCESS:
+            self.messages.append((topic, payload))
+        return info
+
+
+def test_failed_publishes_are_not_counted_as_sent():
+    client, publisher = _Client(), ChangePublisher(on_change=True, keepalive_seconds=0)
+
+    client.rc = mqtt.MQTT_ERR_NO_CONN
+    assert not publisher.publish(client, "t", {"mode": "NORMAL"})
+    client.rc = mqtt.MQTT_ERR_SUCCESS
+    assert publisher.publish(client, "t", {"mode": "NORMAL"})
+    # Unchanged, but the keepalive is due
+    client.rc = mqtt.MQTT_ERR_NO_CONN
+    assert not publisher.publish(client, "t", {"mode": "NORMAL"})
+    client.rc = mqtt.MQTT_ERR_SUCCESS
+    assert publisher.publish(client, "t", {"mode": "NORMAL"})
+
+    stats = publisher.stats()
+    assert (stats["sent"], stats["failed"], stats["keepalive"]) == (2, 2, 0)
+    assert len(client.messages) == 2
+
+
+def test_unchanged_payload_is_suppressed_until_the_keepalive():
+    client, publisher = _Client(), ChangePublisher(on_change=True, keepalive_seconds=3600)
+
+    assert publisher.publish(client, "t", {"mode": "NORMAL", "timestamp": "a"})
+    assert not publisher.publish(client, "t", {"mode": "NORMAL", "timestamp": "b"})
+    assert publisher.publish(client, "t", {"mode": "PURGE", "timestamp": "c"})
+
+    stats = publisher.stats()
+    assert (stats["sent"], stats["suppressed"], stats["keepalive"]) == (2, 1, 0)
@@ -0,0 +1,34 @@
+"""Replaying captured traffic through the ingest pipeline."""
+
+import json
+
+from app.config.config import DEFAULT_SENSOR_ID
+from app.db.history import fetch_columns
+from app.db.writer import get_writer, shutdown_writer
+from app.mqtt.replay import NullClient, replay, topic_handler
+
+from tests.test_storage import START_EPOCH, _reading
+
+
+def _payload(step):
+    reading = _reading(step)
+    del reading["sensor_id"]
+    return json.dumps(reading).encode()
+
+
+def test_zone_topics_replay_with_their_zone_and_node(db_root):
+    records = [
+        (START_EPOCH, "factory/hall-a/n1/sensors", _payload(0)),
+        (START_EPOCH + 1, "factory/hall-b/n7/sensors", _payload(1)),
+        (START_EPOCH + 2, "legacy/sensors", _payload(2)),
+    ]
+    client = NullClient()
+    try:
+        assert replay(records, topic_handler(client)) == 3
+        get_writer().flush()
+    finally:
+        shutdown_writer()
+
+    stored = fetch_columns("sensor_readings", columns=["sensor_id"])
+    assert list(stored["sensor_id"]) == ["hall-a/n1", "hall-b/n7", DEFAULT_SENSOR_ID]
+    assert client.published > 0
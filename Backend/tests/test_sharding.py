@@ -0,0 +1,83 @@
+"""Sharded ingestion: routing, worker reports and worker liveness."""
+
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from app.mqtt.replay import NullClient
+from app.mqtt.sharding import ShardRouter
+from app.state.cache import StateCache
+from app.telemetry.instruments import Registry
+
+from tests.test_storage import _reading
+
+
+def _payload(step):
+    reading = _reading(step)
+    del reading["sensor_id"]
+    return json.dumps(reading).encode()
+
+
+def _wait_for(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_remote_snapshots_add_up_with_local_telemetry():
+    worker, parent = Registry(), Registry()
+    worker.inc("messages_total", (("outcome", "processed"),), 3)
+    worker.histogram("stage_seconds", (("stage", "store"),)).observe(0.002)
+    worker.register_collector(lambda: {"writer_queue_depth": 7})
+    parent.inc("messages_total", (("outcome", "processed"),), 1)
+
+    parent.merge_remote("shard-0", worker.snapshot())
+    parent.merge_remote("shard-0", worker.snapshot())   # replaces, never double counts
+
+    assert parent.counters()[("messages_total", (("outcome", "processed"),))] == 4
+    assert parent.histograms()[("stage_seconds", (("stage", "store"),))].count == 1
+    assert parent.gauges()["shard-0_writer_queue_depth"] == 7
+
+
+def test_state_changes_carry_over_to_another_cache():
+    worker, parent = StateCache(), StateCache()
+    worker.update("z1/n1", {"timestamp": "t1"}, {"ventilation_mode": "NORMAL"}, [])
+    since, entries = worker.changes()
+    worker.update("z1/n2", {"timestamp": "t2"}, {"ventilation_mode": "NORMAL"}, [])
+    _, later = worker.changes(since)
+
+    parent.apply(entries)
+    parent.apply(later)
+
+    assert [e["sensor_id"] for e in later] == ["z1/n2"]
+    assert set(parent.sensors()) == {"z1/n1", "z1/n2"}
+
+
+def test_dead_worker_is_restarted_then_given_up_on(tmp_path):
+    router = ShardRouter(
+        workers=1, db_dir=str(tmp_path), client_factory=NullClient, max_queue=2,
+        put_timeout=0.1, max_restarts=1, forward_interval=0.1,
+    ).start()
+    topic = "factory/z1/n1/sensors"
+    try:
+        assert router.dispatch(topic, _payload(0))
+        assert _wait_for(lambda: router.stats()["handled"] == 1)
+
+        os.kill(router._processes["shard-0"].pid, signal.SIGKILL)
+        assert _wait_for(lambda: router.stats()["restarts"] == 1)
+        assert router.dispatch(topic, _payload(1))
+        assert _wait_for(lambda: router.stats()["handled"] == 2)
+
+        os.kill(router._processes["shard-0"].pid, signal.SIGKILL)
+        with pytest.raises(RuntimeError):
+            assert _wait_for(lambda: not router._processes["shard-0"].is_alive())
+            for step in range(2, 50):
+                router.dispatch(topic, _payload(step))
+    finally:
+        router.stop()
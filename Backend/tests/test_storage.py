@@ -0,0 +1,159 @@
+"""Storing reading bundles through the background writer."""
+
+import sqlite3
+
+from app.db.connection import get_connection, table_db_path
+from app.db.writer import BatchWriter
+from app.metrics.evaluator import evaluate_all_metrics
+from app.metrics.exposure import ExposureEngine
+from app.utils.time_utils import from_epoch
+
+START_EPOCH = 1735689600
+
+
+def _reading(step, **overrides):
+    reading = {
+        "timestamp": from_epoch(START_EPOCH + step * 60),
+        "temp": 22.0, "pressure": 1012.0, "co_mean": 3.0, "co_max": 5.0,
+        "co_valid": True, "pm2_5": 8.0, "pm10": 12.0, "co2": 600.0,
+        "sensor_id": "node-1",
+    }
+    reading.update(overrides)
+    return reading
+
+
+def _count(table):
+    conn, lock = get_connection(table_db_path(table))
+    with lock:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def _store(readings):
+    writer = BatchWriter()
+    exposure = ExposureEngine()
+    for reading in readings:
+        results = evaluate_all_metrics(reading, exposure)
+        writer.submit_reading_bundle(reading, metrics=results["metrics"])
+    writer.stop()
+    return writer.stats()
+
+
+def test_gap_reading_is_stored_with_its_metrics(db_root):
+    # PM10 < 5 and CO2 < 400 fall below every threshold band: no limit
+    stats = _store([_reading(0), _reading(1, pm10=3.0, co2=350.0)])
+
+    assert stats["poison"] == 0
+    assert _count("sensor_readings") == 2
+    conn, lock = get_connection(table_db_path("metrics"))
+    with lock:
+        limits = dict(conn.execute(
+            "SELECT metric_type, limit_value FROM metrics WHERE ts_epoch = ?",
+            (START_EPOCH + 60,),
+        ).fetchall())
+    assert "PM10_LEVEL" in limits and limits["PM10_LEVEL"] is None
+
+
+def test_not_null_limits_are_relaxed_on_old_files(tmp_path):
+    from app.db.connection import close_all, set_db_root
+    from app.db.storage import init_storage
+
+    set_db_root(str(tmp_path))
+    try:
+        old = sqlite3.connect(table_db_path("metrics"))
+        old.execute("""
+            CREATE TABLE metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL, metric_type TEXT NOT NULL,
+                value REAL NOT NULL, window TEXT NOT NULL,
+                limit_value REAL NOT NULL, status TEXT NOT NULL
+            )
+        """)
+        old.execute(
+            "INSERT INTO metrics (timestamp, metric_type, value, window, limit_value, status) "
+            "VALUES ('2025-01-01T00:00:00+00:00', 'PM10', 12.0, 'instant', 20.0, 'green')"
+        )
+        old.commit()
+        old.close()
+
+        init_storage()
+        stats = _store([_reading(1, pm10=3.0)])
+
+        assert stats["poison"] == 0
+        assert _count("metrics") > 1
+        conn, lock = get_connection(table_db_path("metrics"))
+        with lock:
+            notnull = {row[1]: row[3] for row in conn.execute("PRAGMA table_info(metrics)")}
+            first = conn.execute("SELECT id, limit_value FROM metrics ORDER BY id LIMIT 1").fetchone()
+        assert notnull["limit_value"] == 0
+        assert first == (1, 20.0)
+    finally:
+        close_all()
+        set_db_root(None)
+
+
+def test_poison_bundle_keeps_its_reading_and_dead_letters_the_rest(db_root):
+    import json
+
+    from app.db.spill import DEAD_LETTER_FILE, SpillJournal
+
+    journal = SpillJournal(directory=str(db_root / "spill"))
+    writer = BatchWriter(journal=journal)
+    bad_alert = {
+        "timestamp": from_epoch(START_EPOCH), "category": "PM10", "value": 80.0,
+        "limit": 50.0, "severity": None, "message": "breaks NOT NULL",
+    }
+    writer.submit_reading_bundle(_reading(0), alerts=[bad_alert])
+    writer.submit_reading_bundle(_reading(1))
+    writer.stop()
+    stats = writer.stats()
+
+    assert stats["poison"] == 1 and stats["salvaged"] == 1 and stats["dead_lettered"] == 1
+    assert _count("sensor_readings") == 2
+    assert _count("alerts") == 0
+    with open(db_root / "spill" / DEAD_LETTER_FILE) as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["kind"] for entry in entries] == ["bundle"]
+    assert entries[0]["record"]["alerts"][0]["message"] == "breaks NOT NULL"
+
+
+def test_alert_rows_carry_their_sensor(db_root):
+    alert = {
+        "timestamp": from_epoch(START_EPOCH), "category": "PM10", "value": 80.0,
+        "limit": 50.0, "severity": "warning", "message": "PM10=80.0 is YELLOW",
+    }
+    writer = BatchWriter()
+    writer.submit_reading_bundle(_reading(0), alerts=[alert])
+    writer.submit_reading_bundle(_reading(0, sensor_id="node-2"), alerts=[dict(alert)])
+    writer.stop()
+
+    conn, lock = get_connection(table_db_path("alerts"))
+    with lock:
+        sensors = [row[0] for row in conn.execute("SELECT sensor_id FROM alerts ORDER BY id")]
+    assert sensors == ["node-1", "node-2"]
+
+
+def test_close_all_closes_readers_and_truncates_the_wal(db_root):
+    import os
+    import threading
+
+    from app.db.connection import close_all, read_connection
+
+    _store([_reading(0), _reading(1)])
+    path = table_db_path("sensor_readings")
+    readers = [read_connection(path)]
+    thread = threading.Thread(target=lambda: readers.append(read_connection(path)))
+    thread.start()
+    thread.join()
+
+    close_all()
+
+    for conn in readers:
+        try:
+            conn.execute("SELECT 1")
+        except sqlite3.ProgrammingError:
+            continue
+        raise AssertionError("reader left open")
+    wal = path + "-wal"
+    assert not os.path.exists(wal) or os.path.getsize(wal) == 0
+    # This thread's next read opens a fresh connection
+    assert read_connection(path) is not readers[0]
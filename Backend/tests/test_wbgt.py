@@ -0,0 +1,30 @@
+"""WBGT: the factored formula against Stull's closed form, and batch against scalar."""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.metrics.batch_evaluator import compute_wbgt_array
+from app.metrics.temp_pressure_wbgt import DEFAULT_WBGT_RH, compute_wbgt, wbgt_max_error
+
+# Float64 rounding only; the factoring itself is exact
+TOLERANCE_C = 1e-9
+
+
+def test_factored_wbgt_matches_closed_form():
+    assert wbgt_max_error() < TOLERANCE_C
+
+
+@pytest.mark.parametrize("per_reading_humidity", [False, True])
+def test_batch_wbgt_matches_scalar(per_reading_humidity):
+    rng = random.Random(5)
+    temps = [rng.uniform(-40.0, 125.0) for _ in range(2000)]
+    if per_reading_humidity:
+        humidity = [rng.uniform(0.0, 100.0) for _ in temps]
+        expected = [compute_wbgt(t, rh) for t, rh in zip(temps, humidity)]
+        actual = compute_wbgt_array(temps, np.array(humidity))
+    else:
+        expected = [compute_wbgt(t) for t in temps]
+        actual = compute_wbgt_array(temps, DEFAULT_WBGT_RH)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE_C)
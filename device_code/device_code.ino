@@ -67,6 +67,37 @@ const char* mqtt_control_topic = "";
 WiFiClient espClient;
 PubSubClient client(espClient);
 
+// =========================
+// PAYLOAD FORMAT
+// =========================
+// true  -> 41-byte binary frame (see Backend/app/models/binary_payload.py)
+// false -> JSON string
+// Keep false: this node has no CO2 sensor, and the backend rejects binary
+// frames without the co2 flag.
+const bool USE_BINARY_PAYLOAD = false;
+const uint16_t NODE_ID = 0;                 // 0 = not set (backend keys by topic)
+
+const uint8_t PAYLOAD_TYPE_READING = 0xA1;
+const uint8_t PAYLOAD_VERSION      = 1;
+const uint8_t FLAG_CO_VALID        = 0x01;
+const uint8_t FLAG_CO2             = 0x02;  // this node has no CO2 sensor
+
+struct __attribute__((packed)) ReadingFrame {
+  uint8_t  type;
+  uint8_t  version;
+  uint8_t  flags;
+  uint16_t node_id;
+  uint32_t timestamp;
+  float    temp;
+  float    pressure;
+  float    co_mean;
+  float    co_max;
+  float    pm2_5;
+  float    pm10;
+  float    co2;
+  uint32_t crc;
+};
+
 // =========================
 // FAN CONTROL (L298N)
 // =========================
@@ -246,6 +277,41 @@ void computeMinutePM(float &pm25, float &pm10) {
   pm10 = (pm10_win1 + pm10_win2) / 2.0;
 }
 
+// =========================
+// BINARY PAYLOAD
+// =========================
+// Standard CRC-32 (same as zlib.crc32 on the backend)
+uint32_t crc32(const uint8_t* data, size_t len) {
+  uint32_t crc = 0xFFFFFFFF;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (int b = 0; b < 8; b++) {
+      crc = (crc >> 1) ^ (0xEDB88320 & (0 - (crc & 1)));
+    }
+  }
+  return ~crc;
+}
+
+void publishBinaryReading(time_t now, float co_mean, int co_max, float pm25, float pm10) {
+  ReadingFrame frame;
+  frame.type      = PAYLOAD_TYPE_READING;
+  frame.version   = PAYLOAD_VERSION;
+  frame.flags     = mq7Valid ? FLAG_CO_VALID : 0;
+  frame.node_id   = NODE_ID;
+  frame.timestamp = (uint32_t) now;
+  frame.temp      = currentTemp;
+  frame.pressure  = currentPressure;
+  frame.co_mean   = co_mean;
+  frame.co_max    = (float) co_max;
+  frame.pm2_5     = pm25;
+  frame.pm10      = pm10;
+  frame.co2       = 0.0;
+  frame.crc       = crc32((const uint8_t*) &frame, sizeof(frame) - sizeof(frame.crc));
+
+  Serial.println("=== MQTT Payload (binary, 41 bytes) ===");
+  client.publish(mqtt_topic, (const uint8_t*) &frame, sizeof(frame));
+}
+
 // =========================
 // FAN HELPERS
 // =========================
@@ -354,6 +420,11 @@ void processMinuteCycle() {
   Serial.print("PM2.5  : "); Serial.println(pm25);
   Serial.print("PM10   : "); Serial.println(pm10);
 
+  if (USE_BINARY_PAYLOAD) {
+    publishBinaryReading(now, co_mean, co_max, pm25, pm10);
+    return;
+  }
+
   // Build JSON payload
   String payload = "{";
   payload += "\"timestamp\":\"" + String(timestamp) + "\",";